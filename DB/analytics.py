@@ -0,0 +1,126 @@
+# DB/analytics.py
+"""
+Columnar analytics backend for the reporting layer.
+
+After `load`, `export_star_schema` copies the star schema from the warehouse
+into a local DuckDB file (and optionally Parquet). `DuckDBStore` then runs the
+same KPI queries from DB/queries.py, adapted to DuckDB's dialect.
+"""
+import os
+import re
+
+import pandas as pd
+
+from DB.create_db import STAR_TABLES
+from DB.queries import KPI_QUERIES
+
+DEFAULT_PATH = "reports/analytics/ods14.duckdb"
+
+# :param (SQLAlchemy text) -> $param (DuckDB)
+_PARAM_RE = re.compile(r"(?<![:\w]):(\w+)")
+_DUCK_PARAM_RE = re.compile(r"\$(\w+)")
+
+
+def _require_duckdb():
+    try:
+        import duckdb
+    except ImportError as exc:
+        raise ImportError("El backend analítico requiere 'duckdb' (pip install duckdb).") from exc
+    return duckdb
+
+
+def duckdb_sql(query) -> str:
+    """Adapta una consulta de DB/queries.py (text() de SQLAlchemy) a DuckDB."""
+    sql = getattr(query, "text", query)
+    sql = _PARAM_RE.sub(r"$\1", sql)
+    return sql.strip().rstrip(";")
+
+
+# Conjunto de consultas adaptado, con las mismas claves que KPI_QUERIES
+DUCKDB_QUERIES = {name: duckdb_sql(q) for name, q in KPI_QUERIES.items()}
+_BY_TEXT = {q.text: DUCKDB_QUERIES[name] for name, q in KPI_QUERIES.items()}
+
+
+def export_star_schema(engine, path: str = DEFAULT_PATH, parquet_dir: str = None,
+                       tables=STAR_TABLES, chunksize: int = 200_000):
+    """
+    Copia las tablas del warehouse a un archivo DuckDB (reemplazo atómico).
+    Si `parquet_dir` se indica, escribe además un .parquet por tabla.
+    """
+    duckdb = _require_duckdb()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    con = duckdb.connect(tmp)
+    try:
+        for table in tables:
+            first = True
+            for chunk in pd.read_sql_table(table, engine, chunksize=chunksize):
+                # Las fechas llegan como date/str según el backend: se guardan como DATE
+                if "full_date" in chunk.columns:
+                    chunk["full_date"] = pd.to_datetime(chunk["full_date"])
+                con.register("chunk_df", chunk)
+                select = "SELECT * REPLACE (CAST(full_date AS DATE) AS full_date) FROM chunk_df" \
+                    if "full_date" in chunk.columns else "SELECT * FROM chunk_df"
+                if first:
+                    con.execute(f"CREATE TABLE {table} AS {select}")
+                    first = False
+                else:
+                    con.execute(f"INSERT INTO {table} {select}")
+                con.unregister("chunk_df")
+            if first:
+                # Tabla vacía: conservar al menos el esquema
+                empty = pd.read_sql_query(f"SELECT * FROM {table} WHERE 1 = 0", engine)
+                con.register("chunk_df", empty)
+                con.execute(f"CREATE TABLE {table} AS SELECT * FROM chunk_df")
+                con.unregister("chunk_df")
+
+        if parquet_dir:
+            os.makedirs(parquet_dir, exist_ok=True)
+            for table in tables:
+                out = os.path.join(parquet_dir, f"{table}.parquet").replace("'", "''")
+                con.execute(f"COPY {table} TO '{out}' (FORMAT PARQUET)")
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+
+    os.replace(tmp, path)
+    print(f"Esquema estrella exportado a DuckDB: {path}")
+    return path
+
+
+class DuckDBStore:
+    """
+    Ejecuta los KPIs sobre la copia columnar. `path` puede ser un archivo
+    .duckdb o un directorio con los .parquet de export_star_schema.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        duckdb = _require_duckdb()
+        self.path = path
+        if os.path.isdir(path):
+            self.con = duckdb.connect()
+            for table in STAR_TABLES:
+                pq = os.path.join(path, f"{table}.parquet").replace("'", "''")
+                self.con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{pq}')")
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No existe {path}: ejecuta export_star_schema tras load.")
+            self.con = duckdb.connect(path, read_only=True)
+
+    def run_df(self, query, params=None) -> pd.DataFrame:
+        sql = _BY_TEXT.get(getattr(query, "text", None)) or duckdb_sql(query)
+        # DuckDB rechaza parámetros que la consulta no usa
+        used = set(_DUCK_PARAM_RE.findall(sql))
+        params = {k: v for k, v in (params or {}).items() if k in used}
+        # Un cursor por llamada: seguro para usar desde varios hilos
+        cur = self.con.cursor()
+        try:
+            return cur.execute(sql, params).df()
+        finally:
+            cur.close()
+
+    def close(self):
+        self.con.close()
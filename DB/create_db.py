@@ -1,14 +1,18 @@
 # DB/create_db.py
-from sqlalchemy import create_engine, text
+import os
+import re
 
-USER = "root"
-PASSWORD = "root"
-HOST = "localhost"
-PORT = 3306
+from sqlalchemy import text
 
-BASE_URL = f"mysql+pymysql://{USER}:{PASSWORD}@{HOST}:{PORT}/?charset=utf8mb4"
-DB_URL   = f"mysql+pymysql://{USER}:{PASSWORD}@{HOST}:{PORT}/ods14?charset=utf8mb4"
+from DB.engine import load_config, database_path, server_engine, get_engine, dispose_engines
 
+# Tablas del esquema estrella (dimensiones antes que hechos)
+STAR_TABLES = [
+    "dim_ocean", "dim_region", "dim_location", "dim_marine_setting",
+    "dim_sampling_method", "dim_unit", "dim_concentration_class",
+    "dim_date", "dim_organization", "dim_depth_band",
+    "fact_microplastics", "fact_species",
+]
 
 TABLES_DDL = """
 CREATE TABLE IF NOT EXISTS dim_ocean (
@@ -24,7 +28,9 @@ CREATE TABLE IF NOT EXISTS dim_region (
 CREATE TABLE IF NOT EXISTS dim_location (
   location_id INT PRIMARY KEY,
   latitude  DOUBLE,
-  longitude DOUBLE
+  longitude DOUBLE,
+  geohash VARCHAR(12),
+  KEY idx_loc_geohash (geohash)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS dim_marine_setting (
@@ -61,6 +67,13 @@ CREATE TABLE IF NOT EXISTS dim_organization (
   organization VARCHAR(255)
 ) ENGINE=InnoDB;
 
+CREATE TABLE IF NOT EXISTS dim_depth_band (
+  depth_band_id TINYINT PRIMARY KEY,
+  depth_band VARCHAR(16) NOT NULL,
+  min_depth DOUBLE,
+  max_depth DOUBLE
+) ENGINE=InnoDB;
+
 CREATE TABLE IF NOT EXISTS fact_microplastics (
   unique_id INT AUTO_INCREMENT PRIMARY KEY,
   location_id INT,
@@ -72,8 +85,12 @@ CREATE TABLE IF NOT EXISTS fact_microplastics (
   concentration_id INT,
   date_id INT,
   organization_id INT,
+  depth_band_id TINYINT,
   measurement DOUBLE,
   water_sample_depth DOUBLE,
+  source_file VARCHAR(512) NULL,
+  source_row INT NULL,
+  ingest_batch VARCHAR(32) NULL,
   CONSTRAINT fk_micro_loc  FOREIGN KEY (location_id) REFERENCES dim_location(location_id),
   CONSTRAINT fk_micro_reg  FOREIGN KEY (region_id) REFERENCES dim_region(region_id),
   CONSTRAINT fk_micro_oce  FOREIGN KEY (ocean_id) REFERENCES dim_ocean(ocean_id),
@@ -84,35 +101,127 @@ CREATE TABLE IF NOT EXISTS fact_microplastics (
   CONSTRAINT fk_micro_date FOREIGN KEY (date_id) REFERENCES dim_date(date_id),
   
   CONSTRAINT fk_micro_org  FOREIGN KEY (organization_id) REFERENCES dim_organization(organization_id),
-  KEY idx_micro_loc (location_id)
+  CONSTRAINT fk_micro_depth FOREIGN KEY (depth_band_id) REFERENCES dim_depth_band(depth_band_id),
+  KEY idx_micro_loc (location_id),
+  KEY idx_micro_depth_method (depth_band_id, method_id),
+  KEY idx_micro_source (source_file, source_row),
+  KEY idx_micro_batch (ingest_batch)
 ) ENGINE=InnoDB;
 
 CREATE TABLE IF NOT EXISTS fact_species (
   species_id INT AUTO_INCREMENT PRIMARY KEY,
   location_id INT,
   species_count INT,
+  source_file VARCHAR(512) NULL,
+  source_row INT NULL,
+  ingest_batch VARCHAR(32) NULL,
   CONSTRAINT fk_species_loc FOREIGN KEY (location_id) REFERENCES dim_location(location_id),
-  KEY idx_spec_loc (location_id)
+  KEY idx_spec_loc (location_id),
+  KEY idx_spec_source (source_file, source_row),
+  KEY idx_spec_batch (ingest_batch)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS quantile_sketch (
+  sketch_id INT AUTO_INCREMENT PRIMARY KEY,
+  dim VARCHAR(16) NOT NULL,
+  member_id INT,
+  year SMALLINT,
+  n_values INT NOT NULL,
+  min_value DOUBLE,
+  max_value DOUBLE,
+  centroids BLOB NOT NULL,
+  KEY idx_sketch_dim_year (dim, year, member_id)
 ) ENGINE=InnoDB;
-"""
 
-def create_database():
-    # 1) Conexión al servidor MySQL (sin especificar base de datos)
-    server = create_engine(BASE_URL, future=True)
-    with server.begin() as conn:
-        conn.execute(text("DROP DATABASE IF EXISTS ods14;"))
-        conn.execute(text("CREATE DATABASE ods14 CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci;"))
-        print("Base de datos 'ods14' recreada.")
+CREATE TABLE IF NOT EXISTS quarantine (
+  quarantine_id INT AUTO_INCREMENT PRIMARY KEY,
+  source_table VARCHAR(64) NOT NULL,
+  reason_codes VARCHAR(255) NOT NULL,
+  row_data TEXT,
+  source_file VARCHAR(512) NULL,
+  ingest_batch VARCHAR(32) NULL,
+  KEY idx_quar_src (source_table),
+  KEY idx_quar_file (source_file)
+) ENGINE=InnoDB;
+"""
 
-    # 2) Crear las tablas conectados a la nueva base de datos
-    engine = create_engine(DB_URL, future=True)
+_KEY_RE = re.compile(r",\s*KEY\s+(\w+)\s*\(([^)]*)\)")
+_TABLE_RE = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)")
+
+
+def ddl_statements(backend: str = "mysql", ddl: str = TABLES_DDL) -> list:
+    """
+    Sentencias DDL para el backend indicado. TABLES_DDL está escrito para MySQL;
+    para sqlite/duckdb se quitan ENGINE=InnoDB, los índices en línea (KEY ...)
+    pasan a CREATE INDEX y AUTO_INCREMENT se traduce.
+    """
+    stmts = [s.strip() for s in ddl.strip().split(";") if s.strip()]
+    if backend == "mysql":
+        return stmts
+
+    out = []
+    for stmt in stmts:
+        table = _TABLE_RE.search(stmt)
+        indexes = _KEY_RE.findall(stmt)
+        stmt = _KEY_RE.sub("", stmt)
+        stmt = re.sub(r"\)\s*ENGINE=\w+\s*$", ")", stmt)
+        if "AUTO_INCREMENT" in stmt:
+            if backend == "sqlite":
+                stmt = stmt.replace("INT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY")
+            else:
+                seq = f"seq_{table.group(1)}"
+                out.append(f"CREATE SEQUENCE IF NOT EXISTS {seq}")
+                stmt = stmt.replace("INT AUTO_INCREMENT PRIMARY KEY",
+                                    f"INTEGER PRIMARY KEY DEFAULT nextval('{seq}')")
+        out.append(stmt)
+        for name, cols in indexes:
+            out.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table.group(1)} ({cols})")
+    return out
+
+
+def create_database(database: str = None, partitioned: bool = False, years=None):
+    """
+    Recrea la base de datos y sus tablas. partitioned=True (solo MySQL) crea
+    fact_microplastics particionada por año (ver DB/partitions.py); `years`
+    son los años con partición propia.
+    """
+    cfg = load_config()
+    database = database or cfg["database"]
+    statements = ddl_statements(cfg["backend"])
+    if partitioned:
+        if cfg["backend"] == "mysql":
+            from DB.partitions import partitioned_fact_ddl, default_years
+            statements = [
+                partitioned_fact_ddl(stmt, years if years is not None else default_years())
+                if stmt.startswith("CREATE TABLE IF NOT EXISTS fact_microplastics") else stmt
+                for stmt in statements
+            ]
+        else:
+            print(f"Particionado no disponible en {cfg['backend']}: se usa el esquema sin particiones.")
+
+    # 1) Recrear la base de datos
+    dispose_engines(database)
+    if cfg["backend"] == "mysql":
+        # Conexión al servidor MySQL (sin especificar base de datos)
+        server = server_engine(cfg)
+        with server.begin() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {database};"))
+            conn.execute(text(f"CREATE DATABASE {database} CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci;"))
+        server.dispose()
+    else:
+        path = database_path(cfg, database)
+        for suffix in ("", "-wal", "-shm", ".wal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    print(f"Base de datos '{database}' recreada ({cfg['backend']}).")
+
+    # 2) Crear las tablas con el engine compartido
+    engine = get_engine(database)
     with engine.begin() as conn:
-        for stmt in [s.strip() for s in TABLES_DDL.strip().split(";") if s.strip()]:
+        for stmt in statements:
             conn.execute(text(stmt))
-        print("Tablas creadas/verificadas en 'ods14'.")
+        print(f"Tablas creadas/verificadas en '{database}'.")
 
-def get_engine():
-    return create_engine(DB_URL, future=True)
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    create_database()
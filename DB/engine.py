@@ -0,0 +1,176 @@
+# DB/engine.py
+"""
+Engine factory driven by environment variables.
+
+Backends (ODS14_DB_BACKEND):
+  - mysql  (default): mysql+pymysql, pooled connections
+  - sqlite : local file ``<database>.sqlite`` (no server needed)
+  - duckdb : local file ``<database>.duckdb`` (requires duckdb + duckdb_engine)
+
+Every option has an ODS14_* variable, e.g. ODS14_DB_HOST, ODS14_DB_POOL_SIZE,
+ODS14_DB_PRE_PING, ODS14_DB_LOCAL_INFILE. See ``load_config`` for the full list.
+"""
+import math
+import os
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+
+BACKENDS = ("mysql", "sqlite", "duckdb")
+
+_ENGINES = {}
+_LOCK = threading.Lock()
+
+
+def _env(name, default=None):
+    return os.getenv(f"ODS14_{name}", default)
+
+
+def _env_bool(name, default: bool) -> bool:
+    val = _env(name)
+    if val is None:
+        return default
+    return val.strip().lower() in ("1", "true", "yes", "on")
+
+
+def load_config(**overrides) -> dict:
+    """Lee la configuración de conexión del entorno; `overrides` tiene prioridad."""
+    cfg = {
+        "backend": _env("DB_BACKEND", "mysql").lower(),
+        "user": _env("DB_USER", "root"),
+        "password": _env("DB_PASSWORD", "root"),
+        "host": _env("DB_HOST", "localhost"),
+        "port": int(_env("DB_PORT", "3306")),
+        "database": _env("DB_NAME", "ods14"),
+        # Directorio de los archivos .sqlite/.duckdb
+        "data_dir": _env("DB_DATA_DIR", "."),
+        # Pool (solo aplica a backends con servidor o archivo compartido)
+        "pool_size": int(_env("DB_POOL_SIZE", "5")),
+        "max_overflow": int(_env("DB_MAX_OVERFLOW", "10")),
+        "pool_pre_ping": _env_bool("DB_PRE_PING", True),
+        "pool_recycle": int(_env("DB_POOL_RECYCLE", "3600")),
+        "pool_timeout": int(_env("DB_POOL_TIMEOUT", "30")),
+        # Cursores del lado del servidor (stream de resultados grandes)
+        "server_side_cursors": _env_bool("DB_SERVER_SIDE_CURSORS", False),
+        # LOAD DATA LOCAL INFILE (MySQL)
+        "local_infile": _env_bool("DB_LOCAL_INFILE", False),
+        "echo": _env_bool("DB_ECHO", False),
+    }
+    cfg.update({k: v for k, v in overrides.items() if v is not None})
+    if cfg["backend"] not in BACKENDS:
+        raise ValueError(f"Backend '{cfg['backend']}' no soportado. Usa uno de {BACKENDS}.")
+    return cfg
+
+
+def database_path(cfg: dict, database: str = None) -> str:
+    """Ruta del archivo para los backends embebidos (sqlite/duckdb)."""
+    name = database or cfg["database"]
+    return os.path.join(cfg["data_dir"], f"{name}.{cfg['backend']}")
+
+
+def database_url(cfg: dict, database: str = None) -> str:
+    if cfg["backend"] == "mysql":
+        db = database if database is not None else cfg["database"]
+        return (f"mysql+pymysql://{cfg['user']}:{cfg['password']}@{cfg['host']}:{cfg['port']}"
+                f"/{db}?charset=utf8mb4")
+    return f"{cfg['backend']}:///{database_path(cfg, database)}"
+
+
+class _StdDevSamp:
+    """STDDEV_SAMP para SQLite (no la trae de fábrica)."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        # Welford
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        if self.n < 2:
+            return None
+        return math.sqrt(self.m2 / (self.n - 1))
+
+
+def _sqlite_on_connect(dbapi_conn, _record):
+    dbapi_conn.create_aggregate("STDDEV_SAMP", 1, _StdDevSamp)
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.close()
+
+
+def make_engine(cfg: dict, database: str = None):
+    """Crea un engine nuevo (sin caché) con las opciones de `cfg`."""
+    kwargs = {"future": True, "echo": cfg["echo"]}
+    connect_args = {}
+    exec_opts = {}
+
+    if cfg["server_side_cursors"]:
+        exec_opts["stream_results"] = True
+
+    if cfg["backend"] == "mysql":
+        if cfg["local_infile"]:
+            connect_args["local_infile"] = True
+    elif cfg["backend"] == "sqlite":
+        os.makedirs(cfg["data_dir"], exist_ok=True)
+        # El pool comparte conexiones entre hilos (consultas concurrentes de reportes)
+        connect_args["check_same_thread"] = False
+    else:
+        os.makedirs(cfg["data_dir"], exist_ok=True)
+
+    kwargs.update(
+        pool_size=cfg["pool_size"],
+        max_overflow=cfg["max_overflow"],
+        pool_pre_ping=cfg["pool_pre_ping"],
+        pool_recycle=cfg["pool_recycle"],
+        pool_timeout=cfg["pool_timeout"],
+    )
+    if connect_args:
+        kwargs["connect_args"] = connect_args
+    if exec_opts:
+        kwargs["execution_options"] = exec_opts
+
+    engine = create_engine(database_url(cfg, database), **kwargs)
+    if cfg["backend"] == "sqlite":
+        event.listen(engine, "connect", _sqlite_on_connect)
+    return engine
+
+
+def server_engine(cfg: dict = None):
+    """
+    Engine sin base de datos para CREATE/DROP DATABASE en MySQL.
+    Usa NullPool: no deja conexiones abiertas tras el DDL.
+    """
+    cfg = cfg or load_config()
+    return create_engine(database_url(cfg, database=""), future=True, poolclass=NullPool)
+
+
+def get_engine(database: str = None, **overrides):
+    """
+    Devuelve el engine compartido (uno por backend/base de datos), de modo que
+    load y los reportes reutilicen el mismo pool de conexiones.
+    """
+    cfg = load_config(**overrides)
+    key = (database or cfg["database"], database_url(cfg, database), tuple(sorted(overrides.items())))
+    with _LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = _ENGINES[key] = make_engine(cfg, database)
+    return engine
+
+
+def dispose_engines(database: str = None):
+    """Cierra los pools (todos, o solo los de `database`)."""
+    with _LOCK:
+        for key in list(_ENGINES):
+            if database is None or key[0] == database:
+                _ENGINES.pop(key).dispose()
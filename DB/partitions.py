@@ -0,0 +1,149 @@
+# DB/partitions.py
+"""
+Optional year-partitioned layout for fact_microplastics (MySQL only).
+
+The table is partitioned BY RANGE (date_id) with one partition per year
+(date_id is YYYYMMDD, so year Y is `VALUES LESS THAN ((Y+1)*10000)`).
+MySQL does not allow foreign keys on partitioned tables, and every unique key
+must include date_id, so this variant drops the FK constraints and keeps
+unique_id as a plain (non-unique) auto-increment key. Rows without a date go
+to the p_undated partition.
+
+Reloading one year swaps a freshly loaded staging table in with
+ALTER TABLE ... EXCHANGE PARTITION instead of DELETE + INSERT.
+"""
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+FACT_TABLE = "fact_microplastics"
+SWAP_TABLE = "fact_microplastics_swap"
+
+
+def partition_name(year: int) -> str:
+    return f"p{int(year)}"
+
+
+def partition_clause(years) -> str:
+    years = sorted({int(y) for y in years})
+    parts = ["  PARTITION p_undated VALUES LESS THAN (10000000)"]
+    parts += [f"  PARTITION {partition_name(y)} VALUES LESS THAN ({(y + 1) * 10000})" for y in years]
+    parts.append("  PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (date_id) (\n" + ",\n".join(parts) + "\n)"
+
+
+def partitioned_fact_ddl(fact_ddl: str, years) -> str:
+    """
+    Convierte el CREATE TABLE de fact_microplastics (TABLES_DDL) en su versión
+    particionada por año.
+    """
+    ddl = fact_ddl.strip().rstrip(";")
+    ddl = re.sub(r"\n\s*CONSTRAINT [^\n]*", "", ddl)
+    ddl = ddl.replace("unique_id INT AUTO_INCREMENT PRIMARY KEY", "unique_id INT AUTO_INCREMENT")
+    ddl = re.sub(r"\n\s*\n", "\n", ddl)
+    ddl = re.sub(
+        r"(KEY idx_micro_loc \(location_id\))",
+        r"KEY idx_micro_uid (unique_id),\n  KEY idx_micro_date (date_id),\n  \1",
+        ddl,
+    )
+    return f"{ddl}\n{partition_clause(years)}"
+
+
+def default_years(first: int = 1970, last: int = None):
+    return range(first, (last or date.today().year + 1) + 1)
+
+
+def is_partitioned(conn) -> bool:
+    return bool(conn.execute(text("""
+        SELECT COUNT(*) FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = :t AND partition_name IS NOT NULL
+    """), {"t": FACT_TABLE}).scalar_one())
+
+
+def ensure_year_partitions(engine, years):
+    """Agrega particiones para años nuevos dividiendo p_future."""
+    with engine.begin() as conn:
+        existing = {row[0] for row in conn.execute(text("""
+            SELECT partition_name FROM information_schema.partitions
+            WHERE table_schema = DATABASE() AND table_name = :t
+        """), {"t": FACT_TABLE})}
+        missing = sorted(int(y) for y in years if partition_name(y) not in existing)
+        if not missing:
+            return
+        # p_future sólo puede dividirse hacia valores mayores al último año existente
+        last = max((int(p[1:]) for p in existing if p and p[1:].isdigit()), default=0)
+        too_old = [y for y in missing if y <= last]
+        if too_old:
+            raise ValueError(f"Años {too_old} anteriores al rango particionado: recrea la tabla con esos años.")
+        new_parts = ",\n".join(
+            f"PARTITION {partition_name(y)} VALUES LESS THAN ({(y + 1) * 10000})" for y in missing
+        )
+        conn.execute(text(
+            f"ALTER TABLE {FACT_TABLE} REORGANIZE PARTITION p_future INTO (\n{new_parts},\n"
+            f"PARTITION p_future VALUES LESS THAN MAXVALUE)"
+        ))
+
+
+def _year_frames(dfs: dict, year: int) -> dict:
+    """
+    Subconjunto de `dfs` (salida de transform) para recargar `year`: sus filas
+    de fact_microplastics y solo los miembros de dimensión que ellas usan.
+    """
+    from ETL.lineage import DIM_KEYS
+
+    lo, hi = year * 10000, (year + 1) * 10000
+    fact = dfs["fact_micro"]
+    rows = fact[(fact["date_id"] >= lo) & (fact["date_id"] < hi)]
+    out = {"fact_micro": rows, "fact_species": dfs["fact_species"].iloc[:0]}
+    for key, id_col, _ in [("dim_location", "location_id", None)] + DIM_KEYS:
+        out[key] = dfs[key][dfs[key][id_col].isin(rows[id_col])]
+    out["dim_date"] = dfs["dim_date"][dfs["dim_date"]["date_id"].isin(rows["date_id"])]
+    return out
+
+
+def reload_year(engine, year: int, dfs: dict, typed: bool = False):
+    """
+    Reemplaza todas las filas de `year` en fact_microplastics con las de
+    `dfs` (salida de transform) mediante EXCHANGE PARTITION. Las claves
+    sustitutas de transform son posicionales, así que antes de escribir se
+    traducen a las del warehouse por clave natural (los miembros y fechas
+    que falten se insertan).
+    """
+    from ETL.load import _write
+    from ETL.lineage import to_warehouse_keys
+
+    year = int(year)
+    year_dfs = _year_frames(dfs, year)
+
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            raise RuntimeError(f"{FACT_TABLE} no está particionada (usa create_database(partitioned=True)).")
+    ensure_year_partitions(engine, [year])
+    with engine.begin() as conn:
+        next_id = conn.execute(text(f"SELECT COALESCE(MAX(unique_id), 0) + 1 FROM {FACT_TABLE}")).scalar_one()
+        conn.execute(text(f"DROP TABLE IF EXISTS {SWAP_TABLE}"))
+        conn.execute(text(f"CREATE TABLE {SWAP_TABLE} LIKE {FACT_TABLE}"))
+        conn.execute(text(f"ALTER TABLE {SWAP_TABLE} REMOVE PARTITIONING"))
+        conn.execute(text(f"ALTER TABLE {SWAP_TABLE} AUTO_INCREMENT = {int(next_id)}"))
+        # Ids del warehouse (la tabla particionada no tiene FKs que detecten ids locales)
+        to_warehouse_keys(conn, year_dfs, typed)
+        rows = year_dfs["fact_micro"]
+        _write(conn, rows, SWAP_TABLE, typed)
+
+    # DDL: MySQL hace commit implícito, se ejecuta fuera de la transacción anterior
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {FACT_TABLE} EXCHANGE PARTITION {partition_name(year)} "
+            f"WITH TABLE {SWAP_TABLE} WITH VALIDATION"
+        ))
+        # Tras el intercambio la tabla swap contiene las filas antiguas del año
+        old_rows = conn.execute(text(f"SELECT COUNT(*) FROM {SWAP_TABLE}")).scalar_one()
+        conn.execute(text(f"DROP TABLE {SWAP_TABLE}"))
+
+    # Los sketches del año se reconstruyen con las filas nuevas
+    from DB.sketches import refresh_year
+    with engine.begin() as conn:
+        refresh_year(conn, rows, year, typed)
+    print(f"Año {year} recargado por EXCHANGE PARTITION: {len(rows)} filas nuevas, {old_rows} reemplazadas.")
+    return len(rows)
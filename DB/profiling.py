@@ -0,0 +1,259 @@
+# DB/profiling.py
+"""
+Query profiling for the named KPI queries (DB/queries.py).
+
+`QueryProfiler.run(name, engine, query, params)` executes a query like
+`pd.read_sql` and records:
+  - wall time and rows returned
+  - on MySQL, server time plus rows examined and rows sent, read from
+    performance_schema.events_statements_history for the same connection
+  - the plan, captured once per query and run: EXPLAIN FORMAT=JSON on MySQL
+    and EXPLAIN QUERY PLAN on SQLite
+
+`finish()` writes a ranked slow-query report (CSV) for the run and compares
+each plan with the one stored by the previous run (plans.json). It raises an
+alert when a table that used an index now gets a full scan. The profiler is
+safe to share between the threads of reports.visualizations.fetch_kpis.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+DEFAULT_DIR = "reports/profiling"
+
+# Tipos de acceso de MySQL que recorren la tabla completa
+_MYSQL_FULL_SCAN = {"ALL"}
+
+_PS_LAST_STATEMENT = text("""
+SELECT TIMER_WAIT / 1e9 AS server_ms, ROWS_EXAMINED AS rows_examined, ROWS_SENT AS rows_sent
+FROM performance_schema.events_statements_history
+WHERE THREAD_ID = (SELECT THREAD_ID FROM performance_schema.threads WHERE PROCESSLIST_ID = CONNECTION_ID())
+ORDER BY EVENT_ID DESC
+LIMIT 1
+""")
+
+
+_FROM_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"on", "where", "left", "right", "inner", "outer", "cross", "join", "group", "order",
+              "limit", "using", "union", "having", "window", "natural"}
+
+
+class PlanRegression(RuntimeError):
+    pass
+
+
+def _aliases(sql: str) -> dict:
+    """{alias o nombre: tabla} de los FROM/JOIN de la consulta."""
+    out = {}
+    for table, alias in _FROM_RE.findall(sql):
+        out.setdefault(table, table)
+        if alias and alias.lower() not in _NOT_ALIAS:
+            out.setdefault(alias, table)
+    return out
+
+
+def _mysql_access(plan: dict) -> dict:
+    """{tabla: access_type} recorriendo el JSON de EXPLAIN FORMAT=JSON."""
+    access = {}
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "table_name" in node and "access_type" in node:
+                access.setdefault(node["table_name"], node["access_type"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(plan)
+    return access
+
+
+def _sqlite_access(rows) -> dict:
+    """{tabla: 'SCAN' | 'INDEX'} a partir de las filas de EXPLAIN QUERY PLAN."""
+    access = {}
+    for detail in rows:
+        words = detail.split()
+        if len(words) < 2 or words[0] not in ("SCAN", "SEARCH"):
+            continue
+        table = words[1]
+        full = words[0] == "SCAN" and "USING" not in words
+        # Una misma tabla puede aparecer varias veces: basta un recorrido completo
+        if full or table not in access:
+            access[table] = "SCAN" if full else "INDEX"
+    return access
+
+
+class QueryProfiler:
+    def __init__(self, report_dir: str = DEFAULT_DIR, strict: bool = False):
+        """strict=True hace que finish() lance PlanRegression si algún plan empeora."""
+        self.report_dir = report_dir
+        self.strict = strict
+        self.records = []
+        self.plans = {}
+        self.alerts = []
+        self._tables = None
+        self._lock = threading.Lock()
+
+    # ---------------------------
+    # Captura
+    # ---------------------------
+    def run(self, name: str, engine, query, params=None) -> pd.DataFrame:
+        params = params or {}
+        if hasattr(engine, "run_df"):
+            # DuckDBStore: solo tiempo de pared
+            t0 = time.perf_counter()
+            df = engine.run_df(query, params)
+            self._record(name, "duckdb", (time.perf_counter() - t0) * 1000, len(df), {})
+            return df
+
+        dialect = engine.dialect.name
+        with engine.connect() as conn:
+            t0 = time.perf_counter()
+            df = pd.read_sql(query, conn, params=params)
+            wall_ms = (time.perf_counter() - t0) * 1000
+            server = self._server_stats(conn) if dialect == "mysql" else {}
+            with self._lock:
+                need_plan = name not in self.plans
+                if need_plan:
+                    self.plans[name] = None  # reservado: otro hilo no lo repite
+            if need_plan:
+                if self._tables is None:
+                    self._tables = set(inspect(conn).get_table_names())
+                plan = self._plan(conn, dialect, query, params, self._tables)
+                with self._lock:
+                    self.plans[name] = plan
+        self._record(name, dialect, wall_ms, len(df), server)
+        return df
+
+    def _record(self, name, dialect, wall_ms, rows_returned, server):
+        with self._lock:
+            self.records.append({
+                "query": name,
+                "backend": dialect,
+                "wall_ms": wall_ms,
+                "server_ms": server.get("server_ms"),
+                "rows_examined": server.get("rows_examined"),
+                "rows_returned": rows_returned,
+            })
+
+    @staticmethod
+    def _server_stats(conn) -> dict:
+        try:
+            row = conn.execute(_PS_LAST_STATEMENT).mappings().first()
+        except Exception:
+            # performance_schema deshabilitado o sin permisos
+            return {}
+        return dict(row) if row else {}
+
+    @staticmethod
+    def _plan(conn, dialect, query, params, tables) -> dict:
+        """
+        Plan de la consulta: acceso por tabla/alias, tablas base recorridas
+        completas (las CTE y subconsultas materializadas no cuentan) y un hash.
+        """
+        sql = getattr(query, "text", query)
+        try:
+            if dialect == "mysql":
+                raw = conn.execute(text("EXPLAIN FORMAT=JSON " + sql), params).scalar_one()
+                access = _mysql_access(json.loads(raw))
+                scanned = [t for t, a in access.items() if a in _MYSQL_FULL_SCAN]
+            elif dialect == "sqlite":
+                rows = [r[-1] for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params)]
+                raw = "\n".join(rows)
+                access = _sqlite_access(rows)
+                scanned = [t for t, a in access.items() if a == "SCAN"]
+            else:
+                return None
+        except Exception as exc:
+            return {"error": str(exc)}
+        aliases = _aliases(sql)
+        full = sorted({aliases.get(t, t) for t in scanned} & tables)
+        return {
+            "access": access,
+            "full_scans": full,
+            "hash": hashlib.sha1(json.dumps(access, sort_keys=True).encode()).hexdigest()[:12],
+            "raw": raw,
+        }
+
+    # ---------------------------
+    # Reporte
+    # ---------------------------
+    def summary(self) -> pd.DataFrame:
+        """Una fila por consulta, ordenada de la más lenta a la más rápida."""
+        with self._lock:
+            records = list(self.records)
+            plans = dict(self.plans)
+        if not records:
+            return pd.DataFrame()
+        df = pd.DataFrame(records)
+        # En SQLite/DuckDB server_ms y rows_examined son None: float para que las medianas den NaN
+        metrics = ["wall_ms", "server_ms", "rows_examined", "rows_returned"]
+        df[metrics] = df[metrics].apply(pd.to_numeric, errors="coerce").astype("float64")
+        out = df.groupby(["query", "backend"], sort=False).agg(
+            calls=("wall_ms", "size"),
+            wall_ms=("wall_ms", "median"),
+            server_ms=("server_ms", "median"),
+            rows_examined=("rows_examined", "median"),
+            rows_returned=("rows_returned", "median"),
+        ).reset_index()
+        out["examined_per_returned"] = out["rows_examined"] / out["rows_returned"].where(out["rows_returned"] > 0)
+        out["full_scans"] = out["query"].map(lambda q: ", ".join((plans.get(q) or {}).get("full_scans", [])))
+        out["plan_hash"] = out["query"].map(lambda q: (plans.get(q) or {}).get("hash"))
+        rank_col = out["server_ms"].fillna(out["wall_ms"])
+        return out.assign(_rank=rank_col).sort_values("_rank", ascending=False).drop(columns="_rank").reset_index(drop=True)
+
+    def _check_plans(self, previous: dict) -> list:
+        alerts = []
+        for name, plan in self.plans.items():
+            old = previous.get(name)
+            if not plan or not old or "full_scans" not in plan or "full_scans" not in old:
+                continue
+            new_scans = sorted(set(plan["full_scans"]) - set(old["full_scans"]))
+            if new_scans:
+                alerts.append(f"{name}: el plan cambió a recorrido completo de {', '.join(new_scans)} "
+                              f"(plan {old.get('hash')} -> {plan.get('hash')})")
+        return alerts
+
+    def finish(self, print_top: int = 5) -> pd.DataFrame:
+        """
+        Escribe el reporte de la corrida (query_profile_<fecha>.csv), compara los
+        planes con los de la corrida anterior (plans.json) y los actualiza.
+        """
+        os.makedirs(self.report_dir, exist_ok=True)
+        summary = self.summary()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_path = os.path.join(self.report_dir, f"query_profile_{stamp}.csv")
+        summary.to_csv(report_path, index=False)
+
+        plans_path = os.path.join(self.report_dir, "plans.json")
+        previous = {}
+        if os.path.exists(plans_path):
+            with open(plans_path, encoding="utf-8") as f:
+                previous = json.load(f)
+        self.alerts = self._check_plans(previous)
+        merged = {**previous, **{k: v for k, v in self.plans.items() if v and "error" not in v}}
+        tmp = plans_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(merged, f, indent=2, sort_keys=True)
+        os.replace(tmp, plans_path)
+
+        if len(summary):
+            print(f"\nConsultas más lentas (reporte completo en {report_path}):")
+            for _, row in summary.head(print_top).iterrows():
+                server = f"{row['server_ms']:.1f} ms servidor, " if pd.notna(row["server_ms"]) else ""
+                scans = f" | full scan: {row['full_scans']}" if row["full_scans"] else ""
+                print(f"  {row['query']:20s} {row['wall_ms']:8.1f} ms ({server}{int(row['rows_returned'])} filas){scans}")
+        for alert in self.alerts:
+            print(f"ALERTA plan: {alert}")
+        if self.alerts and self.strict:
+            raise PlanRegression("; ".join(self.alerts))
+        return summary
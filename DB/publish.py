@@ -0,0 +1,181 @@
+# DB/publish.py
+"""
+Blue/green publish of the warehouse without downtime.
+
+`create_database` drops the whole database before loading, so reports see an
+empty or half-loaded warehouse while the ETL runs. `publish` instead:
+
+  1. creates an empty `shadow_*` copy of every warehouse table in the live
+     database (live tables are not touched) and loads the new data there;
+  2. reconciles every shadow table with the frames that were loaded: row
+     counts and per-column checksums, in one statement (DB/reconcile.py);
+  3. swaps generations in one atomic rename: live `t` -> `prev_t` and
+     `shadow_t` -> `t` (a single RENAME TABLE on MySQL, one transaction of
+     ALTER TABLE ... RENAME on SQLite).
+
+Readers keep querying the live tables during the load. On MySQL the rename
+only waits for the metadata locks of queries already running. The previous
+generation stays as `prev_*` until the next publish, and `rollback` swaps it
+back in the same way.
+
+Foreign keys follow the renamed tables, so `prev_*` facts keep pointing at
+`prev_*` dimensions. Shadow FK constraints are left unnamed: MySQL renames the
+generated `<table>_ibfk_N` names together with the table. SQLite index names
+are global to the database, so they carry the generation stamp. DuckDB does
+not allow renaming a table that other tables reference, so publish is only
+available on MySQL and SQLite.
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from DB.create_db import STAR_TABLES, ddl_statements
+from DB.engine import load_config, server_engine, get_engine
+from DB.reconcile import reconcile, mismatches
+
+SHADOW_PREFIX = "shadow_"
+PREV_PREFIX = "prev_"
+
+# Tablas que cambian de generación juntas (dimensiones antes que hechos)
+PUBLISH_TABLES = STAR_TABLES + ["quantile_sketch", "quarantine"]
+
+_NAME_RE = re.compile(r"\b(CREATE TABLE IF NOT EXISTS|REFERENCES|ON)\s+(\w+)")
+_INDEX_RE = re.compile(r"CREATE INDEX IF NOT EXISTS (\w+)")
+
+
+class PublishError(RuntimeError):
+    pass
+
+
+def shadow_ddl(backend: str, generation: str, partitioned: bool = False, years=None) -> list:
+    """DDL de TABLES_DDL con cada tabla renombrada a shadow_<tabla>."""
+    statements = ddl_statements(backend)
+    if partitioned and backend == "mysql":
+        from DB.partitions import partitioned_fact_ddl, default_years
+        statements = [
+            partitioned_fact_ddl(stmt, years if years is not None else default_years())
+            if stmt.startswith("CREATE TABLE IF NOT EXISTS fact_microplastics") else stmt
+            for stmt in statements
+        ]
+
+    def rename(match):
+        name = match.group(2)
+        return f"{match.group(1)} {SHADOW_PREFIX + name if name in PUBLISH_TABLES else name}"
+
+    out = []
+    for stmt in statements:
+        stmt = _NAME_RE.sub(rename, stmt)
+        stmt = re.sub(r"CONSTRAINT \w+\s+FOREIGN KEY", "FOREIGN KEY", stmt)
+        stmt = _INDEX_RE.sub(lambda m: f"CREATE INDEX IF NOT EXISTS {m.group(1)}_{generation}", stmt)
+        out.append(stmt)
+    return out
+
+
+def _ensure_database(cfg: dict, database: str):
+    """Crea la base de datos si no existe (sin borrar nada)."""
+    if cfg["backend"] != "mysql":
+        return
+    server = server_engine(cfg)
+    with server.begin() as conn:
+        conn.execute(text(
+            f"CREATE DATABASE IF NOT EXISTS {database} CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci;"
+        ))
+    server.dispose()
+
+
+def _drop(conn, prefix: str, existing: set):
+    # Hechos antes que dimensiones: ninguna FK queda apuntando a una tabla borrada
+    for table in reversed(PUBLISH_TABLES):
+        if prefix + table in existing:
+            conn.execute(text(f"DROP TABLE {prefix + table}"))
+
+
+def _begin_ddl(conn, backend: str):
+    # SQLite: el DDL es transaccional, pero pysqlite no abre la transacción
+    # antes de un DDL; sin BEGIN explícito cada DROP/RENAME se confirmaría solo
+    if backend == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _rename(conn, backend: str, pairs: list):
+    """Aplica los renombres [(origen, destino), ...] de forma atómica."""
+    if not pairs:
+        return
+    if backend == "mysql":
+        conn.execute(text("RENAME TABLE " + ", ".join(f"{a} TO {b}" for a, b in pairs)))
+    else:
+        for a, b in pairs:
+            conn.execute(text(f"ALTER TABLE {a} RENAME TO {b}"))
+
+
+def publish(dfs: dict, typed: bool = False, partitioned: bool = False, years=None, database: str = None) -> dict:
+    """
+    Carga `dfs` en tablas shadow_*, las concilia con `dfs` y las publica como la
+    generación activa. La anterior queda en prev_* para `rollback`. Si la
+    validación falla, las tablas activas no cambian y se lanza PublishError
+    (las shadow_* quedan para inspección). Devuelve {tabla: filas}.
+    """
+    from ETL.load import load
+
+    cfg = load_config()
+    if cfg["backend"] == "duckdb":
+        raise PublishError("publish no está disponible en duckdb: no permite renombrar tablas referenciadas por FK.")
+    database = database or cfg["database"]
+    _ensure_database(cfg, database)
+    engine = get_engine(database)
+    generation = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    # 1) Tablas shadow vacías junto a las activas
+    with engine.begin() as conn:
+        _drop(conn, SHADOW_PREFIX, set(inspect(conn).get_table_names()))
+        for stmt in shadow_ddl(cfg["backend"], generation, partitioned, years):
+            conn.execute(text(stmt))
+
+    # 2) Carga y conciliación (conteos y checksums por columna en una sola consulta)
+    load(dfs, engine, typed=typed, prefix=SHADOW_PREFIX)
+    report = reconcile(engine, dfs, prefix=SHADOW_PREFIX, raise_on_mismatch=False)
+    problems = mismatches(report)
+    with engine.connect() as conn:
+        n_sketches = conn.execute(text(f"SELECT COUNT(*) FROM {SHADOW_PREFIX}quantile_sketch")).scalar_one()
+    if len(dfs["fact_micro"]) and not n_sketches:
+        problems.append("quantile_sketch: vacía con fact_microplastics cargada")
+    if problems:
+        raise PublishError("Validación de la generación nueva fallida; se mantiene la activa:\n  "
+                           + "\n  ".join(problems))
+    actual = {r.table: int(r.actual) for r in report[report["metric"] == "rows"].itertuples(index=False)}
+    actual["quantile_sketch"] = n_sketches
+
+    # 3) Intercambio: activa -> prev_, shadow_ -> activa
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        _begin_ddl(conn, cfg["backend"])
+        _drop(conn, PREV_PREFIX, existing)
+        pairs = [(t, PREV_PREFIX + t) for t in PUBLISH_TABLES if t in existing]
+        pairs += [(SHADOW_PREFIX + t, t) for t in PUBLISH_TABLES]
+        _rename(conn, cfg["backend"], pairs)
+    print(f"Generación {generation} publicada en '{database}' "
+          f"({actual['fact_microplastics']} filas en fact_microplastics); la anterior queda en {PREV_PREFIX}*.")
+    return actual
+
+
+def rollback(database: str = None):
+    """
+    Vuelve a publicar la generación prev_* y deja la activa como prev_*
+    (un segundo rollback deshace el primero).
+    """
+    cfg = load_config()
+    database = database or cfg["database"]
+    engine = get_engine(database)
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        missing = [t for t in PUBLISH_TABLES if PREV_PREFIX + t not in existing]
+        if missing:
+            raise PublishError(f"No hay generación anterior completa para volver atrás (faltan {PREV_PREFIX}{missing[0]}...).")
+        _begin_ddl(conn, cfg["backend"])
+        _drop(conn, SHADOW_PREFIX, existing)
+        pairs = [(t, SHADOW_PREFIX + t) for t in PUBLISH_TABLES if t in existing]
+        pairs += [(PREV_PREFIX + t, t) for t in PUBLISH_TABLES]
+        pairs += [(SHADOW_PREFIX + t, PREV_PREFIX + t) for t in PUBLISH_TABLES if t in existing]
+        _rename(conn, cfg["backend"], pairs)
+    print(f"Rollback en '{database}': la generación anterior vuelve a estar activa.")
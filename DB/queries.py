@@ -1,5 +1,10 @@
 from sqlalchemy import text
 
+# Las consultas con ventana de fechas filtran también m.date_id (YYYYMMDD) para
+# que MySQL pode particiones cuando fact_microplastics está particionada por año.
+# Parámetros: start_date/end_date ('YYYY-MM-DD') y start_date_id/end_date_id;
+# window_params() arma los cuatro.
+
 # -------------------------------------------------
 # 1) Microplastics by Region (Top 10)
 MICRO_BY_REGION_TOP10 = text("""
@@ -13,6 +18,8 @@ WITH region_avg AS (
   LEFT JOIN dim_date d ON m.date_id = d.date_id
   WHERE (:start_date IS NULL OR d.full_date >= :start_date)
     AND (:end_date IS NULL OR d.full_date < :end_date)
+    AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+    AND (:end_date_id IS NULL OR m.date_id < :end_date_id)
   GROUP BY r.region
 )
 SELECT *
@@ -25,31 +32,34 @@ LIMIT 10;
 # -------------------------------------------------
 # 2) Depth effects (Top 10)
 DEPTH_BINS_EFFECT_TOP10 = text("""
+-- depth_band_id se calcula en transform (dim_depth_band): se agrupa por el id.
+-- Sigue leyendo measurement y filtrando por fecha (JOIN dim_date): no sale solo del índice.
 WITH depth_avg AS (
   SELECT
-    CASE
-      WHEN m.water_sample_depth IS NULL THEN 'Unknown'
-      WHEN m.water_sample_depth < 5 THEN '0-5m'
-      WHEN m.water_sample_depth < 20 THEN '5-20m'
-      WHEN m.water_sample_depth < 50 THEN '20-50m'
-      WHEN m.water_sample_depth < 200 THEN '50-200m'
-      ELSE '200m+'
-    END AS depth_band,
+    m.depth_band_id,
     AVG(m.measurement) AS avg_microplastics,
     COUNT(*) AS n_samples
   FROM fact_microplastics m
   LEFT JOIN dim_date d ON m.date_id = d.date_id
   WHERE (:start_date IS NULL OR d.full_date >= :start_date)
     AND (:end_date IS NULL OR d.full_date < :end_date)
-  GROUP BY depth_band
+    AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+    AND (:end_date_id IS NULL OR m.date_id < :end_date_id)
+  GROUP BY m.depth_band_id
 )
-SELECT *
-FROM depth_avg
-WHERE depth_band != 'Unknown'
-ORDER BY avg_microplastics DESC
+SELECT
+  -- Etiquetas con guion ASCII ("0-5m"), como antes de dim_depth_band; el heatmap usa las de la dimensión
+  REPLACE(b.depth_band, '–', '-') AS depth_band,
+  da.avg_microplastics,
+  da.n_samples
+FROM depth_avg da
+JOIN dim_depth_band b ON b.depth_band_id = da.depth_band_id
+WHERE b.depth_band != 'Unknown'
+ORDER BY da.avg_microplastics DESC
 LIMIT 10;
 """)
 
+
 # -------------------------------------------------
 # 3) Critical zones (High contamination) SUM per region
 CRITICAL_ZONES_HIGH = text("""
@@ -64,34 +74,30 @@ LEFT JOIN dim_ocean o ON m.ocean_id = o.ocean_id
 LEFT JOIN dim_date d ON m.date_id = d.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date IS NULL OR d.full_date < :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id IS NULL OR m.date_id < :end_date_id)
   AND r.region IS NOT NULL
 GROUP BY r.region, o.ocean
 ORDER BY sum_measurements DESC;
 """)
 
-# 4) Region hotspots (Top 10 by total measurement for boxplot)
+# 4) Region hotspots (Top 10 by total measurement). Se devuelve el total por
+# región ya agregado; la distribución sale de los sketches (DB/sketches.py).
 REGION_HOTSPOTS = text("""
-WITH region_totals AS (
-    SELECT
-        r.region,
-        SUM(m.measurement) AS total_measurement
-    FROM fact_microplastics m
-    LEFT JOIN dim_region r ON m.region_id = r.region_id
-    LEFT JOIN dim_date d ON m.date_id = d.date_id
-    WHERE (:start_date IS NULL OR d.full_date >= :start_date)
-      AND (:end_date IS NULL OR d.full_date < :end_date)
-      AND r.region IS NOT NULL
-    GROUP BY r.region
-    ORDER BY total_measurement DESC
-    LIMIT 10
-)
 SELECT
     r.region,
-    m.measurement
+    SUM(m.measurement) AS measurement
 FROM fact_microplastics m
-JOIN region_totals rt ON m.region_id = (SELECT region_id FROM dim_region WHERE region = rt.region)
 LEFT JOIN dim_region r ON m.region_id = r.region_id
-WHERE r.region IS NOT NULL;
+LEFT JOIN dim_date d ON m.date_id = d.date_id
+WHERE (:start_date IS NULL OR d.full_date >= :start_date)
+  AND (:end_date IS NULL OR d.full_date < :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id IS NULL OR m.date_id < :end_date_id)
+  AND r.region IS NOT NULL
+GROUP BY r.region
+ORDER BY measurement DESC
+LIMIT 10;
 """)
 
 # -------------------------------------------------
@@ -107,6 +113,8 @@ LEFT JOIN dim_sampling_method sm ON m.method_id = sm.method_id
 LEFT JOIN dim_date d ON m.date_id = d.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date IS NULL OR d.full_date < :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id IS NULL OR m.date_id < :end_date_id)
 GROUP BY sm.sampling_method
 ORDER BY avg_microplastics DESC
 LIMIT 10;
@@ -124,6 +132,8 @@ WITH region_counts AS (
     LEFT JOIN dim_date d ON m.date_id = d.date_id
     WHERE (:start_date IS NULL OR d.full_date >= :start_date)
       AND (:end_date IS NULL OR d.full_date < :end_date)
+      AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+      AND (:end_date_id IS NULL OR m.date_id < :end_date_id)
       AND r.region IS NOT NULL
     GROUP BY r.region
     ORDER BY total_samples DESC
@@ -144,6 +154,23 @@ GROUP BY r.region, c.concentration_class_text
 ORDER BY r.region, c.concentration_class_text;
 """)
 
+# Promedio por (región, clase) sin ventana: la parte exterior de la consulta
+# anterior. El batch de reportes (reports/batch.py) la ejecuta una vez y filtra
+# las 20 regiones con más muestras de cada ventana en memoria.
+CONC_CLASS_BY_REGION_ALL = text("""
+SELECT
+    r.region,
+    c.concentration_class_text AS class_text,
+    AVG(m.measurement) AS avg_measurement,
+    COUNT(*) AS n_samples
+FROM fact_microplastics m
+JOIN dim_region r ON m.region_id = r.region_id
+LEFT JOIN dim_concentration_class c ON m.concentration_id = c.concentration_id
+WHERE c.concentration_class_text IS NOT NULL
+GROUP BY r.region, c.concentration_class_text
+ORDER BY r.region, c.concentration_class_text;
+""")
+
 # -------------------------------------------------
 # 7) Global map data
 PAIRED_OBSERVATIONS = text("""
@@ -167,6 +194,28 @@ WHERE l.latitude IS NOT NULL
   AND l.longitude IS NOT NULL;
 """)
 
+# Las muestras de microplásticos con sus coordenadas, sin pasar por fact_species:
+# con el raster de especies (ETL/raster.py) la riqueza sale de un índice de la
+# grilla en vez del JOIN por coordenadas exactas
+SAMPLE_LOCATIONS = text("""
+SELECT
+  r.region,
+  o.ocean,
+  m.location_id,
+  m.measurement,
+  m.water_sample_depth,
+  l.latitude,
+  l.longitude,
+  d.full_date
+FROM fact_microplastics m
+JOIN dim_location l ON m.location_id = l.location_id
+LEFT JOIN dim_region r ON m.region_id = r.region_id
+LEFT JOIN dim_ocean o ON m.ocean_id = o.ocean_id
+LEFT JOIN dim_date d ON m.date_id = d.date_id
+WHERE l.latitude IS NOT NULL
+  AND l.longitude IS NOT NULL;
+""")
+
 # -------------------------------------------------
 
 # 8) Tendencia por año (promedio, total y #muestras)
@@ -180,6 +229,8 @@ FROM fact_microplastics m
 JOIN dim_date d ON d.date_id = m.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
 GROUP BY d.year
 ORDER BY d.year;
 """)
@@ -196,6 +247,8 @@ LEFT JOIN dim_ocean o ON o.ocean_id = m.ocean_id
 LEFT JOIN dim_date d  ON d.date_id   = m.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
 GROUP BY o.ocean
 ORDER BY total_microplastics DESC;
 """)
@@ -211,6 +264,8 @@ LEFT JOIN dim_organization org ON org.organization_id = m.organization_id
 LEFT JOIN dim_date d           ON d.date_id          = m.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
 GROUP BY org.organization
 ORDER BY n_samples DESC;
 """)
@@ -225,15 +280,19 @@ WITH loc AS (
   FROM fact_microplastics m
   GROUP BY m.location_id
 ),
+-- Una fila por ubicación: la región sale de los pares distintos (ubicación, región)
+-- en vez de unir de nuevo cada muestra, y se descartan puntos sin riqueza de especies
 pair AS (
   SELECT
     l.location_id,
     l.avg_micro,
     s.species_count,
-    m.region_id
+    lr.region_id
   FROM loc l
-  JOIN fact_species s      ON s.location_id = l.location_id
-  JOIN fact_microplastics m ON m.location_id = l.location_id
+  JOIN fact_species s ON s.location_id = l.location_id
+  JOIN (SELECT DISTINCT location_id, region_id FROM fact_microplastics) lr
+    ON lr.location_id = l.location_id
+  WHERE s.species_count IS NOT NULL
 ),
 -- 2) Cuartiles (NTILE) para definir alto/bajo
 ranked AS (
@@ -260,15 +319,19 @@ WITH loc AS (
   FROM fact_microplastics m
   GROUP BY m.location_id
 ),
+-- Una fila por ubicación: la región sale de los pares distintos (ubicación, región)
+-- en vez de unir de nuevo cada muestra, y se descartan puntos sin riqueza de especies
 pair AS (
   SELECT
     l.location_id,
     l.avg_micro,
     s.species_count,
-    m.region_id
+    lr.region_id
   FROM loc l
-  JOIN fact_species s      ON s.location_id = l.location_id
-  JOIN fact_microplastics m ON m.location_id = l.location_id
+  JOIN fact_species s ON s.location_id = l.location_id
+  JOIN (SELECT DISTINCT location_id, region_id FROM fact_microplastics) lr
+    ON lr.location_id = l.location_id
+  WHERE s.species_count IS NOT NULL
 ),
 ranked AS (
   SELECT
@@ -296,6 +359,8 @@ FROM fact_microplastics m
 JOIN dim_date d ON d.date_id = m.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
 GROUP BY d.year
 ORDER BY d.year;
 """)
@@ -310,38 +375,33 @@ JOIN dim_date d             ON d.date_id    = m.date_id
 LEFT JOIN dim_sampling_method sm ON sm.method_id = m.method_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
 GROUP BY d.year, sm.sampling_method
 ORDER BY d.year, n_samples DESC;
 """)
 
 #15 Métodos por banda de profundidad (heatmap)
 METHODS_BY_WATERSAMPLEDEPTH = text("""
+-- Conteo agrupado sobre idx_micro_depth_method (depth_band_id, method_id)
+WITH band_method AS (
+  SELECT depth_band_id, method_id, COUNT(*) AS n_samples
+  FROM fact_microplastics
+  GROUP BY depth_band_id, method_id
+)
 SELECT
-  CASE
-    WHEN depth_val IS NULL THEN 'Unknown'
-    WHEN depth_val < 5   THEN '0–5m'
-    WHEN depth_val < 20  THEN '5–20m'
-    WHEN depth_val < 50  THEN '20–50m'
-    WHEN depth_val < 200 THEN '50–200m'
-    ELSE '200m+'
-  END AS depth_band,
+  b.depth_band_id,
+  b.depth_band,
   TRIM(LOWER(sm.sampling_method)) AS sampling_method,
-  COUNT(*) AS n_samples
-FROM (
-  SELECT
-    CAST(REPLACE(TRIM(
-      NULLIF(TRIM(water_sample_depth), '')
-    ), ',', '.') AS DOUBLE) AS depth_val,
-    method_id
-  FROM fact_microplastics
-) m
-LEFT JOIN dim_sampling_method sm 
-  ON sm.method_id = m.method_id
-GROUP BY depth_band, sampling_method
-ORDER BY depth_band, n_samples DESC;
-
+  bm.n_samples
+FROM band_method bm
+JOIN dim_depth_band b ON b.depth_band_id = bm.depth_band_id
+LEFT JOIN dim_sampling_method sm
+  ON sm.method_id = bm.method_id
+ORDER BY b.depth_band_id, bm.n_samples DESC;
 """)
 
+
 # 16) Ranking por Entorno Marino
 MARINE_SETTING_RANKING = text("""
 SELECT
@@ -354,6 +414,8 @@ LEFT JOIN dim_marine_setting ms ON ms.marine_setting_id = m.marine_setting_id
 LEFT JOIN dim_date d           ON d.date_id            = m.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
   AND ms.marine_setting IS NOT NULL
 GROUP BY ms.marine_setting
 ORDER BY avg_microplastics DESC
@@ -370,6 +432,45 @@ FROM fact_microplastics m
 JOIN dim_date d ON d.date_id = m.date_id
 WHERE (:start_date IS NULL OR d.full_date >= :start_date)
   AND (:end_date   IS NULL OR d.full_date <  :end_date)
+  AND (:start_date_id IS NULL OR m.date_id >= :start_date_id)
+  AND (:end_date_id   IS NULL OR m.date_id <  :end_date_id)
 GROUP BY d.month
 ORDER BY d.month;
 """)
+
+
+# -------------------------------------------------
+# Registro de KPIs: nombre -> consulta (mismo orden que generate_all_figures)
+KPI_QUERIES = {
+    "region_avgs": MICRO_BY_REGION_TOP10,
+    "depth": DEPTH_BINS_EFFECT_TOP10,
+    "critical_high": CRITICAL_ZONES_HIGH,
+    "hotspots": REGION_HOTSPOTS,
+    "method": METHOD_EFFECTS_TOP10,
+    "conc_matrix": CONC_CLASS_BY_REGION_TOP10,
+    "species_micro_map": PAIRED_OBSERVATIONS,
+    "year_trend": YEAR_TREND,
+    "ocean_donut": OCEAN_RANKING_TOTAL,
+    "org_lollipop": ORGANIZATION_ACTIVITY,
+    "critical_highhigh": CRITICAL_ZONES_HIGHHIGH,
+    "critical_lowhigh": CRITICAL_ZONES_LOWBIODIV_HIGHCONT,
+    "samples_per_year": SAMPLES_PER_YEAR,
+    "methods_by_year": METHODS_BY_YEAR_COUNTS,
+    "methods_by_depth": METHODS_BY_WATERSAMPLEDEPTH,
+    "marine_setting": MARINE_SETTING_RANKING,
+    "monthly_trend": MONTHLY_TREND,
+}
+
+
+def window_params(start_date=None, end_date=None) -> dict:
+    """Parámetros de ventana [start_date, end_date) para las consultas KPI."""
+    def _to_id(value):
+        if value is None:
+            return None
+        return int(str(value)[:10].replace("-", ""))
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "start_date_id": _to_id(start_date),
+        "end_date_id": _to_id(end_date),
+    }
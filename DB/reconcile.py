@@ -0,0 +1,182 @@
+# DB/reconcile.py
+"""
+Load reconciliation: the frames `load` wrote vs. what the warehouse holds.
+
+Every table of the load is checked: the star schema (dim_ocean included) and
+the quarantine. Each gets a row count plus a checksum per column:
+
+  - numeric columns: COUNT(col) and SUM(col)
+  - text columns:    COUNT(col) and SUM(LENGTH(col))  (CHAR_LENGTH on MySQL)
+  - dates/other:     COUNT(col)
+
+The expected values are computed in pandas from the frames. The warehouse
+values come from a single statement: one aggregate subquery per table,
+CROSS JOINed into one row. The server scans each table once, and the whole
+check is one round trip instead of a COUNT(*) query per table.
+
+Integer checksums must match exactly. Float sums are compared with a relative
+tolerance, because the server adds them in another order. Any mismatch
+raises ReconciliationError.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from DB.engine import load_config
+
+# Tolerancia relativa de las sumas de columnas float
+FLOAT_RTOL = 1e-9
+
+
+class ReconciliationError(RuntimeError):
+    pass
+
+
+def _tables() -> list:
+    """(clave en dfs, tabla) de todo lo que escribe load (dimensiones, hechos y cuarentena)."""
+    from ETL.load import LOAD_ORDER
+
+    return list(LOAD_ORDER) + [("quarantine", "quarantine")]
+
+
+def _kind(series: pd.Series) -> str:
+    """'int', 'float', 'text' u 'other' según el dtype (o el primer valor en columnas object)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _kind(pd.Series(dtype.categories))
+    if pd.api.types.is_bool_dtype(dtype):
+        return "other"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float"
+    if pd.api.types.is_string_dtype(dtype):
+        first = series.dropna()
+        first = first.iloc[0] if len(first) else ""
+        if isinstance(first, str):
+            return "text"
+        if isinstance(first, (int, np.integer)):
+            return "int"
+        if isinstance(first, (float, np.floating)):
+            return "float"
+    return "other"
+
+
+def checksum_plan(dfs: dict) -> list:
+    """
+    Lista de chequeos [(tabla, columna, métrica, tipo)] para las tablas de
+    `dfs`; métrica es rows, count, sum o length.
+    """
+    plan = []
+    for key, table in _tables():
+        plan.append((table, None, "rows", "int"))
+        frame = dfs.get(key)
+        if frame is None:
+            continue
+        for col in frame.columns:
+            kind = _kind(frame[col])
+            plan.append((table, col, "count", "int"))
+            if kind in ("int", "float"):
+                plan.append((table, col, "sum", kind))
+            elif kind == "text":
+                plan.append((table, col, "length", "int"))
+    return plan
+
+
+def expected_checksums(dfs: dict, plan: list) -> list:
+    """Valor esperado de cada chequeo de `plan`, calculado sobre los DataFrames."""
+    keys = {table: key for key, table in _tables()}
+    values = []
+    for table, col, metric, kind in plan:
+        frame = dfs.get(keys[table])
+        if metric == "rows":
+            values.append(len(frame) if frame is not None else 0)
+            continue
+        s = frame[col]
+        if metric == "count":
+            values.append(int(s.count()))
+        elif metric == "sum":
+            s = pd.to_numeric(s, errors="coerce").dropna()
+            values.append(int(s.astype("int64").sum()) if kind == "int" else float(s.astype("float64").sum()))
+        else:
+            values.append(int(s.dropna().astype(str).str.len().sum()))
+    return values
+
+
+def reconciliation_sql(plan: list, backend: str, prefix: str = "") -> str:
+    """Una sola sentencia: un subquery de agregados por tabla, unidos con CROSS JOIN en una fila."""
+    length = "CHAR_LENGTH" if backend == "mysql" else "LENGTH"
+    by_table = {}
+    for i, (table, col, metric, _) in enumerate(plan):
+        expr = {
+            "rows": "COUNT(*)",
+            "count": f"COUNT({col})",
+            "sum": f"SUM({col})",
+            "length": f"SUM({length}({col}))",
+        }[metric]
+        by_table.setdefault(table, []).append(f"{expr} AS c{i}")
+    subqueries = [
+        f"(SELECT {', '.join(exprs)} FROM {prefix + table}) t{n}"
+        for n, (table, exprs) in enumerate(by_table.items())
+    ]
+    return "SELECT * FROM " + "\nCROSS JOIN ".join(subqueries)
+
+
+def _matches(expected, actual, kind: str) -> bool:
+    if actual is None:
+        # SUM de una tabla vacía o de una columna toda NULL
+        return expected in (0, 0.0)
+    if kind == "float":
+        return math.isclose(float(expected), float(actual), rel_tol=FLOAT_RTOL, abs_tol=1e-9)
+    return int(expected) == int(actual)
+
+
+def reconcile(engine, dfs: dict, prefix: str = "", raise_on_mismatch: bool = True) -> pd.DataFrame:
+    """
+    Compara conteos y checksums de `dfs` (lo que se pasó a load) con las
+    tablas `prefix`* del warehouse. Devuelve un reporte con una fila por
+    chequeo (table, column, metric, expected, actual, ok) y lanza
+    ReconciliationError si alguno no coincide.
+    """
+    plan = checksum_plan(dfs)
+    expected = expected_checksums(dfs, plan)
+    sql = reconciliation_sql(plan, load_config()["backend"], prefix)
+    with engine.connect() as conn:
+        row = conn.execute(text(sql)).one()
+    actual = [row._mapping[f"c{i}"] for i in range(len(plan))]
+
+    report = pd.DataFrame({
+        "table": [p[0] for p in plan],
+        "column": [p[1] or "" for p in plan],
+        "metric": [p[2] for p in plan],
+        "expected": expected,
+        "actual": actual,
+        "ok": [_matches(e, a, p[3]) for e, a, p in zip(expected, actual, plan)],
+    })
+    if raise_on_mismatch:
+        check(report)
+    return report
+
+
+def check(report: pd.DataFrame):
+    """Lanza ReconciliationError con los chequeos fallidos del reporte, si hay alguno."""
+    if not report["ok"].all():
+        raise ReconciliationError("La carga no coincide con los datos transformados:\n  " + "\n  ".join(mismatches(report)))
+
+
+def mismatches(report: pd.DataFrame) -> list:
+    """Líneas legibles de los chequeos fallidos del reporte."""
+    bad = report[~report["ok"]]
+    return [f"{r.table}{'.' + r.column if r.column else ''} {r.metric}: {r.actual} en la BD, se esperaba {r.expected}"
+            for r in bad.itertuples(index=False)]
+
+
+def print_summary(report: pd.DataFrame):
+    print("\nConciliación de la carga:")
+    rows = report[report["metric"] == "rows"]
+    for r in rows.itertuples(index=False):
+        checks = report[report["table"] == r.table]
+        status = "OK" if checks["ok"].all() else f"{int((~checks['ok']).sum())} DIFERENCIAS"
+        print(f"  {r.table:28s} {int(r.actual or 0):>10d} filas, {len(checks) - 1:>3d} checksums  {status}")
@@ -0,0 +1,262 @@
+# DB/sketches.py
+"""
+Mergeable quantile sketches (t-digest) of fact_microplastics.measurement.
+
+During `load` one digest is built per (dimension, member, year) for region,
+ocean and sampling method and stored in the `quantile_sketch` table as a
+small BLOB of (mean, weight) centroids. Digests merge by concatenating their
+centroids and compressing again, so the distribution for a date window is
+assembled from the per-year sketches. A distribution plot then reads at
+most ~1.6 KB per member and year instead of every raw measurement.
+
+Windows are resolved to whole years: every year the window touches is
+included. Rows without a date are only part of the unwindowed distribution,
+which matches the SQL KPIs.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Compresión: con DELTA=200 cada digest guarda a lo sumo ~100 centroides (1.6 KB)
+DELTA = 200
+
+# Dimensión del sketch -> (columna FK en el hecho, tabla de dimensión, columna etiqueta)
+SKETCH_DIMS = {
+    "region": ("region_id", "dim_region", "region"),
+    "ocean": ("ocean_id", "dim_ocean", "ocean"),
+    "method": ("method_id", "dim_sampling_method", "sampling_method"),
+}
+
+SKETCH_TABLE = "quantile_sketch"
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def _compress(group: np.ndarray, values: np.ndarray, weights: np.ndarray, delta: int = DELTA):
+    """
+    Compresión t-digest vectorizada para muchos grupos a la vez. Dentro de cada
+    grupo los valores se ordenan y se agrupan en centroides según la función de
+    escala k1 (q -> delta/2pi * asin(2q - 1)), que deja centroides pequeños en
+    las colas. Devuelve (grupo, media, peso) de cada centroide, ordenados, y
+    el mínimo/máximo de `values` en cada grupo.
+    """
+    if not len(values):
+        empty = np.array([])
+        return group[:0], empty, empty, empty, empty
+    order = np.lexsort((values, group))
+    g, v, w = group[order], values[order], weights[order]
+    totals = np.bincount(g, weights=w)
+    offset = np.concatenate(([0.0], np.cumsum(totals)[:-1]))
+    q = (np.cumsum(w) - offset[g] - w / 2) / totals[g]
+    k = np.floor(delta / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)) + delta / 4).astype(np.int64)
+
+    # Nuevo centroide donde cambia el grupo o la celda k
+    new = np.ones(len(g), dtype=bool)
+    new[1:] = (g[1:] != g[:-1]) | (k[1:] != k[:-1])
+    cid = np.cumsum(new) - 1
+    cw = np.bincount(cid, weights=w)
+    cm = np.bincount(cid, weights=w * v) / cw
+
+    first = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    last = np.r_[first[1:] - 1, len(g) - 1]
+    return g[new], cm, cw, v[first], v[last]
+
+
+class TDigest:
+    def __init__(self, means=(), weights=(), vmin=np.nan, vmax=np.nan, delta: int = DELTA):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.vmin, self.vmax, self.delta = float(vmin), float(vmax), delta
+
+    @classmethod
+    def from_values(cls, values, delta: int = DELTA) -> "TDigest":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return cls(delta=delta)
+        _, means, weights, vmin, vmax = _compress(np.zeros(len(values), dtype=np.int64), values,
+                                                  np.ones(len(values)), delta)
+        return cls(means, weights, vmin[0], vmax[0], delta)
+
+    @property
+    def n(self) -> float:
+        return float(self.weights.sum())
+
+    def merge(self, *others) -> "TDigest":
+        digests = [d for d in (self, *others) if len(d.weights)]
+        if not digests:
+            return TDigest(delta=self.delta)
+        means = np.concatenate([d.means for d in digests])
+        weights = np.concatenate([d.weights for d in digests])
+        _, means, weights, _, _ = _compress(np.zeros(len(means), dtype=np.int64), means, weights, self.delta)
+        return TDigest(means, weights, min(d.vmin for d in digests), max(d.vmax for d in digests), self.delta)
+
+    def quantile(self, q):
+        """Cuantiles por interpolación lineal entre centros de centroides (y min/max en los extremos)."""
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.weights):
+            return np.full(q.shape, np.nan)
+        n = self.n
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xp = np.concatenate(([0.0], centers, [n]))
+        fp = np.concatenate(([self.vmin], self.means, [self.vmax]))
+        return np.interp(q * n, xp, fp)
+
+    def to_bytes(self) -> bytes:
+        return np.column_stack([self.means, self.weights]).astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, vmin=np.nan, vmax=np.nan, delta: int = DELTA) -> "TDigest":
+        pairs = np.frombuffer(bytes(blob), dtype="<f8").reshape(-1, 2)
+        return cls(pairs[:, 0], pairs[:, 1], vmin, vmax, delta)
+
+
+def build_sketches(fact_micro: pd.DataFrame, delta: int = DELTA) -> pd.DataFrame:
+    """
+    Filas de quantile_sketch para un fact_microplastics (salida de transform):
+    un digest por (dim, member_id, year). member_id/year nulos quedan como NULL.
+    """
+    measure = pd.to_numeric(fact_micro["measurement"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    date_id = pd.to_numeric(fact_micro["date_id"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    ok = ~np.isnan(measure)
+    year = np.where(np.isnan(date_id), -1, date_id // 10000).astype(np.int64)[ok]
+    values = measure[ok]
+
+    frames = []
+    for dim, (col, _, _) in SKETCH_DIMS.items():
+        member = pd.to_numeric(fact_micro[col], errors="coerce").to_numpy(dtype="float64", na_value=-1)
+        member = member[ok].astype(np.int64)
+        # Clave (member, year) en un entero: member * 10000 + year (-1 = NULL)
+        keys, group = np.unique((member + 1) * 10000 + (year + 1), return_inverse=True)
+        member_key, year_key = keys // 10000 - 1, keys % 10000 - 1
+        cg, cm, cw, vmin, vmax = _compress(group.ravel(), values, np.ones(len(values)), delta)
+        bounds = np.searchsorted(cg, np.arange(len(keys) + 1))
+        blobs = [
+            np.column_stack([cm[a:b], cw[a:b]]).astype("<f8").tobytes()
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+        frames.append(pd.DataFrame({
+            "dim": dim,
+            "member_id": pd.Series(member_key, dtype="Int64").mask(member_key < 0),
+            "year": pd.Series(year_key, dtype="Int64").mask(year_key < 0),
+            "n_values": np.bincount(group.ravel(), minlength=len(keys)),
+            "min_value": vmin,
+            "max_value": vmax,
+            "centroids": blobs,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _year_bounds(start_date=None, end_date=None):
+    """Años [start_year, end_year) que toca la ventana [start_date, end_date)."""
+    start_year = int(str(start_date)[:4]) if start_date is not None else None
+    end_year = None
+    if end_date is not None:
+        end = str(end_date)[:10]
+        end_year = int(end[:4]) + (0 if end[5:] == "01-01" else 1)
+    return start_year, end_year
+
+
+def sketch_rows(engine, dim: str, start_date=None, end_date=None) -> pd.DataFrame:
+    """Filas de quantile_sketch de `dim` para los años que toca la ventana, con la etiqueta del miembro."""
+    col, table, label = SKETCH_DIMS[dim]
+    start_year, end_year = _year_bounds(start_date, end_date)
+    return pd.read_sql(text(f"""
+        SELECT s.member_id, d.{label} AS {label}, s.year, s.min_value, s.max_value, s.centroids
+        FROM {SKETCH_TABLE} s
+        LEFT JOIN {table} d ON d.{col} = s.member_id
+        WHERE s.dim = :dim
+          AND (:start_year IS NULL OR s.year >= :start_year)
+          AND (:end_year IS NULL OR s.year < :end_year)
+    """), engine, params={"dim": dim, "start_year": start_year, "end_year": end_year})
+
+
+def load_digests(engine, dim: str, start_date=None, end_date=None, rows: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Un digest fusionado por miembro de `dim` para la ventana: columnas
+    member_id, <etiqueta>, digest. `rows` (de sketch_rows) evita la consulta:
+    se filtran en memoria los años de la ventana (útil para muchas ventanas).
+    """
+    label = SKETCH_DIMS[dim][2]
+    if rows is None:
+        rows = sketch_rows(engine, dim, start_date, end_date)
+    else:
+        start_year, end_year = _year_bounds(start_date, end_date)
+        year = rows["year"]
+        keep = pd.Series(True, index=rows.index)
+        if start_year is not None:
+            keep &= year >= start_year
+        if end_year is not None:
+            keep &= year < end_year
+        rows = rows[keep]
+
+    out = []
+    for (member_id, name), grp in rows.groupby(["member_id", label], dropna=False, sort=False):
+        digests = [TDigest.from_bytes(b, lo, hi) for b, lo, hi in
+                   zip(grp["centroids"], grp["min_value"], grp["max_value"])]
+        out.append({"member_id": member_id, label: name, "digest": digests[0].merge(*digests[1:])})
+    return pd.DataFrame(out, columns=["member_id", label, "digest"])
+
+
+def sketch_quantiles(engine, dim: str, start_date=None, end_date=None, quantiles=DEFAULT_QUANTILES,
+                     rows: pd.DataFrame = None) -> pd.DataFrame:
+    """Cuantiles aproximados de measurement por miembro de `dim` en la ventana."""
+    label = SKETCH_DIMS[dim][2]
+    digests = load_digests(engine, dim, start_date, end_date, rows)
+    out = pd.DataFrame({label: digests[label], "n_values": [d.n for d in digests["digest"]]})
+    qs = np.array([d.quantile(quantiles) for d in digests["digest"]]).reshape(len(digests), len(quantiles))
+    for i, q in enumerate(quantiles):
+        out[f"p{round(q * 100):02d}"] = qs[:, i]
+    out["min_value"] = [d.vmin for d in digests["digest"]]
+    out["max_value"] = [d.vmax for d in digests["digest"]]
+    return out.sort_values("n_values", ascending=False).reset_index(drop=True)
+
+
+def refresh_year(conn, fact_rows: pd.DataFrame, year: int, typed: bool = False):
+    """Reemplaza los sketches de `year` (tras recargar ese año en fact_microplastics)."""
+    from ETL.load import _write
+
+    conn.execute(text(f"DELETE FROM {SKETCH_TABLE} WHERE year = :year"), {"year": int(year)})
+    sketches = build_sketches(fact_rows)
+    _write(conn, sketches[sketches["year"] == int(year)], SKETCH_TABLE, typed)
+
+
+def sketch_cells(fact_rows: pd.DataFrame) -> pd.DataFrame:
+    """Celdas (dim, member_id, year) de quantile_sketch que tocan las filas de fact_microplastics."""
+    date_id = pd.to_numeric(fact_rows["date_id"], errors="coerce")
+    year = (date_id // 10000).astype("Int64")
+    frames = [
+        pd.DataFrame({"dim": dim, "member_id": pd.to_numeric(fact_rows[col], errors="coerce").astype("Int64"),
+                      "year": year})
+        for dim, (col, _, _) in SKETCH_DIMS.items()
+    ]
+    return pd.concat(frames, ignore_index=True).drop_duplicates().reset_index(drop=True)
+
+
+def refresh_cells(conn, cells: pd.DataFrame, fact_table: str = "fact_microplastics", typed: bool = False) -> int:
+    """
+    Reconstruye solo las celdas `cells` (de sketch_cells) de quantile_sketch.
+    Los t-digest no admiten restar valores, así que se releen las filas de
+    los años tocados; celdas que quedaron sin filas se borran.
+    """
+    from ETL.load import _write
+
+    if not len(cells):
+        return 0
+    years = cells["year"].dropna().astype(int).unique().tolist()
+    where = [f"(date_id >= {y * 10000} AND date_id < {(y + 1) * 10000})" for y in sorted(years)]
+    if cells["year"].isna().any():
+        where.append("date_id IS NULL")
+    cols = ", ".join(dict.fromkeys(["date_id", "measurement"] + [c for c, _, _ in SKETCH_DIMS.values()]))
+    rows = pd.read_sql_query(text(f"SELECT {cols} FROM {fact_table} WHERE {' OR '.join(where)}"), conn)
+
+    key = ["dim", "member_id", "year"]
+    rebuilt = build_sketches(rows).merge(cells[key], on=key, how="inner")
+    # NULL = NULL no es verdadero en SQL: se compara con COALESCE(-1)
+    conn.execute(text(f"""
+        DELETE FROM {SKETCH_TABLE}
+        WHERE dim = :dim AND COALESCE(member_id, -1) = :member_id AND COALESCE(year, -1) = :year
+    """), [{"dim": d, "member_id": int(m) if pd.notna(m) else -1, "year": int(y) if pd.notna(y) else -1}
+           for d, m, y in cells[key].itertuples(index=False)])
+    _write(conn, rebuilt, SKETCH_TABLE, typed)
+    return len(rebuilt)
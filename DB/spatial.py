@@ -0,0 +1,235 @@
+# DB/spatial.py
+"""
+Geohash spatial index on dim_location and bounding-box / radius helpers.
+
+`transform` stores a geohash (GEOHASH_PRECISION characters, ~5 m cells) per
+location in `dim_location.geohash`, indexed by idx_loc_geohash. Geohash
+characters are in ASCII order, so all locations inside one geohash cell share
+a string prefix, and a run of adjacent cells is one contiguous key range
+`[lo, hi)`. A bounding box is covered by at most `max_cells` cells at the
+finest precision that allows it. Those cells are merged into ranges, and each
+range is an index range scan:
+
+    (l.geohash >= '9q8y' AND l.geohash < '9q8z') OR (...)
+
+The exact latitude/longitude predicate is then applied only to the rows those
+ranges return. A radius query uses the box that encloses the circle and then
+filters by haversine distance.
+
+    where, params = bbox_filter(30, -125, 50, -110)             # for any report query
+    samples = samples_in_bbox(engine, 30, -125, 50, -110)
+    near = samples_near(engine, 36.6, -121.9, radius_km=100)
+
+    python -m DB.spatial --near 36.6 -121.9 --radius-km 100
+    python -m DB.spatial --bbox 30 -125 50 -110
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+GEOHASH_PRECISION = 9
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_BYTES = np.frombuffer(BASE32.encode(), dtype=np.uint8)
+
+# Celdas máximas con que se cubre un bounding box (antes de fusionarlas en rangos)
+MAX_CELLS = 64
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _bits(precision: int) -> tuple:
+    """(bits de latitud, bits de longitud) de un geohash de `precision` caracteres."""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def _cell_ints(lat, lon, precision: int) -> tuple:
+    """Índice de celda (fila de latitud, columna de longitud) en la grilla de `precision`."""
+    nlat, nlon = _bits(precision)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+    with np.errstate(invalid="ignore"):
+        i = np.floor((lat + 90.0) / 180.0 * (1 << nlat))
+        j = np.floor((lon + 180.0) / 360.0 * (1 << nlon))
+    return np.clip(i, 0, (1 << nlat) - 1), np.clip(j, 0, (1 << nlon) - 1)
+
+
+def _interleave(i: np.ndarray, j: np.ndarray, precision: int) -> np.ndarray:
+    """Geohash como entero: bits de longitud y latitud alternados, longitud primero."""
+    nlat, nlon = _bits(precision)
+    i, j = i.astype(np.int64), j.astype(np.int64)
+    code = np.zeros(len(i), dtype=np.int64)
+    for k in range(5 * precision):
+        if k % 2 == 0:
+            bit = (j >> (nlon - 1 - k // 2)) & 1
+        else:
+            bit = (i >> (nlat - 1 - k // 2)) & 1
+        code = (code << 1) | bit
+    return code
+
+
+def _to_strings(code: np.ndarray, precision: int) -> np.ndarray:
+    """Enteros de 5*precision bits -> texto base32 del geohash."""
+    shifts = 5 * np.arange(precision - 1, -1, -1, dtype=np.int64)
+    chars = _BASE32_BYTES[(code[:, None] >> shifts) & 31]
+    return np.ascontiguousarray(chars).view(f"S{precision}").ravel().astype(str)
+
+
+def geohash_encode(lat, lon, precision: int = GEOHASH_PRECISION) -> np.ndarray:
+    """
+    Geohash de cada (lat, lon), vectorizado. Las longitudes se llevan a
+    [-180, 180); coordenadas nulas o con latitud fuera de [-90, 90] dan None.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        valid = ~np.isnan(lat) & ~np.isnan(lon) & (lat >= -90) & (lat <= 90)
+    out = np.full(len(lat), None, dtype=object)
+    if valid.any():
+        i, j = _cell_ints(lat[valid], lon[valid], precision)
+        out[valid] = _to_strings(_interleave(i, j, precision), precision)
+    return out
+
+
+def _boxes(min_lat, min_lon, max_lat, max_lon) -> list:
+    """El bbox partido en el antimeridiano (min_lon > max_lon) en dos cajas."""
+    if min_lon <= max_lon:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+
+
+def geohash_ranges(min_lat, min_lon, max_lat, max_lon, max_cells: int = MAX_CELLS,
+                   precision: int = GEOHASH_PRECISION) -> list:
+    """
+    Rangos [lo, hi) de geohash que cubren el bbox: las celdas de la mayor
+    precisión (<= `precision`) que lo cubren con a lo sumo `max_cells` celdas,
+    fusionando las consecutivas. hi es None cuando el rango llega al final.
+    """
+    boxes = _boxes(min_lat, min_lon, max_lat, max_lon)
+    best = 1
+    for p in range(1, precision + 1):
+        cells = 0
+        for a_lat, a_lon, b_lat, b_lon in boxes:
+            (i0, i1), (j0, j1) = (np.asarray(v) for v in _cell_ints([a_lat, b_lat], [a_lon, b_lon], p))
+            # Borde derecho en 180: la normalización lo llevaría a -180
+            if b_lon >= 180.0:
+                j1 = (1 << _bits(p)[1]) - 1
+            cells += int((i1 - i0 + 1) * (j1 - j0 + 1))
+        if cells > max_cells:
+            break
+        best = p
+
+    codes = []
+    for a_lat, a_lon, b_lat, b_lon in boxes:
+        (i0, i1), (j0, j1) = (np.asarray(v, dtype=np.int64) for v in _cell_ints([a_lat, b_lat], [a_lon, b_lon], best))
+        if b_lon >= 180.0:
+            j1 = (1 << _bits(best)[1]) - 1
+        ii, jj = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing="ij")
+        codes.append(_interleave(ii.ravel(), jj.ravel(), best))
+    codes = np.unique(np.concatenate(codes))
+
+    # Celdas consecutivas (en orden de geohash) forman un solo rango
+    starts = np.flatnonzero(np.r_[True, np.diff(codes) != 1])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    lo = _to_strings(codes[starts], best)
+    last = 1 << (5 * best)
+    hi_codes = codes[ends] + 1
+    hi = _to_strings(np.minimum(hi_codes, last - 1), best)
+    return [(a, b if c < last else None) for a, b, c in zip(lo, hi, hi_codes)]
+
+
+def bbox_filter(min_lat, min_lon, max_lat, max_lon, alias: str = "l", name: str = "bbox",
+                max_cells: int = MAX_CELLS) -> tuple:
+    """
+    (fragmento SQL, params) que restringe `alias` (dim_location) al bbox:
+    rangos de geohash (index range scans) y el filtro exacto de coordenadas.
+    min_lon > max_lon cruza el antimeridiano. `name` prefija los parámetros.
+    """
+    params = {}
+    ranges = []
+    for n, (lo, hi) in enumerate(geohash_ranges(min_lat, min_lon, max_lat, max_lon, max_cells)):
+        params[f"{name}_gh{n}"] = lo
+        cond = f"{alias}.geohash >= :{name}_gh{n}"
+        if hi is not None:
+            params[f"{name}_gh{n}_end"] = hi
+            cond += f" AND {alias}.geohash < :{name}_gh{n}_end"
+        ranges.append(f"({cond})")
+    params.update({f"{name}_lat0": float(min_lat), f"{name}_lat1": float(max_lat),
+                   f"{name}_lon0": float(min_lon), f"{name}_lon1": float(max_lon)})
+    lon_op = "AND" if min_lon <= max_lon else "OR"
+    sql = (f"({' OR '.join(ranges)})"
+           f" AND {alias}.latitude BETWEEN :{name}_lat0 AND :{name}_lat1"
+           f" AND ({alias}.longitude >= :{name}_lon0 {lon_op} {alias}.longitude <= :{name}_lon1)")
+    return sql, params
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> tuple:
+    """Bbox (min_lat, min_lon, max_lat, max_lon) que contiene el círculo; cruza el antimeridiano si hace falta."""
+    dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        # El círculo contiene un polo: todas las longitudes
+        return min_lat, -180.0, max_lat, 180.0
+    dlon = np.degrees(np.arcsin(min(1.0, np.sin(radius_km / EARTH_RADIUS_KM) / np.cos(np.radians(lat)))))
+    if dlon >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    wrap = lambda x: (x + 180.0) % 360.0 - 180.0
+    return min_lat, wrap(lon - dlon), max_lat, wrap(lon + dlon)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def locations_in_bbox(engine, min_lat, min_lon, max_lat, max_lon) -> pd.DataFrame:
+    """Filas de dim_location dentro del bbox."""
+    where, params = bbox_filter(min_lat, min_lon, max_lat, max_lon)
+    return pd.read_sql(text(f"SELECT l.location_id, l.latitude, l.longitude, l.geohash "
+                            f"FROM dim_location l WHERE {where}"), engine, params=params)
+
+
+def _samples_sql(where: str):
+    from DB.queries import SAMPLE_LOCATIONS
+
+    # La consulta del mapa de reportes, restringida al bbox
+    return text(SAMPLE_LOCATIONS.text.strip().rstrip(";") + f"\n  AND {where}")
+
+
+def samples_in_bbox(engine, min_lat, min_lon, max_lat, max_lon) -> pd.DataFrame:
+    """Muestras de microplásticos (columnas de SAMPLE_LOCATIONS) dentro del bbox."""
+    where, params = bbox_filter(min_lat, min_lon, max_lat, max_lon)
+    return pd.read_sql(_samples_sql(where), engine, params=params)
+
+
+def samples_near(engine, lat: float, lon: float, radius_km: float) -> pd.DataFrame:
+    """Muestras de microplásticos a menos de `radius_km` de (lat, lon), con distance_km, de la más cercana."""
+    where, params = bbox_filter(*radius_bbox(lat, lon, radius_km))
+    df = pd.read_sql(_samples_sql(where), engine, params=params)
+    df["distance_km"] = haversine_km(lat, lon, df["latitude"], df["longitude"])
+    return df[df["distance_km"] <= radius_km].sort_values("distance_km").reset_index(drop=True)
+
+
+def main(argv=None):
+    from DB.engine import get_engine
+
+    ap = argparse.ArgumentParser(description="Muestras de microplásticos en un bbox o cerca de un punto")
+    group = ap.add_mutually_exclusive_group(required=True)
+    group.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"))
+    group.add_argument("--near", nargs=2, type=float, metavar=("LAT", "LON"))
+    ap.add_argument("--radius-km", type=float, default=50.0)
+    args = ap.parse_args(argv)
+
+    engine = get_engine()
+    df = samples_near(engine, *args.near, args.radius_km) if args.near else samples_in_bbox(engine, *args.bbox)
+    print(f"{len(df)} muestras")
+    if len(df):
+        print(df.head(20).to_string(index=False))
+        print(f"\nmeasurement: media {df['measurement'].mean():.4g}, mediana {df['measurement'].median():.4g}")
+
+
+if __name__ == "__main__":
+    main()
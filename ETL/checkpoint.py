@@ -0,0 +1,67 @@
+import json
+import os
+
+import pandas as pd
+
+MANIFEST = "manifest.json"
+
+
+def _stage_path(checkpoint_dir: str, stage: str) -> str:
+    return os.path.join(checkpoint_dir, f"{stage}.pkl")
+
+
+def fingerprint(*paths) -> dict:
+    """Identifica las entradas de una corrida (ruta, tamaño y mtime)."""
+    fp = {}
+    for p in paths:
+        st = os.stat(p)
+        fp[os.path.abspath(p)] = [st.st_size, int(st.st_mtime)]
+    return fp
+
+
+def read_manifest(checkpoint_dir: str) -> dict:
+    path = os.path.join(checkpoint_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"inputs": {}, "completed": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(checkpoint_dir: str, manifest: dict):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    tmp = os.path.join(checkpoint_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(checkpoint_dir, MANIFEST))
+
+
+def reset(checkpoint_dir: str, inputs: dict) -> dict:
+    """Empieza un manifest nuevo (descarta los checkpoints de otra corrida)."""
+    manifest = {"inputs": inputs, "completed": []}
+    write_manifest(checkpoint_dir, manifest)
+    return manifest
+
+
+def save_stage(checkpoint_dir: str, manifest: dict, stage: str, data=None):
+    """
+    Guarda la salida de una etapa y la marca como completada.
+    `data` puede ser un DataFrame, un dict de DataFrames o None (etapas sin salida).
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    if data is not None:
+        tmp = _stage_path(checkpoint_dir, stage) + ".tmp"
+        pd.to_pickle(data, tmp)
+        os.replace(tmp, _stage_path(checkpoint_dir, stage))
+    if stage not in manifest["completed"]:
+        manifest["completed"].append(stage)
+    write_manifest(checkpoint_dir, manifest)
+
+
+def load_stage(checkpoint_dir: str, stage: str):
+    path = _stage_path(checkpoint_dir, stage)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No hay checkpoint de la etapa '{stage}' en {checkpoint_dir}. "
+            f"Ejecuta primero esa etapa."
+        )
+    return pd.read_pickle(path)
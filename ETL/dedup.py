@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from ETL.validate import FACT_TABLES
+
+# Clave natural de cada hecho: filas con la misma clave son la misma observación.
+# fact_species sale del merge externo con microplásticos, así que un punto de la
+# grilla de especies se repite una vez por cada muestra en esas coordenadas.
+NATURAL_KEYS = {
+    "fact_species": ["location_id", "species_count"],
+}
+
+
+def row_fingerprints(df: pd.DataFrame, cols) -> np.ndarray:
+    """
+    Hash uint64 de cada fila sobre `cols`, vectorizado por columna (sin tuplas
+    Python). Los nulos tienen un hash fijo, así que dos filas con NULL en la
+    misma columna se consideran iguales.
+    """
+    return pd.util.hash_pandas_object(df[list(cols)], index=False).to_numpy()
+
+
+def dedup(dfs: dict, keys: dict = NATURAL_KEYS):
+    """
+    Elimina filas repetidas de los hechos según su clave natural (se conserva
+    la primera aparición). Devuelve (dfs, summary) con una fila por tabla.
+    """
+    dfs = dict(dfs)
+    summary = []
+    for name, cols in keys.items():
+        fact = dfs[name]
+        dup = pd.Series(row_fingerprints(fact, cols)).duplicated().to_numpy()
+        if dup.any():
+            dfs[name] = fact[~dup].reset_index(drop=True)
+        summary.append({"table": FACT_TABLES.get(name, name), "key": ", ".join(cols),
+                        "rows_in": len(fact), "duplicates": int(dup.sum()),
+                        "rows_out": int(len(fact) - dup.sum())})
+    return dfs, pd.DataFrame(summary)
+
+
+def print_summary(summary: pd.DataFrame):
+    print("\nDeduplicación de hechos:")
+    for _, row in summary.iterrows():
+        print(f"  {row['table']:20s} ({row['key']}) {row['duplicates']:>8d} duplicados eliminados "
+              f"({row['rows_in']} -> {row['rows_out']} filas)")
@@ -1,7 +1,161 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 
-def extract(file_path):
-    df = pd.read_csv(file_path)
-    print(f'Datos extraidos correctamente')
+# Extensiones aceptadas al leer un directorio (gzip/zstd se descomprimen en streaming)
+CSV_PATTERNS = ("*.csv", "*.csv.gz", "*.csv.zst", "*.csv.zstd")
+
+# pandas infiere gzip/zstd por extensión salvo ".zstd"
+_COMPRESSION = {".zstd": "zstd"}
+
+READERS = ("pandas", "pyarrow")
+
+# Esquemas predeclarados para el lector pyarrow (nombre de columna -> tipo Arrow).
+# Las columnas que un archivo no trae se ignoran; las no declaradas se infieren.
+MICROPLASTICS_SCHEMA = {
+    "OBJECTID": "int64",
+    "Ocean": "string",
+    "Region": "string",
+    "Subregion": "string",
+    "Country": "string",
+    "State": "string",
+    "Beach Location": "string",
+    "Marine Setting": "string",
+    "Latitude (degree)": "float64",
+    "Longitude(degree)": "float64",
+    "Ocean Bottom Depth (m)": "float64",
+    "Water Sample Depth (m)": "float64",
+    "Sediment Sample Depth (m)": "float64",
+    "Sampling Method": "string",
+    "Mesh size (mm)": "float64",
+    "Microplastics measurement": "float64",
+    "Unit": "string",
+    "Standardized Nurdle  Amount": "float64",
+    "Concentration class range": "string",
+    "Concentration class text": "string",
+    "Short Reference": "string",
+    "Long Reference": "string",
+    "DOI": "string",
+    "ORGANIZATION": "string",
+    "KEYWORDS": "string",
+    "NCEI Accession No": "string",
+    "NCEI Accession No. Link": "string",
+    "GlobalID": "string",
+    # Varios formatos de fecha: transform se encarga del parseo
+    "Date (MM-DD-YYYY)": "string",
+    "Transect No": "string",
+    "Sampling point on beach": "string",
+    "Volunteers Number": "float64",
+    "Collecting Time (min)": "float64",
+    "C-Square Code": "string",
+    "Symbology": "string",
+    "x": "float64",
+    "y": "float64",
+}
+
+SPECIES_SCHEMA = {
+    "Latitude": "float64",
+    "Longitude": "float64",
+    "Species Count": "int64",
+}
+
+
+def resolve_paths(spec) -> list:
+    """
+    Expande `spec` (ruta, directorio, glob o lista de ellos) a una lista
+    ordenada de archivos.
+    """
+    specs = [spec] if isinstance(spec, (str, os.PathLike)) else list(spec)
+    paths = []
+    for item in specs:
+        item = os.fspath(item)
+        if os.path.isdir(item):
+            for pattern in CSV_PATTERNS:
+                paths.extend(glob.glob(os.path.join(item, pattern)))
+        elif glob.has_magic(item):
+            paths.extend(glob.glob(item))
+        else:
+            paths.append(item)
+    paths = sorted(dict.fromkeys(paths))
+    if not paths:
+        raise FileNotFoundError(f"No se encontraron archivos para {spec!r}")
+    return paths
+
+
+def _read_one(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    return pd.read_csv(path, compression=_COMPRESSION.get(ext, "infer"))
+
+
+def _read_one_arrow(path: str) -> pd.DataFrame:
+    """
+    Lector CSV multihilo de pyarrow con los esquemas predeclarados. La
+    conversión a pandas usa split_blocks/self_destruct para no duplicar memoria.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    column_types = {name: pa.type_for_alias(t) for name, t in {**MICROPLASTICS_SCHEMA, **SPECIES_SCHEMA}.items()}
+    convert = pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    read = pacsv.ReadOptions(use_threads=True)
+    ext = os.path.splitext(path)[1].lower()
+    source = pa.input_stream(path, compression=_COMPRESSION[ext]) if ext in _COMPRESSION else path
+    table = pacsv.read_csv(source, read_options=read, convert_options=convert)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _check_schema(frames: dict):
+    """Todos los archivos deben tener las mismas columnas que el primero."""
+    first_path, first = next(iter(frames.items()))
+    expected = list(first.columns)
+    for path, df in frames.items():
+        cols = list(df.columns)
+        if set(cols) != set(expected):
+            missing = sorted(set(expected) - set(cols))
+            extra = sorted(set(cols) - set(expected))
+            raise ValueError(
+                f"Esquema distinto en {path} respecto a {first_path}: "
+                f"faltan {missing}, sobran {extra}"
+            )
+    return expected
+
+
+def extract(file_path, workers: int = None, executor: str = "thread", tag_source: bool = True,
+            reader: str = "pandas", batch: str = None):
+    """
+    Lee uno o varios CSV (ruta, directorio, glob o lista) en paralelo y los
+    concatena. Cada fila queda marcada con su archivo de origen en `source_file`
+    y su número de fila dentro de él en `source_row` (1 = primera fila de datos);
+    `batch` se guarda en `ingest_batch` (ver ETL/lineage.py).
+    executor="process" usa procesos en vez de hilos.
+    reader="pyarrow" usa el lector CSV multihilo de Arrow con esquema predeclarado.
+    """
+    if reader not in READERS:
+        raise ValueError(f"reader desconocido: {reader} (usa uno de {READERS})")
+    read_fn = _read_one_arrow if reader == "pyarrow" else _read_one
+    paths = resolve_paths(file_path)
+    if len(paths) == 1:
+        frames = {paths[0]: read_fn(paths[0])}
+    else:
+        pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        workers = workers or min(len(paths), os.cpu_count() or 4)
+        with pool_cls(max_workers=workers) as pool:
+            frames = dict(zip(paths, pool.map(read_fn, paths)))
+
+    columns = _check_schema(frames)
+    lineage = ["source_file", "source_row"] if tag_source else []
+    if tag_source:
+        for path, df in frames.items():
+            df["source_file"] = path
+            df["source_row"] = np.arange(1, len(df) + 1, dtype=np.int64)
+    df = pd.concat([f[columns + lineage] for f in frames.values()], ignore_index=True)
+    if tag_source:
+        df["source_file"] = df["source_file"].astype("category")
+        if batch is not None:
+            df["ingest_batch"] = pd.Series(batch, index=df.index, dtype="category")
+    print(f'Datos extraidos correctamente ({len(paths)} archivo(s), {len(df)} filas)')
 
     return df
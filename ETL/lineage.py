@@ -0,0 +1,453 @@
+"""
+Row-level lineage and targeted reprocessing of one source file or ingest batch.
+
+Every fact row records where it came from:
+
+  - `source_file`: the path extract read it from,
+  - `source_row`: its data row within that file (1 = first row after the header),
+  - `ingest_batch`: the run that loaded it (`new_batch_id`, one per extract).
+
+The quarantine keeps `source_file` and `ingest_batch` as well.
+
+`reprocess_file` replaces the facts of one corrected file without rerunning
+the pipeline:
+
+  1. extract, transform, dedup and validate that file on its own;
+  2. map its surrogate keys to the warehouse's by natural key. The small
+     dimensions are read whole. Locations (by geohash) and dates are looked
+     up only for the file's own values, through their indexes. Members
+     the warehouse does not have yet are inserted;
+  3. in one transaction, delete the file's facts and quarantined rows (the
+     `source_file` indexes) and insert the new ones;
+  4. drop the dimension members that only the old rows referenced, and
+     maintain the empty fact_species rows of sample locations. As in a full
+     load, quarantined rows still count as users of their members and
+     locations;
+  5. rebuild the quantile sketches of the touched (member, year) cells;
+  6. for species files, rewrite the touched cells of the species raster.
+
+The cost follows the size of the file. The one exception is the sketches: a
+t-digest cannot remove values, so they re-read the rows of the years the file
+touches. `reprocess_batch` reprocesses every file of one ingest batch.
+
+    python main.py --lineage                       # files, row ranges and batches
+    python main.py --reprocess data/regional/north_pacific.csv
+    python main.py --reprocess-batch 20250301120000
+
+`benchmarks/bench_reprocess.py` checks that a reprocess leaves the warehouse
+equal to a fresh full load (DB.reconcile).
+"""
+import io
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from ETL.extract import MICROPLASTICS_SCHEMA, SPECIES_SCHEMA, extract
+from ETL.transform import transform
+from ETL.dedup import dedup
+from ETL.validate import validate
+from ETL.load import LOAD_ORDER, _write
+
+# Dimensiones con clave sustituta local en transform: (clave en dfs, columna id, clave natural)
+DIM_KEYS = [
+    ("dim_ocean", "ocean_id", ["ocean"]),
+    ("dim_region", "region_id", ["region"]),
+    ("dim_marine", "marine_setting_id", ["marine_setting"]),
+    ("dim_sampling", "method_id", ["sampling_method"]),
+    ("dim_unit", "unit_id", ["unit"]),
+    ("dim_conc", "concentration_id", ["concentration_class_range", "concentration_class_text"]),
+    ("dim_org", "organization_id", ["organization"]),
+]
+TABLES = dict(LOAD_ORDER)
+
+# Hechos: (clave en dfs, tabla)
+FACTS = [("fact_micro", "fact_microplastics"), ("fact_species", "fact_species")]
+
+# Tamaño de las listas IN de las búsquedas por clave
+IN_CHUNK = 500
+
+# Clave de la ubicación nula (filas sin coordenadas) en los conjuntos de ubicaciones
+NO_LOCATION = -1
+
+
+def new_batch_id() -> str:
+    """Id del lote de ingesta (un timestamp, como las generaciones de DB/publish.py)."""
+    return datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+def _select_in(conn, sql: str, values, params: dict = None) -> pd.DataFrame:
+    """`sql` con `IN :ids` ejecutada por tramos de IN_CHUNK valores."""
+    values = list(dict.fromkeys(v for v in values if pd.notna(v)))
+    stmt = text(sql).bindparams(bindparam("ids", expanding=True))
+    frames = [
+        pd.read_sql_query(stmt, conn, params={**(params or {}), "ids": values[i:i + IN_CHUNK]})
+        for i in range(0, len(values), IN_CHUNK)
+    ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.read_sql_query(
+        text(sql.replace("IN :ids", "IN (NULL)")), conn, params=params)
+
+
+def _ints(values) -> list:
+    return [int(v) for v in pd.Series(list(values), dtype="float64").dropna().unique()]
+
+
+def lineage_summary(engine) -> pd.DataFrame:
+    """Filas, rango de source_row y lotes de cada archivo de origen, por hecho."""
+    frames = []
+    for _, table in FACTS:
+        frames.append(pd.read_sql_query(text(f"""
+            SELECT '{table}' AS fact_table, source_file, ingest_batch, COUNT(*) AS n_rows,
+                   MIN(source_row) AS first_row, MAX(source_row) AS last_row
+            FROM {table}
+            WHERE source_file IS NOT NULL
+            GROUP BY source_file, ingest_batch
+        """), engine))
+    return pd.concat(frames, ignore_index=True).sort_values(["source_file", "ingest_batch"], ignore_index=True)
+
+
+def stored_source(conn, path: str) -> str:
+    """
+    Valor de source_file con que el warehouse guardó `path` (la ruta tal como
+    la recibió extract, relativa o absoluta). Si no hay filas de ese archivo
+    se devuelve `path`.
+    """
+    for _, table in FACTS:
+        if conn.execute(text(f"SELECT 1 FROM {table} WHERE source_file = :f LIMIT 1"), {"f": path}).first():
+            return path
+    name = os.path.basename(path)
+    candidates = set()
+    for _, table in FACTS:
+        candidates.update(conn.execute(
+            text(f"SELECT DISTINCT source_file FROM {table} WHERE source_file LIKE :pattern"),
+            {"pattern": f"%{name}"},
+        ).scalars())
+    same = [c for c in candidates if os.path.abspath(c) == os.path.abspath(path)]
+    if not same and len(candidates) == 1:
+        same = list(candidates)
+    return same[0] if same else path
+
+
+def _empty_frame(schema: dict) -> pd.DataFrame:
+    """Salida de extract sin filas, para transformar un archivo de un solo lado."""
+    dtypes = {"string": object, "int64": "float64"}
+    return pd.DataFrame({col: pd.Series(dtype=dtypes.get(t, t)) for col, t in schema.items()})
+
+
+def _is_species(raw: pd.DataFrame) -> bool:
+    return "Species Count" in raw.columns
+
+
+def _warehouse_ids(conn, local: pd.DataFrame, table: str, id_col: str, keys: list, existing: pd.DataFrame):
+    """
+    Ids del warehouse para cada miembro de la dimensión local (por clave natural).
+    Los que no existen reciben ids nuevos a partir de MAX(id) + 1.
+    Devuelve (mapa id local -> id warehouse, filas nuevas con ids del warehouse).
+    """
+    merged = local.merge(existing.rename(columns={id_col: "_wh"}), on=keys, how="left")
+    new = merged["_wh"].isna().to_numpy()
+    if new.any():
+        next_id = conn.execute(text(f"SELECT COALESCE(MAX({id_col}), 0) + 1 FROM {table}")).scalar_one()
+        merged.loc[new, "_wh"] = np.arange(int(next_id), int(next_id) + int(new.sum()))
+    mapping = pd.Series(merged["_wh"].astype("int64").to_numpy(), index=merged[id_col].to_numpy())
+    added = merged[new].drop(columns=[id_col]).rename(columns={"_wh": id_col})
+    return mapping, added[local.columns]
+
+
+def to_warehouse_keys(conn, dfs: dict, typed: bool = False) -> dict:
+    """
+    Reescribe las claves sustitutas locales de `dfs` (transform de un solo
+    archivo) con las del warehouse e inserta los miembros nuevos. Devuelve
+    cuántos miembros nuevos hubo por dimensión.
+    """
+    added = {}
+
+    # Ubicaciones: solo los geohash del archivo (índice idx_loc_geohash); el cruce es por lat/lon exactas
+    loc = dfs["dim_location"]
+    existing = _select_in(conn, "SELECT location_id, latitude, longitude FROM dim_location WHERE geohash IN :ids",
+                          loc["geohash"].tolist())
+    specs = [("dim_location", "location_id", ["latitude", "longitude"], existing)]
+    for key, id_col, cols in DIM_KEYS:
+        existing = pd.read_sql_query(text(f"SELECT {id_col}, {', '.join(cols)} FROM {TABLES[key]}"), conn)
+        specs.append((key, id_col, cols, existing))
+
+    for key, id_col, cols, existing in specs:
+        mapping, new_rows = _warehouse_ids(conn, dfs[key], TABLES[key], id_col, cols, existing)
+        _write(conn, new_rows, TABLES[key], typed)
+        added[TABLES[key]] = len(new_rows)
+        dfs[key] = dfs[key].assign(**{id_col: dfs[key][id_col].map(mapping)})
+        for fact, _ in FACTS:
+            if id_col in dfs[fact].columns:
+                dfs[fact] = dfs[fact].assign(**{id_col: dfs[fact][id_col].map(mapping).astype("Int64")})
+
+    # Fechas: date_id es natural (YYYYMMDD), solo se agregan las que faltan
+    dates = dfs["dim_date"]
+    known = _select_in(conn, "SELECT date_id FROM dim_date WHERE date_id IN :ids", _ints(dates["date_id"]))
+    new_dates = dates[~dates["date_id"].isin(known["date_id"])].copy()
+    if not typed:
+        new_dates["full_date"] = pd.to_datetime(new_dates["full_date"]).dt.date
+    _write(conn, new_dates, "dim_date", typed)
+    added["dim_date"] = len(new_dates)
+    return added
+
+
+def _old_rows(conn, source: str) -> dict:
+    """Filas actuales de `source` en cada hecho (solo claves y coordenadas)."""
+    micro_cols = ["location_id", "date_id"] + [id_col for _, id_col, _ in DIM_KEYS]
+    return {
+        "fact_micro": pd.read_sql_query(
+            text(f"SELECT {', '.join(micro_cols)}, measurement FROM fact_microplastics WHERE source_file = :f"),
+            conn, params={"f": source}),
+        "fact_species": pd.read_sql_query(text("""
+            SELECT s.location_id, l.latitude, l.longitude
+            FROM fact_species s JOIN dim_location l ON l.location_id = s.location_id
+            WHERE s.source_file = :f
+        """), conn, params={"f": source}),
+        "quarantine": pd.read_sql_query(
+            text("SELECT quarantine_id, source_table, row_data, source_file FROM quarantine WHERE source_file = :f"),
+            conn, params={"f": source}),
+    }
+
+
+def _quarantined(quarantine: pd.DataFrame, fact: str) -> pd.DataFrame:
+    """
+    Filas de `fact` guardadas en la cuarentena: las claves de row_data, más
+    quarantine_id (si viene) y el source_file de la fila de cuarentena.
+    """
+    table = dict(FACTS)[fact]
+    q = quarantine[quarantine["source_table"] == table].reset_index(drop=True)
+    if len(q):
+        rows = pd.read_json(io.StringIO("\n".join(q["row_data"])), lines=True, dtype=False)
+    else:
+        rows = pd.DataFrame(index=q.index)
+    keys = ["location_id"] + (["date_id"] + [id_col for _, id_col, _ in DIM_KEYS] if fact == "fact_micro" else [])
+    out = pd.DataFrame({col: pd.to_numeric(rows[col], errors="coerce") if col in rows.columns else np.nan
+                        for col in keys}, index=q.index)
+    out["quarantine_id"] = q["quarantine_id"] if "quarantine_id" in q.columns else np.nan
+    out["source_file"] = q["source_file"].to_numpy()
+    return out
+
+
+def _all_quarantined(conn) -> dict:
+    """_quarantined de toda la tabla quarantine, por hecho (la cuarentena es chica frente a los hechos)."""
+    quarantine = pd.read_sql_query(
+        text("SELECT quarantine_id, source_table, row_data, source_file FROM quarantine"), conn)
+    return {fact: _quarantined(quarantine, fact) for fact, _ in FACTS}
+
+
+def _location_keys(values) -> set:
+    """Ids de ubicación como conjunto, con NO_LOCATION en lugar de los nulos."""
+    values = pd.Series(list(values), dtype="float64")
+    return set(_ints(values)) | ({NO_LOCATION} if values.isna().any() else set())
+
+
+def _drop_orphans(conn, old: dict, dfs: dict, locations: list) -> dict:
+    """
+    Borra los miembros que referenciaban las filas antiguas del archivo
+    (hechos o cuarentena), que el archivo corregido ya no trae y que ninguna
+    otra fila de microplásticos usa, y las ubicaciones `locations` (de
+    _fix_locations). Una carga completa conserva también los miembros de las
+    filas en cuarentena.
+    """
+    removed = {}
+    old_rows = [old["fact_micro"], _quarantined(old["quarantine"], "fact_micro")]
+    quarantined = _all_quarantined(conn)["fact_micro"]
+    for key, id_col, _ in DIM_KEYS + [("dim_date", "date_id", None)]:
+        candidates = set().union(*(_ints(rows[id_col]) for rows in old_rows)) - set(_ints(dfs[key][id_col]))
+        if not candidates:
+            continue
+        used = _select_in(conn, f"SELECT DISTINCT {id_col} FROM fact_microplastics WHERE {id_col} IN :ids",
+                          candidates)
+        orphans = sorted(candidates - set(_ints(used[id_col])) - set(_ints(quarantined[id_col])))
+        if orphans:
+            conn.execute(text(f"DELETE FROM {TABLES[key]} WHERE {id_col} IN :ids")
+                         .bindparams(bindparam("ids", expanding=True)), {"ids": orphans})
+        removed[TABLES[key]] = len(orphans)
+    if locations:
+        conn.execute(text("DELETE FROM dim_location WHERE location_id IN :ids")
+                     .bindparams(bindparam("ids", expanding=True)), {"ids": locations})
+    removed["dim_location"] = len(locations)
+    return removed
+
+
+def _fix_locations(conn, locations: set, placeholders: pd.DataFrame, typed: bool = False) -> list:
+    """
+    Deja las ubicaciones tocadas (`locations`, de _location_keys) como las
+    dejaría una carga completa. Cuentan como muestras de microplásticos
+    también las filas en cuarentena, y como datos de especies las filas de
+    especies en cuarentena:
+
+      - una ubicación con muestras y sin especies tiene una fila vacía en
+        fact_species (species_count NULL, sin linaje). Si sus coordenadas son
+        inválidas (o nulas, NO_LOCATION), esa fila está en la cuarentena,
+        también sin source_file; `placeholders` trae las de este archivo;
+      - las demás no tienen fila vacía.
+
+    Devuelve las ubicaciones que quedaron sin muestras ni especies.
+    """
+    if not locations:
+        return []
+    ids = sorted(locations - {NO_LOCATION})
+    quarantined = _all_quarantined(conn)
+    q_micro, q_species = quarantined["fact_micro"], quarantined["fact_species"]
+
+    micro = set(_ints(_select_in(
+        conn, "SELECT DISTINCT location_id FROM fact_microplastics WHERE location_id IN :ids", ids)["location_id"]))
+    micro = (micro | _location_keys(q_micro["location_id"])) & locations
+    species = _select_in(conn, """
+        SELECT location_id, SUM(CASE WHEN species_count IS NOT NULL THEN 1 ELSE 0 END) AS n_counts, COUNT(*) AS n_rows
+        FROM fact_species WHERE location_id IN :ids GROUP BY location_id
+    """, ids)
+    with_rows = set(_ints(species["location_id"]))
+    with_species = set(_ints(species.loc[species["n_counts"] > 0, "location_id"]))
+    with_species |= _location_keys(q_species.loc[q_species["source_file"].notna(), "location_id"]) & locations
+
+    coords = _select_in(conn, "SELECT location_id, latitude, longitude FROM dim_location WHERE location_id IN :ids", ids)
+    valid = set(_ints(coords.loc[coords["latitude"].between(-90, 90) & coords["longitude"].between(-180, 180),
+                                 "location_id"]))
+    empty = micro - with_species
+
+    # Filas vacías de fact_species: sobran fuera de `empty & valid`, faltan las que no tienen ninguna fila
+    stale = sorted(set(ids) - (empty & valid))
+    if stale:
+        conn.execute(text("""
+            DELETE FROM fact_species
+            WHERE species_count IS NULL AND source_file IS NULL AND location_id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"ids": stale})
+    missing = sorted((empty & valid) - with_rows)
+    _write(conn, pd.DataFrame({"location_id": missing, "species_count": pd.Series([None] * len(missing), dtype="Int64")}),
+           "fact_species", typed)
+
+    # Filas vacías en cuarentena (coordenadas inválidas): una por ubicación
+    held = q_species[q_species["source_file"].isna()].copy()
+    held["key"] = held["location_id"].fillna(NO_LOCATION).astype("int64")
+    held = held[held["key"].isin(locations)]
+    keep = held[held["key"].isin(empty - valid)].drop_duplicates("key")
+    drop = sorted(set(_ints(held["quarantine_id"])) - set(_ints(keep["quarantine_id"])))
+    if drop:
+        conn.execute(text("DELETE FROM quarantine WHERE quarantine_id IN :ids")
+                     .bindparams(bindparam("ids", expanding=True)), {"ids": drop})
+    if len(placeholders):
+        keys = _quarantined(placeholders, "fact_species")["location_id"].fillna(NO_LOCATION).astype("int64")
+        add = keys.isin(empty - valid).to_numpy() & ~keys.isin(keep["key"]).to_numpy() & ~keys.duplicated().to_numpy()
+        _write(conn, placeholders[add], "quarantine", typed)
+
+    return sorted(set(ids) - micro - with_species)
+
+
+def reprocess_file(engine, path: str, batch: str = None, reader: str = "pandas", typed: bool = False,
+                   raster_path: str = None) -> dict:
+    """
+    Reemplaza en el warehouse los hechos de un archivo de origen con su
+    contenido actual en disco (ver el docstring del módulo). `raster_path`,
+    si existe, recibe las celdas cambiadas de un archivo de especies.
+    Devuelve un resumen de lo hecho.
+    """
+    from DB.sketches import refresh_cells, sketch_cells
+
+    t0 = time.perf_counter()
+    batch = batch or new_batch_id()
+    raw = extract(path, reader=reader, batch=batch)
+    species_file = _is_species(raw)
+    with engine.connect() as conn:
+        source = stored_source(conn, path)
+    raw["source_file"] = pd.Series(source, index=raw.index, dtype="category")
+
+    if species_file:
+        dfs = transform(_empty_frame(MICROPLASTICS_SCHEMA), raw, typed=typed)
+    else:
+        dfs = transform(raw, _empty_frame(SPECIES_SCHEMA), typed=typed)
+    dfs, _ = dedup(dfs)
+
+    with engine.begin() as conn:
+        old = _old_rows(conn, source)
+        added = to_warehouse_keys(conn, dfs, typed)
+        dfs, _ = validate(dfs)
+        # Las filas vacías de fact_species (ubicaciones sin especies) no son del archivo
+        for fact, _ in FACTS:
+            dfs[fact] = dfs[fact][dfs[fact]["source_file"].notna()] \
+                if "source_file" in dfs[fact].columns else dfs[fact].iloc[:0]
+
+        # Igual en la cuarentena: las filas vacías de fact_species que fallan la validación
+        # (sin source_file) las mantiene _fix_locations
+        quarantine = dfs["quarantine"]
+        placeholders = quarantine[quarantine["source_file"].isna()].reset_index(drop=True)
+        dfs["quarantine"] = quarantine[quarantine["source_file"].notna()].reset_index(drop=True)
+
+        for fact, table in FACTS:
+            conn.execute(text(f"DELETE FROM {table} WHERE source_file = :f"), {"f": source})
+            _write(conn, dfs[fact], table, typed)
+        conn.execute(text("DELETE FROM quarantine WHERE source_file = :f"), {"f": source})
+        if len(dfs["quarantine"]):
+            _write(conn, dfs["quarantine"], "quarantine", typed)
+
+        # Ubicaciones tocadas: las de las filas antiguas y nuevas, en los hechos y en la cuarentena
+        touched = set()
+        for rows in (old["fact_micro"], old["fact_species"], dfs["fact_micro"], dfs["fact_species"]):
+            touched |= _location_keys(rows["location_id"])
+        for quarantine in (old["quarantine"], dfs["quarantine"], placeholders):
+            for fact, _ in FACTS:
+                touched |= _location_keys(_quarantined(quarantine, fact)["location_id"])
+        orphan_locations = _fix_locations(conn, touched, placeholders, typed)
+
+        cells = [sketch_cells(rows) for rows in (old["fact_micro"], dfs["fact_micro"]) if len(rows)]
+        cells = pd.concat(cells, ignore_index=True).drop_duplicates() if cells else pd.DataFrame()
+        n_sketches = refresh_cells(conn, cells, typed=typed)
+
+    # Miembros huérfanos en otra transacción: DuckDB valida las FK también contra
+    # las filas de hechos borradas en la misma transacción
+    with engine.begin() as conn:
+        removed = _drop_orphans(conn, old, dfs, orphan_locations)
+
+    n_cells = 0
+    if species_file and raster_path and os.path.exists(raster_path):
+        # Celdas del archivo anterior a NaN y luego los valores nuevos
+        from ETL.raster import update_raster
+        prev = old["fact_species"]
+        update_raster(raster_path, prev["latitude"], prev["longitude"], np.full(len(prev), np.nan))
+        n_cells = update_raster(raster_path, raw["Latitude"], raw["Longitude"], raw["Species Count"])
+
+    summary = {
+        "source_file": source,
+        "ingest_batch": batch,
+        "kind": "species" if species_file else "microplastics",
+        "rows_deleted": len(old["fact_micro"]) + len(old["fact_species"]),
+        "rows_inserted": len(dfs["fact_micro"]) + len(dfs["fact_species"]),
+        "rows_quarantined": len(dfs["quarantine"]),
+        "members_added": {k: v for k, v in added.items() if v},
+        "members_removed": {k: v for k, v in removed.items() if v},
+        "sketch_cells": len(cells),
+        "sketches_written": n_sketches,
+        "raster_cells": n_cells,
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    print(f"Reprocesado {source} ({summary['kind']}, lote {batch}): {summary['rows_deleted']} filas borradas, "
+          f"{summary['rows_inserted']} insertadas, {summary['rows_quarantined']} en cuarentena, "
+          f"{len(cells)} celdas de sketch; {summary['seconds']:.2f} s")
+    return summary
+
+
+def batch_files(engine, batch: str) -> list:
+    """Archivos de origen con filas (o cuarentena) del lote `batch`."""
+    files = set()
+    with engine.connect() as conn:
+        for table in [t for _, t in FACTS] + ["quarantine"]:
+            files.update(conn.execute(
+                text(f"SELECT DISTINCT source_file FROM {table} WHERE ingest_batch = :b AND source_file IS NOT NULL"),
+                {"b": batch},
+            ).scalars())
+    return sorted(files)
+
+
+def reprocess_batch(engine, batch: str, reader: str = "pandas", typed: bool = False,
+                    raster_path: str = None) -> list:
+    """Reprocesa (con `reprocess_file`) cada archivo del lote `batch`, en un lote nuevo."""
+    files = batch_files(engine, batch)
+    if not files:
+        raise ValueError(f"No hay filas del lote {batch!r} en el warehouse")
+    new_batch = new_batch_id()
+    return [reprocess_file(engine, f, batch=new_batch, reader=reader, typed=typed, raster_path=raster_path)
+            for f in files]
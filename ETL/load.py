@@ -1,53 +1,96 @@
+import numpy as np
 import pandas as pd
+from sqlalchemy import column, insert, table as sql_table
+
+CHUNKSIZE = 1000
+
+# (clave en dfs, tabla destino) en orden de carga: dimensiones antes que hechos
+LOAD_ORDER = [
+    ("dim_location", "dim_location"),
+    ("dim_ocean", "dim_ocean"),
+    ("dim_region", "dim_region"),
+    ("dim_marine", "dim_marine_setting"),
+    ("dim_sampling", "dim_sampling_method"),
+    ("dim_unit", "dim_unit"),
+    ("dim_conc", "dim_concentration_class"),
+    ("dim_date", "dim_date"),
+    ("dim_org", "dim_organization"),
+    ("dim_depth_band", "dim_depth_band"),
+    ("fact_micro", "fact_microplastics"),
+    ("fact_species", "fact_species"),
+]
 
 def _none_na(df: pd.DataFrame) -> pd.DataFrame:
     return df.where(pd.notnull(df), None)
 
-def load(dfs: dict, engine):
+def _column_values(series: pd.Series, start: int, stop: int) -> list:
     """
-    Inserta en MySQL en el orden correcto.
+    Valores Python de series[start:stop] con None donde la máscara de validez
+    marca nulo. No crea una copia object de la columna completa.
     """
-    # Normaliza NULLs y tipos de fecha
-    if "dim_date" in dfs and "full_date" in dfs["dim_date"].columns:
-        dfs["dim_date"]["full_date"] = pd.to_datetime(dfs["dim_date"]["full_date"]).dt.date
+    arr = series.array[start:stop]
+    pa_array = getattr(arr, "_pa_array", None)
+    if pa_array is not None:
+        # Arrow: to_pylist ya devuelve None según el bitmap de validez
+        return pa_array.to_pylist()
+    mask = np.asarray(arr.isna())
+    if pd.api.types.is_datetime64_any_dtype(arr.dtype):
+        values = [ts.date() if ts is not pd.NaT else None for ts in arr]
+    elif hasattr(arr.dtype, "numpy_dtype") and arr.dtype.kind in "iufb":
+        # Nullable numérico (Int32, Float64...): datos y máscara por separado
+        values = arr.to_numpy(dtype=arr.dtype.numpy_dtype, na_value=0).tolist()
+    else:
+        values = np.asarray(arr).tolist()
+    if mask.any():
+        for i in np.flatnonzero(mask):
+            values[i] = None
+    return values
 
-    with engine.begin() as conn:
-        # Dimensiones
-        order_dims = [
-            ("dim_location", "dim_location"),
-            ("dim_ocean", "dim_ocean"),
-            ("dim_region", "dim_region"),
-            ("dim_marine", "dim_marine_setting"),
-            ("dim_sampling", "dim_sampling_method"),
-            ("dim_unit", "dim_unit"),
-            ("dim_conc", "dim_concentration_class"),
-            ("dim_date", "dim_date"),
-            ("dim_org", "dim_organization"),
-        ]
-        for key, table in order_dims:
-            _none_na(dfs[key]).to_sql(
-                table,
-                con=conn,
-                if_exists="append",
-                index=False,
-                method="multi",
-                chunksize=1000
-            )
-
-        # Hechos
-        _none_na(dfs["fact_micro"]).to_sql(
-            "fact_microplastics",
+def _insert_typed(conn, df: pd.DataFrame, table_name: str, chunksize: int = CHUNKSIZE):
+    """INSERT por lotes (executemany) directamente desde columnas tipadas."""
+    cols = list(df.columns)
+    stmt = insert(sql_table(table_name, *[column(c) for c in cols]))
+    for start in range(0, len(df), chunksize):
+        stop = min(start + chunksize, len(df))
+        columns = [_column_values(df[c], start, stop) for c in cols]
+        rows = [dict(zip(cols, row)) for row in zip(*columns)]
+        conn.execute(stmt, rows)
+
+def _write(conn, df: pd.DataFrame, table_name: str, typed: bool):
+    if typed:
+        _insert_typed(conn, df, table_name)
+    else:
+        _none_na(df).to_sql(
+            table_name,
             con=conn,
             if_exists="append",
             index=False,
             method="multi",
-            chunksize=1000
+            chunksize=CHUNKSIZE
         )
-        _none_na(dfs["fact_species"]).to_sql(
-            "fact_species",
-            con=conn,
-            if_exists="append",
-            index=False,
-            method="multi",
-            chunksize=1000
-        )
\ No newline at end of file
+
+def load(dfs: dict, engine, typed: bool = False, sketches: bool = True, prefix: str = ""):
+    """
+    Inserta en MySQL en el orden correcto.
+    typed=True escribe los NULL desde las máscaras de las columnas nullable
+    (salida de transform(..., typed=True)) en vez de convertir a object.
+    sketches=True guarda además los t-digest de DB/sketches.py.
+    prefix se antepone a cada tabla destino (p.ej. "shadow_" en DB/publish.py).
+    """
+    # Normaliza NULLs y tipos de fecha
+    if not typed and "dim_date" in dfs and "full_date" in dfs["dim_date"].columns:
+        dfs["dim_date"]["full_date"] = pd.to_datetime(dfs["dim_date"]["full_date"]).dt.date
+
+    with engine.begin() as conn:
+        # Dimensiones y hechos
+        for key, table in LOAD_ORDER:
+            _write(conn, dfs[key], prefix + table, typed)
+
+        # Sketches de cuantiles de measurement por región/océano/método y año
+        if sketches:
+            from DB.sketches import build_sketches
+            _write(conn, build_sketches(dfs["fact_micro"]), prefix + "quantile_sketch", typed)
+
+        # Filas rechazadas por ETL.validate
+        if "quarantine" in dfs and len(dfs["quarantine"]):
+            _write(conn, dfs["quarantine"], prefix + "quarantine", typed)
@@ -0,0 +1,189 @@
+"""
+Species-richness raster: the MarineSpeciesRichness grid as a memory-mapped array.
+
+MarineSpeciesRichness.csv is a regular global grid (0.5° in the NOAA/AquaMaps
+export). The warehouse stores it as fact_species rows that only meet the
+microplastics samples through an exact float match on dim_location. A
+`SpeciesRaster` instead keeps the grid as one 2-D float32 array (latitude rows
+× longitude columns, NaN where the grid has no value) plus its origin and
+resolution. Pairing any array of sample coordinates with their species count
+is then an index computation on the nearest cell center:
+
+    raster = build_raster(raw["species"])           # once, from transform's input
+    raster = open_raster()                          # any later process (mmap)
+    counts = raster.lookup(df["latitude"], df["longitude"])
+
+The array is saved as .npy with a JSON sidecar (<path>.json) holding the grid
+metadata. `open_raster` maps it read-only, so every process shares the same
+pages and nothing is read until it is looked up.
+"""
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PATH = "reports/analytics/species_richness.npy"
+
+# Nombres de columnas aceptados: los del CSV (extract) o los de transform
+_COLUMNS = [
+    ("Latitude", "Longitude", "Species Count"),
+    ("latitude", "longitude", "species_count"),
+]
+
+
+def _columns(df: pd.DataFrame) -> tuple:
+    for cols in _COLUMNS:
+        if all(c in df.columns for c in cols):
+            return cols
+    raise ValueError(f"faltan columnas de la grilla de especies: se espera una de {_COLUMNS}")
+
+
+def _resolution(values: np.ndarray) -> float:
+    steps = np.diff(np.unique(values))
+    return float(steps.min()) if len(steps) else 1.0
+
+
+class SpeciesRaster:
+    """Grilla regular de riqueza de especies (filas = latitud, columnas = longitud)."""
+
+    def __init__(self, grid: np.ndarray, lat0: float, lon0: float, resolution: float):
+        self.grid = grid
+        self.lat0 = float(lat0)
+        self.lon0 = float(lon0)
+        self.resolution = float(resolution)
+
+    @property
+    def shape(self) -> tuple:
+        return self.grid.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.grid.nbytes
+
+    @property
+    def meta(self) -> dict:
+        return {"lat0": self.lat0, "lon0": self.lon0, "resolution": self.resolution,
+                "shape": list(self.shape), "dtype": str(self.grid.dtype)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, resolution: float = None) -> "SpeciesRaster":
+        """
+        Raster a partir de la tabla de especies (cruda o transformada). La
+        resolución se infiere del menor paso entre coordenadas distintas; si
+        algún punto no cae en la grilla se lanza ValueError.
+        """
+        lat_col, lon_col, value_col = _columns(df)
+        df = df[[lat_col, lon_col, value_col]].dropna(subset=[lat_col, lon_col])
+        lat = df[lat_col].to_numpy(dtype=np.float64)
+        lon = df[lon_col].to_numpy(dtype=np.float64)
+        if resolution is None:
+            resolution = min(_resolution(lat), _resolution(lon))
+        lat0, lon0 = (float(lat.min()), float(lon.min())) if len(lat) else (0.0, 0.0)
+
+        i, j = (lat - lat0) / resolution, (lon - lon0) / resolution
+        off_grid = (np.abs(i - np.rint(i)) > 1e-6) | (np.abs(j - np.rint(j)) > 1e-6)
+        if off_grid.any():
+            raise ValueError(f"{int(off_grid.sum())} puntos no caen en una grilla regular de {resolution}°")
+        i, j = np.rint(i).astype(np.int64), np.rint(j).astype(np.int64)
+
+        grid = np.full((int(i.max()) + 1 if len(i) else 0, int(j.max()) + 1 if len(j) else 0), np.nan, dtype=np.float32)
+        # Celdas repetidas: gana la última fila, como un upsert
+        grid[i, j] = df[value_col].to_numpy(dtype=np.float32)
+        return cls(grid, lat0, lon0, resolution)
+
+    def save(self, path: str = DEFAULT_PATH):
+        """Guarda el .npy y su sidecar <path>.json (escritura atómica de ambos)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.grid))
+        with open(tmp + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, path)
+        os.replace(tmp + ".json", path + ".json")
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_PATH) -> "SpeciesRaster":
+        """Raster guardado con `save`, mapeado en memoria (solo lectura)."""
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        grid = np.load(path, mmap_mode="r")
+        if list(grid.shape) != meta["shape"]:
+            raise ValueError(f"{path}: forma {grid.shape} distinta a la del sidecar {meta['shape']}")
+        return cls(grid, meta["lat0"], meta["lon0"], meta["resolution"])
+
+    def cell_index(self, lat, lon) -> tuple:
+        """(fila, columna, válido) de la celda más cercana a cada coordenada."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        # Longitudes en [-180, 180)
+        lon = (lon + 180.0) % 360.0 - 180.0
+        i = np.rint((lat - self.lat0) / self.resolution)
+        j = np.rint((lon - self.lon0) / self.resolution)
+        valid = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])  # NaN -> False
+        return np.where(valid, i, 0).astype(np.int64), np.where(valid, j, 0).astype(np.int64), valid
+
+    def lookup(self, lat, lon) -> np.ndarray:
+        """
+        Riqueza de especies de la celda más cercana a cada (lat, lon); NaN
+        fuera de la grilla, en celdas sin valor o con coordenadas nulas.
+        """
+        i, j, valid = self.cell_index(lat, lon)
+        out = np.asarray(self.grid[i, j], dtype=np.float64)
+        out[~valid] = np.nan
+        return out
+
+    def cells(self) -> pd.DataFrame:
+        """Celdas con valor: latitude, longitude, species_count."""
+        i, j = np.nonzero(~np.isnan(self.grid))
+        return pd.DataFrame({
+            "latitude": self.lat0 + i * self.resolution,
+            "longitude": self.lon0 + j * self.resolution,
+            "species_count": np.asarray(self.grid[i, j], dtype=np.float64),
+        })
+
+
+def build_raster(df_species: pd.DataFrame, path: str = DEFAULT_PATH, resolution: float = None) -> SpeciesRaster:
+    """Convierte la grilla de especies en raster y lo guarda en `path` (una vez por carga)."""
+    raster = SpeciesRaster.from_frame(df_species, resolution)
+    raster.save(path)
+    _open.cache_clear()
+    print(f"Raster de especies: {raster.shape[0]}x{raster.shape[1]} celdas de {raster.resolution}° "
+          f"({raster.nbytes / 1e6:,.1f} MB) en {path}")
+    return raster
+
+
+def update_raster(path: str, lat, lon, values) -> int:
+    """
+    Escribe `values` en las celdas de (lat, lon) del raster guardado en `path`,
+    en el sitio (mmap de lectura/escritura): solo se tocan las páginas de esas
+    celdas. NaN borra la celda; los puntos fuera de la grilla o que no caen
+    exactamente en un centro de celda se ignoran. Devuelve cuántas celdas se
+    escribieron.
+    """
+    raster = SpeciesRaster.open(path)
+    grid = np.load(path, mmap_mode="r+")
+    i, j, valid = raster.cell_index(lat, lon)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = (np.asarray(lon, dtype=np.float64) + 180.0) % 360.0 - 180.0
+    with np.errstate(invalid="ignore"):
+        valid &= (np.abs(raster.lat0 + i * raster.resolution - lat) < 1e-6) & \
+                 (np.abs(raster.lon0 + j * raster.resolution - lon) < 1e-6)
+    values = np.asarray(values, dtype=np.float32)
+    grid[i[valid], j[valid]] = values[valid]
+    grid.flush()
+    del grid
+    _open.cache_clear()
+    return int(valid.sum())
+
+
+@lru_cache(maxsize=8)
+def _open(path: str, mtime: float) -> SpeciesRaster:
+    return SpeciesRaster.open(path)
+
+
+def open_raster(path: str = DEFAULT_PATH) -> SpeciesRaster:
+    """SpeciesRaster.open memoizado por ruta y mtime (se reabre si se reconstruye)."""
+    return _open(os.path.abspath(path), os.path.getmtime(path))
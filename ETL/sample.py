@@ -0,0 +1,91 @@
+"""
+Stratified sample of the raw extract, for fast end-to-end iterations.
+
+`sample_raw` keeps a reproducible fraction of the microplastics rows in every
+(region, year, sampling method) stratum, with at least `min_per_stratum` rows
+per stratum. On top of that it keeps one row for every member of the other
+dimensions (ocean, marine setting, unit, concentration class, organization)
+that the stratified draw missed. Every dimension member of the full run is
+therefore still present in the sample. Species rows at sampled locations are
+kept, so the species/microplastics overlap survives; the rest are sampled by
+10° grid cell.
+
+The sample is drawn right after extract and flows through the usual stages.
+main.py (`--sample`) loads it into a scratch database, `<database>_sample`,
+and keeps its checkpoints and figures apart from the full run.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_FRACTION = 0.05
+
+# Estratos del muestreo (año aparte: se saca del texto de la fecha)
+STRATA = ["Region", "Sampling Method"]
+DATE_COLUMN = "Date (MM-DD-YYYY)"
+
+# Columnas de dimensión cuyos miembros deben seguir presentes en la muestra
+COVER = ["Ocean", "Region", "Marine Setting", "Sampling Method", "Unit",
+         "Concentration class text", "ORGANIZATION"]
+
+# Celda de la grilla para muestrear especies fuera de los puntos de microplásticos
+GRID_DEGREES = 10
+
+
+def sample_database(database: str) -> str:
+    """Base de datos scratch de la muestra."""
+    return f"{database}_sample"
+
+
+def _years(dates: pd.Series) -> pd.Series:
+    # Todos los formatos de fecha del CSV traen el año con 4 dígitos
+    return dates.astype("string").str.extract(r"(\d{4})", expand=False)
+
+
+def stratified_sample(df: pd.DataFrame, strata: list, fraction: float, seed: int = 0,
+                      min_per_stratum: int = 1, cover=()) -> pd.DataFrame:
+    """
+    Filas de `df` con una fracción `fraction` de cada estrato (mínimo
+    `min_per_stratum`); `strata` son Series alineadas con `df` (NaN es un
+    estrato más). Luego agrega una fila por cada valor de las columnas `cover`
+    que haya quedado fuera. Reproducible con `seed`, independiente del orden
+    de los grupos.
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError(f"fraction debe estar en (0, 1], no {fraction}")
+    key = pd.Series(np.random.default_rng(seed).random(len(df)), index=df.index)
+    groups = key.groupby([s.fillna("<NA>") for s in strata], sort=False)
+    quota = np.maximum(np.ceil(groups.transform("size") * fraction), min_per_stratum)
+    keep = groups.rank(method="first") <= quota
+
+    for col in cover:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        missing = values.notna() & ~values.isin(values[keep].unique())
+        if missing.any():
+            # La fila de menor clave de cada miembro ausente
+            keep.loc[key[missing].groupby(values[missing]).idxmin().to_numpy()] = True
+    return df[keep]
+
+
+def sample_raw(raw: dict, fraction: float = DEFAULT_FRACTION, seed: int = 0, min_per_stratum: int = 1) -> dict:
+    """Muestra estratificada de la salida de extract ({"microplastics", "species"})."""
+    micro, species = raw["microplastics"], raw["species"]
+    strata = [micro[c] if c in micro.columns else pd.Series(pd.NA, index=micro.index) for c in STRATA]
+    if DATE_COLUMN in micro.columns:
+        strata.append(_years(micro[DATE_COLUMN]))
+    micro_s = stratified_sample(micro, strata, fraction, seed, min_per_stratum, cover=COVER)
+
+    # Especies: todas las de puntos muestreados (el join de transform es por coordenadas)
+    # y una fracción del resto por celda de la grilla
+    coords = ["Latitude", "Longitude"]
+    sampled = pd.MultiIndex.from_frame(micro_s[["Latitude (degree)", "Longitude(degree)"]].set_axis(coords, axis=1))
+    at_points = pd.MultiIndex.from_frame(species[coords]).isin(sampled)
+    rest = species[~at_points]
+    cells = [(rest[c] // GRID_DEGREES) for c in coords]
+    species_s = pd.concat([species[at_points], stratified_sample(rest, cells, fraction, seed, min_per_stratum)])
+    species_s = species_s.sort_index()
+
+    print(f"Muestra estratificada ({fraction:.1%}, seed={seed}): "
+          f"{len(micro_s)}/{len(micro)} filas de microplásticos, {len(species_s)}/{len(species)} de especies")
+    return {"microplastics": micro_s.reset_index(drop=True), "species": species_s.reset_index(drop=True)}
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from DB.spatial import geohash_encode
+
 def _parse_dates_multi(series: pd.Series) -> pd.Series:
     s = series.astype(str).str.strip().replace({"": np.nan, "nan": np.nan, "NaN": np.nan})
     out = pd.to_datetime(s, format="%m-%d-%Y", errors="coerce")
@@ -15,7 +17,81 @@ def _parse_dates_multi(series: pd.Series) -> pd.Series:
         out.loc[m] = pd.to_datetime(s[m], errors="coerce")  # fallback flexible
     return out
 
-def transform(df_microplastics, df_species):
+# Bandas de profundidad de muestreo: (depth_band_id, etiqueta, desde, hasta) en metros,
+# intervalos [desde, hasta). La banda "Unknown" agrupa las muestras sin profundidad.
+DEPTH_BANDS = [
+    (1, "0–5m", 0, 5),
+    (2, "5–20m", 5, 20),
+    (3, "20–50m", 20, 50),
+    (4, "50–200m", 50, 200),
+    (5, "200m+", 200, None),
+]
+UNKNOWN_DEPTH_BAND_ID = 6
+
+def depth_band_ids(depth: pd.Series) -> pd.Series:
+    """depth_band_id de cada profundidad (UNKNOWN_DEPTH_BAND_ID si es nula)."""
+    edges = [lo for _, _, lo, _ in DEPTH_BANDS][1:]
+    values = pd.to_numeric(depth, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    ids = np.searchsorted(edges, values, side="right") + 1
+    ids[np.isnan(values)] = UNKNOWN_DEPTH_BAND_ID
+    return pd.Series(ids, index=depth.index, dtype="int64")
+
+def _dim_depth_band() -> pd.DataFrame:
+    rows = DEPTH_BANDS + [(UNKNOWN_DEPTH_BAND_ID, "Unknown", None, None)]
+    return pd.DataFrame(rows, columns=["depth_band_id", "depth_band", "min_depth", "max_depth"]).astype(
+        {"min_depth": "float64", "max_depth": "float64"}
+    )
+
+# Linaje de cada fila de hecho (ver ETL/lineage.py): archivo, fila y lote de ingesta
+LINEAGE_COLUMNS = ["source_file", "source_row", "ingest_batch"]
+
+# Columnas enteras (ids y conteos) y medidas en modo tipado
+_INT_COLS = ("species_count", "year", "month", "day", "source_row")
+_FLOAT_COLS = ("measurement", "water_sample_depth", "latitude", "longitude", "min_depth", "max_depth")
+_INT_DTYPES = ("Int8", "Int16", "Int32", "Int64")
+
+def _string_dtype():
+    try:
+        import pyarrow  # noqa: F401
+        return "string[pyarrow]"
+    except ImportError:
+        return "string"
+
+def _smallest_int(series: pd.Series) -> str:
+    lo, hi = series.min(), series.max()
+    if pd.isna(lo):
+        return "Int32"
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return "Int64"
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tipos compactos y con nulos nativos: ids/conteos -> Int8..Int32 según el
+    rango, medidas -> Float64, textos -> string (Arrow si está disponible).
+    Los NULL quedan en la máscara de validez, sin columnas object.
+    """
+    out = {}
+    str_dtype = _string_dtype()
+    for col in df.columns:
+        s = df[col]
+        if col.endswith("_id") or col in _INT_COLS:
+            s = s.astype("Int64")
+            out[col] = s.astype(_smallest_int(s))
+        elif col in _FLOAT_COLS:
+            out[col] = s.astype("Float64")
+        elif s.dtype == object:
+            out[col] = s.astype(str_dtype)
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+def transform(df_microplastics, df_species, typed=False):
+    """
+    typed=True devuelve las tablas con tipos nullable compactos (ver compact_dtypes).
+    """
     # ===== RENOMBRADO INICIAL =====
     df_microplastics = df_microplastics.rename(
         columns={
@@ -151,6 +227,8 @@ def transform(df_microplastics, df_species):
     # Locations
     dim_location = df[["latitude", "longitude"]].dropna().drop_duplicates().reset_index(drop=True)
     dim_location["location_id"] = dim_location.index + 1
+    # Geohash para filtros espaciales por rango de índice (DB/spatial.py)
+    dim_location["geohash"] = geohash_encode(dim_location["latitude"], dim_location["longitude"])
 
     # Ocean
     dim_ocean = df_microplastics_clean[["ocean"]].dropna().drop_duplicates().reset_index(drop=True)
@@ -187,8 +265,10 @@ def transform(df_microplastics, df_species):
     # Organization
     dim_org = df[["organization"]].dropna().drop_duplicates().reset_index(drop=True)
     dim_org["organization_id"] = dim_org.index + 1
-    
-    
+
+    # Depth band (fija; el id se calcula una vez aquí en vez de en cada consulta)
+    dim_depth_band = _dim_depth_band()
+
 
     # ===== FACTS =====
     fact_micro = (
@@ -204,6 +284,7 @@ def transform(df_microplastics, df_species):
         .merge(dim_org, on="organization", how="left")
     )
     fact_micro["ocean_id"] = fact_micro["ocean_id"].astype("Int64")
+    fact_micro["depth_band_id"] = depth_band_ids(fact_micro["water_sample_depth"])
 
     fact_micro = fact_micro[[
         "location_id",
@@ -215,13 +296,23 @@ def transform(df_microplastics, df_species):
         "concentration_id",
         "date_id",
         "organization_id",
+        "depth_band_id",
         "measurement",
         "water_sample_depth"
-    ]]
+    ] + [c for c in LINEAGE_COLUMNS if c in fact_micro.columns]]
 
-    fact_species = df.merge(dim_location, on=["latitude", "longitude"], how="left")[["location_id", "species_count"]]
+    # Linaje de fact_species: el de la fila de especies (tras el merge lleva sufijo si ambos lados lo traen)
+    species_lineage = {
+        (f"{c}_species" if c in df_microplastics_clean.columns else c): c
+        for c in LINEAGE_COLUMNS if c in df_species.columns
+    }
+    fact_species = (
+        df.merge(dim_location, on=["latitude", "longitude"], how="left")
+        [["location_id", "species_count"] + list(species_lineage)]
+        .rename(columns=species_lineage)
+    )
 
-    return {
+    dfs = {
         "dim_location": dim_location,
         "dim_ocean": dim_ocean,  
         "dim_region": dim_region,
@@ -231,6 +322,10 @@ def transform(df_microplastics, df_species):
         "dim_conc": dim_conc,
         "dim_date": dim_date,
         "dim_org": dim_org,
+        "dim_depth_band": dim_depth_band,
         "fact_micro": fact_micro,
         "fact_species": fact_species
-    }
\ No newline at end of file
+    }
+    if typed:
+        dfs = {name: compact_dtypes(table) for name, table in dfs.items()}
+    return dfs
\ No newline at end of file
@@ -0,0 +1,203 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from ETL.transform import _INT_COLS
+
+# Claves de dimensión que referencia cada hecho: (columna FK, tabla en dfs)
+FACT_FKS = {
+    "fact_micro": [
+        ("location_id", "dim_location"),
+        ("ocean_id", "dim_ocean"),
+        ("region_id", "dim_region"),
+        ("marine_setting_id", "dim_marine"),
+        ("method_id", "dim_sampling"),
+        ("unit_id", "dim_unit"),
+        ("concentration_id", "dim_conc"),
+        ("date_id", "dim_date"),
+        ("organization_id", "dim_org"),
+        ("depth_band_id", "dim_depth_band"),
+    ],
+    "fact_species": [
+        ("location_id", "dim_location"),
+    ],
+}
+
+# Nombre de la tabla destino de cada hecho (para la cuarentena)
+FACT_TABLES = {"fact_micro": "fact_microplastics", "fact_species": "fact_species"}
+
+# Columnas de linaje que la cuarentena guarda aparte de row_data
+QUARANTINE_LINEAGE = ["source_file", "ingest_batch"]
+
+_RANGE_RE = re.compile(r"^\s*(-?[\d.]+)\s*-\s*(-?[\d.]+)\s*$")
+_OPEN_RE = re.compile(r"^\s*>=?\s*(-?[\d.]+)\s*$")
+
+
+def _num(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _positions(known: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """
+    Posición de cada id dentro de `known` (-1 si no existe o es nulo).
+    Las claves sustitutas son enteros densos: se indexa una tabla directa
+    (min..max) en vez de buscar con hashing u ordenamiento.
+    """
+    pos = np.full(len(ids), -1)
+    known_ok = ~np.isnan(known)
+    if not known_ok.any():
+        return pos
+    lo, hi = known[known_ok].min(), known[known_ok].max()
+    if hi - lo > max(20 * len(known), 2_000_000):
+        # Claves dispersas: búsqueda binaria
+        order = np.argsort(known, kind="stable")
+        sorted_known = known[order]
+        idx = np.searchsorted(sorted_known, ids).clip(0, len(known) - 1)
+        return np.where(sorted_known[idx] == ids, order[idx], -1)
+
+    table = np.full(int(hi - lo) + 1, -1)
+    table[(known[known_ok] - lo).astype(np.int64)] = np.flatnonzero(known_ok)
+    with np.errstate(invalid="ignore"):
+        ok = (ids >= lo) & (ids <= hi) & (ids == np.floor(ids))
+    pos[ok] = table[(ids[ok] - lo).astype(np.int64)]
+    return pos
+
+
+def _lookup(dim: pd.DataFrame, key: str, cols, ids: pd.Series) -> list:
+    """Valores de dim[cols] para cada id (NaN si el id no existe)."""
+    pos = _positions(_num(dim[key]), _num(ids))
+    missing = pos < 0
+    out = []
+    for col in cols:
+        values = _num(dim[col])[pos.clip(0)] if len(dim) else np.full(len(pos), np.nan)
+        values[missing] = np.nan
+        out.append(values)
+    return out
+
+
+def _class_bounds(dim_conc: pd.DataFrame) -> pd.DataFrame:
+    """Límites [lo, hi] de cada clase de concentración a partir del texto del rango."""
+    lo = np.full(len(dim_conc), np.nan)
+    hi = np.full(len(dim_conc), np.nan)
+    for i, text in enumerate(dim_conc["concentration_class_range"].astype(str)):
+        m = _RANGE_RE.match(text)
+        if m:
+            lo[i], hi[i] = float(m.group(1)), float(m.group(2))
+            continue
+        m = _OPEN_RE.match(text)
+        if m:
+            lo[i], hi[i] = float(m.group(1)), np.inf
+    return pd.DataFrame({"concentration_id": _num(dim_conc["concentration_id"]), "lo": lo, "hi": hi})
+
+
+def _coordinate_rules(fact, dfs):
+    lat, lon = _lookup(dfs["dim_location"], "location_id", ("latitude", "longitude"), fact["location_id"])
+    return {
+        "NULL_LOCATION": fact["location_id"].isna().to_numpy(),
+        "LAT_RANGE": (lat < -90) | (lat > 90),
+        "LON_RANGE": (lon < -180) | (lon > 180),
+    }
+
+
+def _orphan_rules(name, fact, dfs):
+    rules = {}
+    for col, dim_name in FACT_FKS[name]:
+        if col not in fact.columns or dim_name not in dfs:
+            continue
+        ids = _num(fact[col])
+        known = _num(dfs[dim_name][col])
+        rules[f"ORPHAN_{col.upper()}"] = ~np.isnan(ids) & (_positions(known, ids) < 0)
+    return rules
+
+
+def micro_rules(fact: pd.DataFrame, dfs: dict) -> dict:
+    """Máscaras booleanas (True = falla) para fact_micro."""
+    measurement = _num(fact["measurement"])
+    rules = _coordinate_rules(fact, dfs)
+    rules["NEG_MEASUREMENT"] = measurement < 0
+    rules["NO_DATE"] = fact["date_id"].isna().to_numpy()
+    rules["NO_UNIT"] = ~np.isnan(measurement) & fact["unit_id"].isna().to_numpy()
+
+    # La medición debe caer dentro del rango de su clase de concentración
+    lo, hi = _lookup(_class_bounds(dfs["dim_conc"]), "concentration_id", ("lo", "hi"), fact["concentration_id"])
+    tol = 1e-9
+    with np.errstate(invalid="ignore"):
+        rules["CLASS_MISMATCH"] = ~np.isnan(measurement) & ~np.isnan(lo) & (
+            (measurement < lo - tol) | (measurement > hi + tol)
+        )
+
+    rules.update(_orphan_rules("fact_micro", fact, dfs))
+    return rules
+
+
+def species_rules(fact: pd.DataFrame, dfs: dict) -> dict:
+    """Máscaras booleanas (True = falla) para fact_species."""
+    rules = _coordinate_rules(fact, dfs)
+    rules["NEG_SPECIES"] = _num(fact["species_count"]) < 0
+    rules.update(_orphan_rules("fact_species", fact, dfs))
+    return rules
+
+
+def _quarantine_rows(name: str, fact: pd.DataFrame, rules: dict, bad: np.ndarray) -> pd.DataFrame:
+    idx = np.flatnonzero(bad)
+    codes = np.full(len(idx), "", dtype=object)
+    for code, mask in rules.items():
+        hit = mask[idx]
+        codes[hit] = codes[hit] + code + ","
+    rows = fact.iloc[idx]
+    # Columnas enteras (las de compact_dtypes) como enteros en row_data ("3", no "3.0"): el formato
+    # no depende de si otras filas de la entrada traían nulos
+    ints = [col for col in rows.columns
+            if (col.endswith("_id") or col in _INT_COLS) and pd.api.types.is_float_dtype(rows[col].dtype)
+            and (rows[col].dropna() % 1 == 0).all()]
+    rows = rows.astype({col: "Int64" for col in ints})
+    payload = rows.to_json(orient="records", lines=True, date_format="iso").splitlines() if len(rows) else []
+    out = pd.DataFrame({
+        "source_table": FACT_TABLES[name],
+        "reason_codes": pd.Series(codes).str.rstrip(",").to_numpy(),
+        "row_data": payload,
+    })
+    # Linaje en columnas propias: ETL.lineage reemplaza la cuarentena de un archivo o lote
+    for col in QUARANTINE_LINEAGE:
+        out[col] = rows[col].astype(object).to_numpy() if col in rows.columns else None
+    return out
+
+
+def validate(dfs: dict):
+    """
+    Aplica las reglas de calidad a los hechos. Las filas que fallan alguna regla
+    salen del hecho y pasan a dfs["quarantine"] con sus códigos de motivo.
+    Devuelve (dfs, summary) donde summary tiene una fila por tabla/regla.
+    """
+    dfs = dict(dfs)
+    summary = []
+    quarantined = []
+    for name, rule_fn in (("fact_micro", micro_rules), ("fact_species", species_rules)):
+        fact = dfs[name]
+        rules = rule_fn(fact, dfs)
+        bad = np.zeros(len(fact), dtype=bool)
+        for code, mask in rules.items():
+            mask = np.asarray(mask, dtype=bool)
+            rules[code] = mask
+            bad |= mask
+            summary.append({"table": FACT_TABLES[name], "rule": code,
+                            "failed_rows": int(mask.sum()), "total_rows": len(fact)})
+        if bad.any():
+            quarantined.append(_quarantine_rows(name, fact, rules, bad))
+            dfs[name] = fact[~bad].reset_index(drop=True)
+        summary.append({"table": FACT_TABLES[name], "rule": "QUARANTINED",
+                        "failed_rows": int(bad.sum()), "total_rows": len(fact)})
+
+    dfs["quarantine"] = (pd.concat(quarantined, ignore_index=True) if quarantined
+                         else pd.DataFrame(columns=["source_table", "reason_codes", "row_data"] + QUARANTINE_LINEAGE))
+    summary = pd.DataFrame(summary)
+    summary["pct"] = (100 * summary["failed_rows"] / summary["total_rows"].where(summary["total_rows"] > 0)).round(3)
+    return dfs, summary
+
+
+def print_summary(summary: pd.DataFrame):
+    print("\nValidación de calidad de datos:")
+    shown = summary[(summary["failed_rows"] > 0) | (summary["rule"] == "QUARANTINED")]
+    for _, row in shown.iterrows():
+        print(f"  {row['table']:20s} {row['rule']:28s} {row['failed_rows']:>8d} filas ({row['pct']}%)")
@@ -0,0 +1,72 @@
+"""
+Per-query latency: warehouse (MySQL, or whatever ODS14_DB_BACKEND points to)
+versus the DuckDB columnar copy used by generate_all_figures(backend="duckdb").
+
+The warehouse must already be loaded (python main.py --stages ... load).
+
+Usage:
+    python benchmarks/bench_analytics_backend.py --reps 5
+    python benchmarks/bench_analytics_backend.py --start-date 2010-01-01 --end-date 2020-01-01
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from DB.analytics import DuckDBStore, export_star_schema
+from DB.engine import get_engine
+from DB.queries import KPI_QUERIES, window_params
+
+
+def _time(fn, reps):
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--start-date", default=None)
+    ap.add_argument("--end-date", default=None)
+    ap.add_argument("--duckdb-path", default=None, help="reuse an existing export instead of a temp one")
+    args = ap.parse_args()
+
+    engine = get_engine()
+    params = window_params(args.start_date, args.end_date)
+
+    path = args.duckdb_path
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="ods14_bench_"), "ods14.duckdb")
+        t0 = time.perf_counter()
+        export_star_schema(engine, path)
+        print(f"export_star_schema: {time.perf_counter() - t0:.2f} s")
+    store = DuckDBStore(path)
+
+    rows = []
+    for name, query in KPI_QUERIES.items():
+        # warm-up (plan cache / buffer pool) antes de medir
+        pd.read_sql(query, engine, params=params)
+        store.run_df(query, params)
+        wh = _time(lambda: pd.read_sql(query, engine, params=params), args.reps)
+        dk = _time(lambda: store.run_df(query, params), args.reps)
+        rows.append({"query": name, "warehouse_ms": wh, "duckdb_ms": dk, "speedup": wh / dk if dk else float("nan")})
+
+    res = pd.DataFrame(rows).sort_values("warehouse_ms", ascending=False)
+    pd.set_option("display.width", 120)
+    print(f"\nmedian of {args.reps} runs, backend={engine.dialect.name} vs duckdb\n")
+    print(res.to_string(index=False, float_format=lambda v: f"{v:,.1f}"))
+    print(f"\nTOTAL warehouse {res['warehouse_ms'].sum():,.1f} ms | duckdb {res['duckdb_ms'].sum():,.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Date-window KPIs: SQL (one query per KPI) versus the in-memory KpiCube
+(reports/cube.py) built once from the loaded warehouse.
+
+Usage:
+    python benchmarks/bench_cube.py --reps 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from DB.engine import get_engine
+from DB.queries import KPI_QUERIES, window_params
+from reports.cube import KpiCube
+
+
+def _time(fn, reps):
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--reps", type=int, default=20)
+    ap.add_argument("--windows", nargs="+", default=["2000-01-01:2010-01-01", "2010-01-01:2020-01-01", ":"],
+                    help="ventanas start:end (vacío = sin límite)")
+    args = ap.parse_args()
+
+    engine = get_engine()
+    t0 = time.perf_counter()
+    cube = KpiCube.from_engine(engine)
+    print(f"cube build: {time.perf_counter() - t0:.2f} s, {cube.nbytes / 1e6:,.1f} MB "
+          f"({len(cube.dates)} dates x {len(cube.cells)} cells)")
+
+    names = list(cube.kpis())
+    rows = []
+    for spec in args.windows:
+        start, end = (part or None for part in spec.split(":"))
+        params = window_params(start, end)
+        sql_ms = _time(lambda: [pd.read_sql(KPI_QUERIES[n], engine, params=params) for n in names], args.reps)
+        slice_ms = _time(lambda: cube.window(start, end), args.reps * 10)
+        cube_ms = _time(lambda: cube.kpis(start, end), args.reps)
+        rows.append({"window": spec, "sql_ms": sql_ms, "cube_kpis_ms": cube_ms,
+                     "cube_slice_us": slice_ms * 1000, "speedup": sql_ms / cube_ms})
+
+    res = pd.DataFrame(rows)
+    pd.set_option("display.width", 120)
+    print(f"\n{len(names)} KPIs ({', '.join(names)}), median of {args.reps} runs, backend={engine.dialect.name}\n")
+    print(res.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
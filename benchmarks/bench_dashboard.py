@@ -0,0 +1,150 @@
+"""
+Load test of the dashboard callback (reports/dashboard.py) at warehouse scale.
+
+Builds the dashboard cube from a synthetic fact_microplastics of --rows rows
+(default 10M, realistic cardinalities), or from the loaded warehouse with
+--warehouse. It then replays --requests random selections (date window +
+region/ocean/method filters) through the real Dash endpoint
+(POST /_dash-update-component via the Flask test client). Two passes are made:
+"cold" (every selection misses the cache) and "warm" (the same selections
+again, served from the LRU cache). It reports latency percentiles and exits
+with status 1 if the cold p95 exceeds --budget-ms.
+
+Usage:
+    python benchmarks/bench_dashboard.py --rows 10000000 --requests 300
+    python benchmarks/bench_dashboard.py --warehouse
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+
+from reports.cube import CUBE_DIMS, KpiCube
+from reports.dashboard import DASHBOARD_KEYS, FILTERS, create_app, build_cube
+
+# Cardinalidades de las dimensiones sintéticas (orden de magnitud del dataset NOAA)
+CARDINALITY = {"region_id": 40, "ocean_id": 5, "method_id": 15}
+
+
+def synthetic_fact(rows: int, seed: int = 0):
+    """fact_microplastics sintético (1972-2023) y sus tablas de dimensión."""
+    rng = np.random.default_rng(seed)
+    calendar = pd.date_range("1972-01-01", "2023-12-31", freq="D")
+    calendar = (calendar.year * 10000 + calendar.month * 100 + calendar.day).to_numpy(dtype=np.float64)
+    # Más muestras en años recientes (como el dataset real)
+    day = (len(calendar) * np.sqrt(rng.random(rows))).astype(np.int64)
+    date_id = calendar[day]
+    date_id[rng.random(rows) < 0.01] = np.nan
+
+    fact = {"date_id": date_id}
+    dims = []
+    for col, table, label in [d for d in CUBE_DIMS if d[0] in DASHBOARD_KEYS]:
+        k = CARDINALITY[col]
+        weights = rng.zipf(1.5, k).astype(np.float64)
+        fact[col] = rng.choice(np.arange(1, k + 1), size=rows, p=weights / weights.sum())
+        dims.append(pd.DataFrame({col: np.arange(1, k + 1), label: [f"{label} {i}" for i in range(1, k + 1)]}))
+    measure = rng.lognormal(0, 2, rows)
+    measure[rng.random(rows) < 0.05] = np.nan
+    fact["measurement"] = measure
+    return pd.DataFrame(fact), dims
+
+
+def selections(cube: KpiCube, n: int, seed: int = 1) -> list:
+    """Selecciones aleatorias: ventana de 1 a 30 años y 0-3 miembros por filtro."""
+    rng = np.random.default_rng(seed)
+    years = np.unique(cube.dates // 10000)
+    members = {col: cube.members(col).dropna()[col].astype(int).to_numpy() for col in DASHBOARD_KEYS}
+    out = []
+    for _ in range(n):
+        y0 = int(rng.choice(years))
+        y1 = min(int(years[-1]), y0 + int(rng.integers(0, 30)))
+        m0, m1 = int(rng.integers(1, 13)), int(rng.integers(1, 13))
+        sel = {"start_date": f"{y0}-{m0:02d}-01", "end_date": f"{y1}-{m1:02d}-28"}
+        for col in DASHBOARD_KEYS:
+            k = int(rng.integers(0, 4))
+            sel[col] = sorted(int(v) for v in rng.choice(members[col], size=min(k, len(members[col])), replace=False))
+        out.append(sel)
+    return out
+
+
+def _payload(sel: dict, output: str, outputs: list) -> dict:
+    inputs = [
+        {"id": "filter-window", "property": "start_date", "value": sel["start_date"]},
+        {"id": "filter-window", "property": "end_date", "value": sel["end_date"]},
+    ] + [{"id": component_id, "property": "value", "value": sel[col] or None} for col, component_id, _ in FILTERS]
+    return {"output": output, "outputs": outputs, "inputs": inputs,
+            "changedPropIds": ["filter-window.start_date"], "state": []}
+
+
+def _replay(client, payloads) -> np.ndarray:
+    latencies = []
+    for payload in payloads:
+        t0 = time.perf_counter()
+        resp = client.post("/_dash-update-component", data=json.dumps(payload), content_type="application/json")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if resp.status_code != 200:
+            raise RuntimeError(f"callback falló ({resp.status_code}): {resp.data[:300]!r}")
+    return np.array(latencies)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--warehouse", action="store_true", help="usa el warehouse cargado en vez de datos sintéticos")
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--budget-ms", type=float, default=100.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.warehouse:
+        from DB.engine import get_engine
+        cube = build_cube(get_engine())
+        source = "warehouse"
+    else:
+        fact, dims = synthetic_fact(args.rows, args.seed)
+        print(f"synthetic fact: {len(fact):,} rows ({time.perf_counter() - t0:.1f} s)")
+        t0 = time.perf_counter()
+        cube = KpiCube.from_frame(fact, dims, keys=DASHBOARD_KEYS, grain="month")
+        del fact
+        source = f"synthetic {args.rows:,} rows"
+    print(f"cube build: {time.perf_counter() - t0:.1f} s, {cube.nbytes / 1e6:,.1f} MB "
+          f"({len(cube.dates)} dates x {len(cube.cells)} cells)")
+
+    app = create_app(cube, cache_size=max(args.requests, 1))
+    client = app.server.test_client()
+    deps = json.loads(client.get("/_dash-dependencies").data)[0]
+    outputs = [{"id": o.split(".")[0], "property": o.split(".")[1]} for o in deps["output"].strip(".").split("...")]
+    payloads = [_payload(sel, deps["output"], outputs) for sel in selections(cube, args.requests, args.seed + 1)]
+
+    # Calienta el servidor (primer request de Flask) sin contar en la medición
+    _replay(client, payloads[:1])
+    app.figures.cache_clear()
+
+    cold = _replay(client, payloads)
+    warm = _replay(client, payloads)
+    info = app.figures.cache_info()
+
+    rows = []
+    for name, lat in (("cold (cache miss)", cold), ("warm (cache hit)", warm)):
+        rows.append({"pass": name, "p50_ms": np.percentile(lat, 50), "p95_ms": np.percentile(lat, 95),
+                     "p99_ms": np.percentile(lat, 99), "max_ms": lat.max()})
+    pd.set_option("display.width", 120)
+    print(f"\n{args.requests} callbacks over /_dash-update-component, {source}; cache {info}\n")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+    p95 = np.percentile(cold, 95)
+    if p95 > args.budget_ms:
+        print(f"\nFAIL: cold p95 {p95:.1f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+    print(f"\nOK: cold p95 {p95:.1f} ms <= {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+CSV parse throughput: pandas C parser vs pyarrow multithreaded reader
+(extract(..., reader="pyarrow")) on 1x / 10x / 50x copies of the input.
+
+Usage:
+    python benchmarks/bench_extract.py --input data/MarineMicroplastics.csv --scales 1 10 50
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from ETL.extract import extract
+
+
+def _replicate(src: str, factor: int, out_dir: str) -> str:
+    """Archivo con el cuerpo de `src` repetido `factor` veces (una sola cabecera)."""
+    out = os.path.join(out_dir, f"x{factor}_{os.path.basename(src)}")
+    with open(src, "rb") as f:
+        header = f.readline()
+        body = f.read()
+    if not body.endswith(b"\n"):
+        body += b"\n"
+    with open(out, "wb") as f:
+        f.write(header)
+        for _ in range(factor):
+            f.write(body)
+    return out
+
+
+def _time(fn, reps):
+    samples = []
+    rows = 0
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        rows = len(fn())
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input", default="data/MarineMicroplastics.csv")
+    ap.add_argument("--scales", type=int, nargs="+", default=[1, 10, 50])
+    ap.add_argument("--reps", type=int, default=3)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ods14_extract_")
+    rows = []
+    try:
+        for factor in args.scales:
+            path = _replicate(args.input, factor, tmp)
+            size_mb = os.path.getsize(path) / 1e6
+            for reader in ("pandas", "pyarrow"):
+                secs, n = _time(lambda: extract(path, reader=reader, tag_source=False), args.reps)
+                rows.append({"scale": f"{factor}x", "reader": reader, "rows": n, "MB": size_mb,
+                             "seconds": secs, "MB/s": size_mb / secs, "rows/s": n / secs})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    res = pd.DataFrame(rows)
+    base = res[res["reader"] == "pandas"].set_index("scale")["seconds"]
+    res["speedup"] = res.apply(lambda r: base[r["scale"]] / r["seconds"], axis=1)
+    pd.set_option("display.width", 120)
+    print(f"\nmedian of {args.reps} runs, {os.cpu_count()} CPUs\n")
+    print(res.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
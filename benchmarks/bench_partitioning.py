@@ -0,0 +1,130 @@
+"""
+Year-partitioned fact_microplastics vs the current unpartitioned layout (MySQL).
+
+Copies the loaded warehouse (ODS14_DB_NAME, default ods14) into two scratch
+databases, one with each layout, optionally multiplying the fact rows with
+--scale. It then times:
+  - the date-windowed KPIs (one-year window and full range)
+  - reloading one year: DELETE + INSERT vs EXCHANGE PARTITION
+
+Usage:
+    python benchmarks/bench_partitioning.py --year 2015 --scale 10 --reps 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+from sqlalchemy import text
+
+from DB.create_db import STAR_TABLES, create_database
+from DB.engine import get_engine, load_config
+from DB.partitions import reload_year
+from DB.queries import KPI_QUERIES, window_params
+from ETL.load import LOAD_ORDER
+
+FLAT_DB = "ods14_bench_flat"
+PART_DB = "ods14_bench_part"
+
+WINDOWED = [name for name, q in KPI_QUERIES.items() if ":start_date_id" in q.text]
+
+
+def _copy_warehouse(src: str, dst: str, scale: int):
+    engine = get_engine(dst)
+    with engine.begin() as conn:
+        conn.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+        for table in STAR_TABLES:
+            if table == "fact_microplastics":
+                cols = ("location_id, region_id, ocean_id, marine_setting_id, method_id, unit_id, "
+                        "concentration_id, date_id, organization_id, depth_band_id, measurement, water_sample_depth")
+                for _ in range(scale):
+                    conn.execute(text(f"INSERT INTO {dst}.{table} ({cols}) SELECT {cols} FROM {src}.{table}"))
+            else:
+                conn.execute(text(f"INSERT INTO {dst}.{table} SELECT * FROM {src}.{table}"))
+        conn.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+        conn.execute(text(f"ANALYZE TABLE {dst}.fact_microplastics"))
+
+
+def _time_query(engine, query, params, reps):
+    pd.read_sql(query, engine, params=params)  # warm-up
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        pd.read_sql(query, engine, params=params)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def _reload_flat(engine, year, rows):
+    from ETL.load import _write
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM fact_microplastics WHERE date_id >= :lo AND date_id < :hi"),
+                     {"lo": year * 10000, "hi": (year + 1) * 10000})
+        _write(conn, rows, "fact_microplastics", typed=True)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--year", type=int, required=True, help="year used for the window and the reload")
+    ap.add_argument("--scale", type=int, default=1, help="copy the fact rows N times")
+    ap.add_argument("--reps", type=int, default=5)
+    args = ap.parse_args()
+
+    cfg = load_config()
+    if cfg["backend"] != "mysql":
+        sys.exit("Partitioning benchmark requires ODS14_DB_BACKEND=mysql")
+    src = cfg["database"]
+
+    years = pd.read_sql("SELECT DISTINCT year FROM dim_date WHERE year IS NOT NULL", get_engine(src))["year"]
+    create_database(FLAT_DB)
+    create_database(PART_DB, partitioned=True, years=years.astype(int))
+    for db in (FLAT_DB, PART_DB):
+        t0 = time.perf_counter()
+        _copy_warehouse(src, db, args.scale)
+        print(f"copied {src} -> {db} (x{args.scale}) in {time.perf_counter() - t0:.1f} s")
+
+    flat, part = get_engine(FLAT_DB), get_engine(PART_DB)
+    windows = {
+        f"{args.year}": window_params(f"{args.year}-01-01", f"{args.year + 1}-01-01"),
+        "all": window_params(None, None),
+    }
+    rows = []
+    for label, params in windows.items():
+        for name in WINDOWED:
+            q = KPI_QUERIES[name]
+            f_ms = _time_query(flat, q, params, args.reps)
+            p_ms = _time_query(part, q, params, args.reps)
+            rows.append({"window": label, "query": name, "flat_ms": f_ms, "partitioned_ms": p_ms,
+                         "speedup": f_ms / p_ms if p_ms else float("nan")})
+    res = pd.DataFrame(rows)
+    pd.set_option("display.width", 120)
+    print(f"\nmedian of {args.reps} runs\n")
+    print(res.to_string(index=False, float_format=lambda v: f"{v:,.1f}"))
+
+    # Recarga de un año con las filas actuales de ese año
+    year_rows = pd.read_sql(
+        text("SELECT location_id, region_id, ocean_id, marine_setting_id, method_id, unit_id, "
+             "concentration_id, date_id, organization_id, depth_band_id, measurement, water_sample_depth "
+             "FROM fact_microplastics WHERE date_id >= :lo AND date_id < :hi"),
+        flat, params={"lo": args.year * 10000, "hi": (args.year + 1) * 10000},
+    )
+    # Las dimensiones del warehouse como "salida de transform": el mapeo de claves deja los ids iguales
+    year_dfs = {key: pd.read_sql(text(f"SELECT * FROM {table}"), flat) for key, table in LOAD_ORDER
+                if not key.startswith("fact_")}
+    year_dfs.update(fact_micro=year_rows, fact_species=pd.DataFrame(columns=["location_id"]))
+    t_flat = _reload_flat(flat, args.year, year_rows)
+    t0 = time.perf_counter()
+    reload_year(part, args.year, year_dfs, typed=True)
+    t_part = time.perf_counter() - t0
+    print(f"\nreload year {args.year} ({len(year_rows)} rows): "
+          f"DELETE+INSERT {t_flat:.2f} s | EXCHANGE PARTITION {t_part:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
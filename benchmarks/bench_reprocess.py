@@ -0,0 +1,105 @@
+"""
+Targeted reprocessing of one corrected file vs a fresh full load.
+
+Copies the inputs to a scratch directory, loads them into a scratch warehouse
+(ods14_bench_reprocess), then replaces one file with its corrected version
+and runs ETL.lineage.reprocess_file on it. It then checks the result against
+a fresh transform of the same inputs:
+  - the fresh frames are mapped to the warehouse's surrogate keys by natural
+    key (in a transaction that is rolled back); no member may be missing;
+  - DB.reconcile compares row counts and per-column checksums of every table,
+    quarantine included.
+The fresh full load is also timed, in ods14_bench_fresh. Exits with 1 if
+the reprocessed warehouse differs from the fresh load.
+
+Usage:
+    python benchmarks/bench_reprocess.py --microplastics a.csv b.csv --species species.csv \
+        --reprocess b.csv --corrected b_fixed.csv
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from DB.create_db import create_database
+from DB.engine import get_engine
+from DB.reconcile import mismatches, print_summary, reconcile
+from ETL.dedup import dedup
+from ETL.extract import extract
+from ETL.lineage import new_batch_id, reprocess_file, to_warehouse_keys
+from ETL.load import load
+from ETL.transform import transform
+from ETL.validate import validate
+
+REPROCESS_DB = "ods14_bench_reprocess"
+FRESH_DB = "ods14_bench_fresh"
+
+
+def _transform(micro, species, typed):
+    batch = new_batch_id()
+    dfs = transform(extract(micro, batch=batch), extract(species, batch=batch), typed=typed)
+    dfs, _ = dedup(dfs)
+    return dfs
+
+
+def _full_load(database, micro, species, typed):
+    t0 = time.perf_counter()
+    dfs, _ = validate(_transform(micro, species, typed))
+    create_database(database)
+    load(dfs, get_engine(database), typed=typed)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--microplastics", nargs="+", required=True)
+    ap.add_argument("--species", nargs="+", required=True)
+    ap.add_argument("--reprocess", required=True, help="archivo de entrada que se corrige")
+    ap.add_argument("--corrected", required=True, help="versión corregida de --reprocess")
+    ap.add_argument("--typed", action="store_true")
+    args = ap.parse_args()
+
+    inputs = [os.path.abspath(p) for p in args.microplastics + args.species]
+    if os.path.abspath(args.reprocess) not in inputs:
+        ap.error("--reprocess debe ser uno de los archivos de --microplastics/--species")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Copias numeradas: el archivo corregido reemplaza a su copia, no al original
+        copies = {p: os.path.join(tmp, f"{i}_{os.path.basename(p)}") for i, p in enumerate(inputs)}
+        for src, dst in copies.items():
+            shutil.copyfile(src, dst)
+        micro = [copies[os.path.abspath(p)] for p in args.microplastics]
+        species = [copies[os.path.abspath(p)] for p in args.species]
+        target = copies[os.path.abspath(args.reprocess)]
+
+        t_initial = _full_load(REPROCESS_DB, micro, species, args.typed)
+        shutil.copyfile(args.corrected, target)
+        engine = get_engine(REPROCESS_DB)
+        summary = reprocess_file(engine, target, typed=args.typed)
+        t_fresh = _full_load(FRESH_DB, micro, species, args.typed)
+
+        # Carga fresca con las claves del warehouse reprocesado
+        fresh = _transform(micro, species, args.typed)
+        with engine.connect() as conn:
+            tx = conn.begin()
+            missing = {table: n for table, n in to_warehouse_keys(conn, fresh, args.typed).items() if n}
+            tx.rollback()
+        fresh, _ = validate(fresh)
+        report = reconcile(engine, fresh, raise_on_mismatch=False)
+
+    print_summary(report)
+    print(f"\ncarga inicial {t_initial:.2f} s | reprocess {summary['seconds']:.2f} s | "
+          f"carga completa fresca {t_fresh:.2f} s")
+    problems = [f"falta {table}: {n} miembros" for table, n in missing.items()] + mismatches(report)
+    if problems:
+        print("\nEl warehouse reprocesado no coincide con una carga completa:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+    print("El warehouse reprocesado coincide con una carga completa.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Region-of-interest queries on dim_location: geohash ranges vs a full scan.
+
+Builds a scratch SQLite dim_location with --rows synthetic locations (same
+DDL index as DB/create_db.py) and times, for boxes of several sizes:
+  - bbox_filter (geohash range scans on idx_loc_geohash + exact refinement)
+  - the plain latitude/longitude predicate on the same table (full scan)
+Both must return the same rows.
+
+Usage:
+    python benchmarks/bench_spatial.py --rows 1000000 --reps 5
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from DB.spatial import bbox_filter, geohash_encode
+
+# (nombre, min_lat, min_lon, max_lat, max_lon)
+BOXES = [
+    ("bahía 1°", 36.0, -122.5, 37.0, -121.5),
+    ("costa 10°", 30.0, -125.0, 40.0, -115.0),
+    ("antimeridiano", -10.0, 170.0, 10.0, -170.0),
+    ("océano 40°", -40.0, -60.0, 0.0, -20.0),
+]
+
+
+def _build(path: str, rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    lat = np.round(rng.uniform(-80, 80, rows), 4)
+    lon = np.round(rng.uniform(-180, 180, rows), 4)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE dim_location (location_id INTEGER PRIMARY KEY, latitude REAL, "
+                 "longitude REAL, geohash VARCHAR(12))")
+    conn.executemany("INSERT INTO dim_location VALUES (?, ?, ?, ?)",
+                     zip(range(1, rows + 1), lat.tolist(), lon.tolist(), geohash_encode(lat, lon)))
+    conn.execute("CREATE INDEX idx_loc_geohash ON dim_location (geohash)")
+    conn.commit()
+    return conn
+
+
+def _time(conn, sql, params, reps):
+    found = conn.execute(sql, params).fetchall()  # warm-up
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), {r[0] for r in found}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        conn = _build(os.path.join(tmp, "spatial.sqlite"), args.rows, args.seed)
+        print(f"{args.rows:,} ubicaciones en {time.perf_counter() - t0:.1f} s\n")
+        print(f"{'bbox':16s} {'filas':>9s} {'geohash ms':>11s} {'scan ms':>9s} {'x':>6s}")
+        for name, *box in BOXES:
+            where, params = bbox_filter(*box)
+            indexed, a = _time(conn, f"SELECT l.location_id FROM dim_location l WHERE {where}", params, args.reps)
+            lon_op = "AND" if box[1] <= box[3] else "OR"
+            scan, b = _time(conn, "SELECT l.location_id FROM dim_location l WHERE l.latitude BETWEEN ? AND ? "
+                                  f"AND (l.longitude >= ? {lon_op} l.longitude <= ?)",
+                            (box[0], box[2], box[1], box[3]), args.reps)
+            if a != b:
+                raise SystemExit(f"{name}: el filtro geohash devolvió {len(a)} filas, el scan {len(b)}")
+            print(f"{name:16s} {len(a):>9,d} {indexed:>11.1f} {scan:>9.1f} {scan / indexed:>6.1f}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
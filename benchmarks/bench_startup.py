@@ -0,0 +1,88 @@
+"""
+Cold-start benchmark for ETL-only runs (cron jobs).
+
+Runs `python -X importtime -c "import main"` in fresh interpreters, parses the
+importtime trace and reports total import cost plus the slowest modules.
+Fails (exit 1) if the plotting stack leaks into the ETL import path or if the
+median cold start exceeds --max-ms.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --max-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Modules that must never be imported by an ETL-only run
+HEAVY_MODULES = ("matplotlib", "seaborn", "cartopy", "reports.visualizations")
+
+
+def _parse_line(line: str):
+    # "import time:       412 |       1530 |   pandas"  (nesting = 2 spaces per level)
+    head, cum_us, name = line.split("|")
+    self_us = head.split(":", 1)[1]
+    return name[1:].rstrip(), int(self_us), int(cum_us)
+
+
+def measure(target: str):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"'import {target}' failed:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        name, self_us, cum_us = _parse_line(line)
+        modules[name.strip()] = (self_us, cum_us)
+        # top-level imports are the ones without indentation
+        if name == name.lstrip():
+            total_us += cum_us
+    return total_us, modules
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", default="main", help="module to import (default: main)")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15, help="show the N slowest modules")
+    ap.add_argument("--max-ms", type=float, default=None, help="fail if median cold start exceeds this")
+    args = ap.parse_args()
+
+    totals = []
+    modules = {}
+    for _ in range(args.runs):
+        total_us, modules = measure(args.target)
+        totals.append(total_us / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"import {args.target}: median {median_ms:.1f} ms  "
+          f"(min {min(totals):.1f} / max {max(totals):.1f}, {args.runs} runs)")
+
+    print(f"\nTop {args.top} modules by cumulative time (last run):")
+    ranked = sorted(modules.items(), key=lambda kv: kv[1][1], reverse=True)[:args.top]
+    for name, (self_us, cum_us) in ranked:
+        print(f"  {cum_us / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {name}")
+
+    failed = False
+    leaked = sorted({m for m in modules if m.split(".")[0] in HEAVY_MODULES or m in HEAVY_MODULES})
+    if leaked:
+        print(f"\nFAIL: plotting stack imported on ETL path: {', '.join(leaked[:10])}")
+        failed = True
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"\nFAIL: median cold start {median_ms:.1f} ms > {args.max_ms:.1f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
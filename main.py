@@ -1,51 +1,277 @@
-from ETL.extract import extract
+import argparse
+import os
+from datetime import date
+
+from ETL.extract import extract, resolve_paths
 from ETL.transform import transform
 from ETL.load import load
+from ETL.validate import validate, print_summary
+from ETL import dedup as dedup_stage
+from ETL import checkpoint
+from ETL.lineage import new_batch_id
 from DB.create_db import create_database, get_engine
-from sqlalchemy import text
-from reports.visualizations import generate_all_figures
-
-def print_db_state(engine):
-    with engine.begin() as conn:
-        active_db = conn.execute(text("SELECT DATABASE();")).scalar_one()
-        print(f"\n Conectado a la BD: {active_db}\n")
-        for tbl in [
-            "dim_region","dim_location","dim_marine_setting","dim_sampling_method",
-            "dim_unit","dim_concentration_class","dim_date","dim_organization",
-            "fact_microplastics","fact_species"
-        ]:
-            cnt = conn.execute(text(f"SELECT COUNT(*) FROM {tbl};")).scalar_one()
-            print(f"{tbl:28s} -> {cnt:>8d} filas")
-
-def main():
-    # 0) Create/verify DB and tables
-    create_database()
-    engine = get_engine()
-
-    # 1) Paths
-    file_path_microplastics = 'data/MarineMicroplastics.csv'
-    file_path_species = 'data/MarineSpeciesRichness.csv'
-
-    # 2) Extract
-    df_microplastics = extract(file_path_microplastics)
-    df_species = extract(file_path_species)
-
-    # 3) Transform
-    dfs = transform(df_microplastics, df_species)
-
-    # Preview
-    for name, table in dfs.items():
-        print(f"\n{name}:")
-        print(table.head())
-
-    # 4) Load
-    load(dfs, engine)
-    print("ETL COMPLETED. DATA WAS LOADED INTO MySQL.")
-
-    # Generar visualizaciones (PNG/CSV)
-    generate_all_figures(engine, start_date=None, end_date=None, save_dir="reports/figures", also_show=False)
-    print("Figures exported to reports/figures/")
-   
+from DB import reconcile as reconcile_stage
+
+STAGES = ["extract", "transform", "dedup", "validate", "load", "report"]
+
+# Etapas cuya salida son las tablas del esquema (cada una parte de la anterior)
+TABLE_STAGES = ["transform", "dedup", "validate"]
+
+def _iso_date(value: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida '{value}', usa YYYY-MM-DD")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ODS 14 marine ETL pipeline")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="etapas a ejecutar (por defecto todas, en orden)")
+    parser.add_argument("--microplastics", nargs="+", default=["data/MarineMicroplastics.csv"],
+                        help="CSV de microplásticos: archivos, directorios o globs (.csv/.csv.gz/.csv.zst)")
+    parser.add_argument("--species", nargs="+", default=["data/MarineSpeciesRichness.csv"],
+                        help="CSV de riqueza de especies: archivos, directorios o globs")
+    parser.add_argument("--reader", choices=["pandas", "pyarrow"], default="pandas",
+                        help="lector CSV: pandas (C, un hilo) o pyarrow (multihilo, esquema predeclarado)")
+    parser.add_argument("--extract-workers", type=int, default=None,
+                        help="hilos para leer varios archivos en paralelo")
+    parser.add_argument("--start-date", type=_iso_date, default=None,
+                        help="inicio de la ventana de reportes (YYYY-MM-DD, inclusivo)")
+    parser.add_argument("--end-date", type=_iso_date, default=None,
+                        help="fin de la ventana de reportes (YYYY-MM-DD, exclusivo)")
+    parser.add_argument("--checkpoint-dir", default="checkpoints",
+                        help="directorio donde se guarda la salida de cada etapa")
+    parser.add_argument("--resume", action="store_true",
+                        help="omite las etapas ya completadas con las mismas entradas")
+    parser.add_argument("--figures-dir", default="reports/figures")
+    parser.add_argument("--analytics", choices=["warehouse", "duckdb"], default="warehouse",
+                        help="backend de los reportes: el warehouse o una copia columnar en DuckDB")
+    parser.add_argument("--analytics-path", default="reports/analytics/ods14.duckdb",
+                        help="archivo DuckDB (o directorio Parquet) del backend analítico")
+    parser.add_argument("--species-raster", default="reports/analytics/species_richness.npy",
+                        help="raster de riqueza de especies (.npy mapeado en memoria) que escribe 'transform' "
+                             "y usa 'report' para el mapa de especies")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="crea fact_microplastics particionada por año (MySQL)")
+    parser.add_argument("--reload-year", type=int, default=None,
+                        help="en 'load', recarga solo ese año vía EXCHANGE PARTITION (sin recrear la BD)")
+    parser.add_argument("--publish", action="store_true",
+                        help="en 'load', carga en tablas shadow_* y las publica con un RENAME atómico (sin recrear la BD)")
+    parser.add_argument("--rollback", action="store_true",
+                        help="vuelve a activar la generación anterior (prev_*) publicada con --publish y termina")
+    parser.add_argument("--reprocess", nargs="+", default=None, metavar="FILE",
+                        help="reemplaza en el warehouse solo los hechos de esos archivos (corregidos) y termina")
+    parser.add_argument("--reprocess-batch", default=None, metavar="BATCH",
+                        help="reprocesa todos los archivos de un lote de ingesta y termina")
+    parser.add_argument("--lineage", action="store_true",
+                        help="lista archivos de origen, rangos de filas y lotes de ingesta del warehouse y termina")
+    parser.add_argument("--typed", action="store_true",
+                        help="tipos nullable compactos en transform y NULLs desde máscaras en load")
+    parser.add_argument("--windows", nargs="+", default=None,
+                        help="en 'report', una carpeta de figuras por ventana en un solo pase: "
+                             "years, decades, all o START:END")
+    parser.add_argument("--profile", action="store_true",
+                        help="en 'report', mide cada consulta KPI, captura su plan y escribe un ranking en reports/profiling/")
+    parser.add_argument("--sample", type=float, nargs="?", const=0.05, default=None, metavar="FRACTION",
+                        help="corre sobre una muestra estratificada (región, año, método; 0.05 por defecto) "
+                             "cargada en la BD scratch <db>_sample, con checkpoints y figuras aparte")
+    parser.add_argument("--sample-seed", type=int, default=0,
+                        help="semilla de la muestra (misma semilla = misma muestra)")
+    parser.add_argument("--preview", action="store_true",
+                        help="imprime head() de cada tabla transformada")
+    args = parser.parse_args(argv)
+    if args.sample is not None and (args.publish or args.reload_year is not None or args.rollback):
+        parser.error("--sample carga siempre en la BD scratch: no se combina con --publish, --reload-year ni --rollback")
+    if args.sample is not None and (args.reprocess or args.reprocess_batch):
+        parser.error("--reprocess/--reprocess-batch cargan archivos completos: no se combinan con --sample")
+    return args
+
+def _input_fingerprint(args, manifest):
+    try:
+        paths = resolve_paths(args.microplastics) + resolve_paths(args.species)
+    except FileNotFoundError:
+        paths = []
+    if paths and all(os.path.exists(p) for p in paths):
+        return checkpoint.fingerprint(*paths)
+    # Sin archivos de entrada (p.ej. solo 'report'): se asume la corrida anterior
+    return manifest["inputs"]
+
+def _invalidate_from(manifest, stage):
+    """Al re-ejecutar una etapa, las posteriores dejan de estar al día."""
+    later = STAGES[STAGES.index(stage):]
+    manifest["completed"] = [s for s in manifest["completed"] if s not in later]
+
+def _table_source(manifest, stage):
+    """Última etapa completada anterior a `stage` que dejó tablas en checkpoint."""
+    before = [s for s in TABLE_STAGES if STAGES.index(s) < STAGES.index(stage)]
+    for source in reversed(before):
+        if source in manifest["completed"]:
+            return source
+    return "transform"
+
+def main(argv=None):
+    args = parse_args(argv)
+    ckpt_dir = args.checkpoint_dir
+    database = None
+    if args.sample is not None:
+        # Todo lo de la muestra va aparte: no pisa los checkpoints, la BD ni las figuras de la corrida completa
+        from ETL.sample import sample_database
+        from DB.engine import load_config
+        database = sample_database(load_config()["database"])
+        ckpt_dir = os.path.join(ckpt_dir, "sample")
+        args.figures_dir = os.path.join(args.figures_dir, "sample")
+        root, ext = os.path.splitext(args.analytics_path)
+        args.analytics_path = f"{root}_sample{ext}"
+        root, ext = os.path.splitext(args.species_raster)
+        args.species_raster = f"{root}_sample{ext}"
+
+    if args.rollback:
+        from DB.publish import rollback
+        rollback()
+        return
+
+    if args.lineage or args.reprocess or args.reprocess_batch:
+        from ETL import lineage
+        engine = get_engine(database)
+        if args.reprocess_batch:
+            lineage.reprocess_batch(engine, args.reprocess_batch, reader=args.reader, typed=args.typed,
+                                    raster_path=args.species_raster)
+        if args.reprocess:
+            batch = new_batch_id()
+            for path in resolve_paths(args.reprocess):
+                lineage.reprocess_file(engine, path, batch=batch, reader=args.reader, typed=args.typed,
+                                       raster_path=args.species_raster)
+        if args.lineage:
+            print(lineage.lineage_summary(engine).to_string(index=False))
+        elif args.analytics == "duckdb":
+            from DB.analytics import export_star_schema
+            export_star_schema(engine, args.analytics_path)
+        return
+
+    manifest = checkpoint.read_manifest(ckpt_dir)
+    inputs = _input_fingerprint(args, manifest)
+    if args.sample is not None:
+        inputs = {**inputs, "sample": [args.sample, args.sample_seed]}
+    if manifest["inputs"] != inputs:
+        if manifest["completed"]:
+            print("Las entradas cambiaron: se descartan los checkpoints anteriores.")
+        manifest = checkpoint.reset(ckpt_dir, inputs)
+
+    stages = [s for s in STAGES if s in args.stages]
+    if args.resume:
+        skipped = [s for s in stages if s in manifest["completed"]]
+        stages = [s for s in stages if s not in manifest["completed"]]
+        if skipped:
+            print(f"Reanudando: se omiten {', '.join(skipped)} (checkpoint en {ckpt_dir}/)")
+    if not stages:
+        print("Nada que hacer: todas las etapas pedidas ya están completadas.")
+        return
+
+    raw = dfs = None
+    for stage in stages:
+        _invalidate_from(manifest, stage)
+
+        if stage == "extract":
+            # Un lote de ingesta por corrida: queda en cada fila de hecho (ETL/lineage.py)
+            batch = new_batch_id()
+            raw = {
+                "microplastics": extract(args.microplastics, workers=args.extract_workers, reader=args.reader,
+                                         batch=batch),
+                "species": extract(args.species, workers=args.extract_workers, reader=args.reader, batch=batch),
+            }
+            if args.sample is not None:
+                from ETL.sample import sample_raw
+                raw = sample_raw(raw, args.sample, seed=args.sample_seed)
+            checkpoint.save_stage(ckpt_dir, manifest, stage, raw)
+
+        elif stage == "transform":
+            if raw is None:
+                raw = checkpoint.load_stage(ckpt_dir, "extract")
+            dfs = transform(raw["microplastics"], raw["species"], typed=args.typed)
+            # La grilla de especies se guarda una vez como raster para los cruces por coordenadas
+            from ETL.raster import build_raster
+            try:
+                build_raster(raw["species"], args.species_raster)
+            except ValueError as e:
+                print(f"Raster de especies no generado ({e}); el mapa usará el JOIN por coordenadas.")
+            if args.preview:
+                for name, table in dfs.items():
+                    print(f"\n{name}:")
+                    print(table.head())
+            checkpoint.save_stage(ckpt_dir, manifest, stage, dfs)
+
+        elif stage == "dedup":
+            if dfs is None:
+                dfs = checkpoint.load_stage(ckpt_dir, _table_source(manifest, stage))
+            dfs, summary = dedup_stage.dedup(dfs)
+            dedup_stage.print_summary(summary)
+            os.makedirs(ckpt_dir, exist_ok=True)
+            summary.to_csv(os.path.join(ckpt_dir, "dedup_summary.csv"), index=False)
+            checkpoint.save_stage(ckpt_dir, manifest, stage, dfs)
+
+        elif stage == "validate":
+            if dfs is None:
+                dfs = checkpoint.load_stage(ckpt_dir, _table_source(manifest, stage))
+            dfs, summary = validate(dfs)
+            print_summary(summary)
+            os.makedirs(ckpt_dir, exist_ok=True)
+            summary.to_csv(os.path.join(ckpt_dir, "validation_summary.csv"), index=False)
+            checkpoint.save_stage(ckpt_dir, manifest, stage, dfs)
+
+        elif stage == "load":
+            if dfs is None:
+                # Salida validada si existe; si no, la deduplicada o la de transform
+                dfs = checkpoint.load_stage(ckpt_dir, _table_source(manifest, stage))
+            if args.reload_year is not None:
+                from DB.partitions import reload_year
+                reload_year(get_engine(), args.reload_year, dfs, typed=args.typed)
+            elif args.publish:
+                from DB.publish import publish
+                years = dfs["dim_date"]["year"].dropna().astype(int).unique() if args.partitioned else None
+                publish(dfs, typed=args.typed, partitioned=args.partitioned, years=years)
+            else:
+                # Create/verify DB and tables
+                years = dfs["dim_date"]["year"].dropna().astype(int).unique() if args.partitioned else None
+                create_database(database, partitioned=args.partitioned, years=years)
+                load(dfs, get_engine(database), typed=args.typed)
+                # Conteos y checksums por columna contra el warehouse en una consulta; falla si difieren
+                report = reconcile_stage.reconcile(get_engine(database), dfs, raise_on_mismatch=False)
+                reconcile_stage.print_summary(report)
+                os.makedirs(ckpt_dir, exist_ok=True)
+                report.to_csv(os.path.join(ckpt_dir, "reconcile_summary.csv"), index=False)
+                reconcile_stage.check(report)
+            print("ETL COMPLETED. DATA WAS LOADED INTO THE WAREHOUSE.")
+            if args.analytics == "duckdb":
+                from DB.analytics import export_star_schema
+                export_star_schema(get_engine(database), args.analytics_path)
+            checkpoint.save_stage(ckpt_dir, manifest, stage)
+
+        elif stage == "report":
+            # Import diferido: matplotlib/seaborn/cartopy solo se cargan cuando se reporta
+            from reports.visualizations import generate_all_figures
+            profiler = None
+            if args.profile:
+                from DB.profiling import QueryProfiler
+                profiler = QueryProfiler()
+            raster = None
+            if os.path.exists(args.species_raster):
+                from ETL.raster import open_raster
+                raster = open_raster(args.species_raster)
+            if args.windows:
+                from reports.batch import generate_batch_figures
+                generate_batch_figures(get_engine(database), args.windows, save_dir=args.figures_dir,
+                                       backend=args.analytics, analytics_path=args.analytics_path,
+                                       profiler=profiler, raster=raster)
+            else:
+                generate_all_figures(get_engine(database), start_date=args.start_date, end_date=args.end_date,
+                                     save_dir=args.figures_dir, also_show=False,
+                                     backend=args.analytics, analytics_path=args.analytics_path,
+                                     profiler=profiler, raster=raster)
+            if profiler is not None:
+                profiler.finish()
+            print(f"Figures exported to {args.figures_dir}/")
+            checkpoint.save_stage(ckpt_dir, manifest, stage)
+
 
 if __name__ == '__main__':
     main()
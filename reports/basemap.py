@@ -0,0 +1,160 @@
+# reports/basemap.py
+"""
+Cached, pre-projected base layer for the cartopy maps.
+
+`ax.coastlines()`, `cfeature.LAND` and `cfeature.OCEAN` read the Natural
+Earth shapefiles and re-project every geometry on each figure. That is most
+of the render time of `plot_species_micro_map`, and it fails on hosts
+without the shapefiles and without network access. `draw_basemap` instead:
+
+  1. looks up a PNG of the projected base layer (land, ocean, coastlines)
+     keyed by projection, extent, dpi and width: in memory, then in the cache
+     directory;
+  2. on a miss, renders it once from Natural Earth and saves it;
+  3. if Natural Earth is not available either (offline host, empty cache),
+     falls back to cartopy's bundled stock image, which needs no download.
+
+A hit costs one imshow in the axes' own projection, with no reprojection.
+Map figures then only draw the data layers on top.
+
+The cache lives in reports/analytics/basemap/, or in $ODS14_BASEMAP_DIR.
+Pre-build it on a host with network access and copy the directory to offline
+hosts:
+
+    python -m reports.basemap --build
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+DEFAULT_DIR = os.environ.get("ODS14_BASEMAP_DIR", "reports/analytics/basemap")
+
+LAND_COLOR = "#f0f0f0"
+OCEAN_COLOR = "#a6cee3"
+COAST_WIDTH = 0.8
+
+# Mapas que generan los reportes: (proyección, extent, dpi, ancho en pulgadas); None = global
+DEFAULT_LAYERS = [("PlateCarree", None, 140, 16)]
+
+# Capas ya leídas en este proceso: clave -> imagen RGBA
+_MEMORY = {}
+_WARNED = set()
+
+
+def _projection(projection):
+    import cartopy.crs as ccrs
+
+    return getattr(ccrs, projection)() if isinstance(projection, str) else projection
+
+
+def _extent(projection, extent=None) -> tuple:
+    """Extent en coordenadas de la proyección (None = el dominio global)."""
+    if extent is None:
+        (x0, x1), (y0, y1) = projection.x_limits, projection.y_limits
+        return float(x0), float(x1), float(y0), float(y1)
+    return tuple(float(v) for v in extent)
+
+
+def basemap_key(projection, extent, dpi: int, width: float) -> str:
+    """Clave de caché: proyección (proj4), extent proyectado, dpi y ancho."""
+    spec = {"proj": projection.proj4_init, "extent": [round(v, 3) for v in extent], "dpi": dpi, "width": width}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def render_basemap(projection, extent, dpi: int, width: float) -> np.ndarray:
+    """
+    Dibuja tierra, océano y costas (Natural Earth) en un lienzo que ocupa
+    exactamente `extent` y devuelve la imagen RGBA. Lanza OSError si los
+    shapefiles no están y no se pueden descargar.
+    """
+    import matplotlib.pyplot as plt
+    import cartopy.feature as cfeature
+
+    x0, x1, y0, y1 = extent
+    fig = plt.figure(figsize=(width, width * (y1 - y0) / (x1 - x0)), dpi=dpi)
+    try:
+        # Ejes sin marco que llenan la figura: cada pixel cae dentro del extent
+        ax = fig.add_axes([0, 0, 1, 1], projection=projection)
+        ax.set_extent(extent, crs=projection)
+        ax.spines["geo"].set_visible(False)
+        ax.add_feature(cfeature.OCEAN, facecolor=OCEAN_COLOR)
+        ax.add_feature(cfeature.LAND, facecolor=LAND_COLOR)
+        ax.coastlines(linewidth=COAST_WIDTH)
+        fig.canvas.draw()
+        return np.asarray(fig.canvas.buffer_rgba()).copy()
+    finally:
+        plt.close(fig)
+
+
+def get_basemap(projection="PlateCarree", extent=None, dpi: int = 140, width: float = 16,
+                cache_dir: str = DEFAULT_DIR):
+    """
+    (imagen RGBA, extent) de la capa base, desde la caché o dibujada y
+    guardada una vez. None si no hay caché ni Natural Earth (sin red).
+    """
+    import matplotlib.image as mpimg
+
+    projection = _projection(projection)
+    extent = _extent(projection, extent)
+    key = basemap_key(projection, extent, dpi, width)
+    if key in _MEMORY:
+        return _MEMORY[key], extent
+
+    path = os.path.join(cache_dir, f"{key}.png") if cache_dir else None
+    if path and os.path.exists(path):
+        img = mpimg.imread(path)
+    else:
+        try:
+            img = render_basemap(projection, extent, dpi, width)
+        except OSError as e:
+            # Sin shapefiles y sin red (URLError es un OSError)
+            if key not in _WARNED:
+                _WARNED.add(key)
+                print(f"Capa base no disponible ({e}); se usa la imagen incluida en cartopy.")
+            return None
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            mpimg.imsave(path + ".tmp.png", img)
+            os.replace(path + ".tmp.png", path)
+            with open(os.path.join(cache_dir, f"{key}.json"), "w", encoding="utf-8") as f:
+                json.dump({"proj": projection.proj4_init, "extent": extent, "dpi": dpi, "width": width}, f, indent=2)
+    _MEMORY[key] = img
+    return img, extent
+
+
+def draw_basemap(ax, dpi: int = 140, width: float = 16, cache_dir: str = DEFAULT_DIR) -> bool:
+    """
+    Dibuja la capa base en `ax` (un GeoAxes con su extent ya fijado). True
+    si salió de la caché o de Natural Earth; False si se usó la imagen
+    incluida en cartopy.
+    """
+    extent = ax.get_extent(crs=ax.projection)
+    found = get_basemap(ax.projection, extent, dpi, width, cache_dir)
+    if found is None:
+        ax.stock_img()
+        return False
+    img, extent = found
+    ax.imshow(img, origin="upper", extent=extent, transform=ax.projection, zorder=0, interpolation="bilinear")
+    return True
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pre-genera la caché de capas base de los mapas")
+    ap.add_argument("--build", action="store_true", help="dibuja y guarda las capas de los mapas de los reportes")
+    ap.add_argument("--cache-dir", default=DEFAULT_DIR)
+    args = ap.parse_args(argv)
+
+    if not args.build:
+        ap.print_help()
+        return
+    for projection, extent, dpi, width in DEFAULT_LAYERS:
+        if get_basemap(projection, extent, dpi, width, args.cache_dir) is None:
+            raise SystemExit("No se pudo dibujar la capa base: hacen falta los shapefiles de Natural Earth o red.")
+        print(f"Capa base {projection} ({dpi} dpi, {width} in) en {args.cache_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# reports/batch.py
+"""
+Batch report: the KPI figures for many date windows in one pass.
+
+Calling `generate_all_figures` once per window re-runs all 17 KPI queries
+each time. `generate_batch_figures` instead runs a handful of queries for
+the whole batch:
+
+  - one scan of fact_microplastics into a KpiCube (reports/cube.py), which
+    answers the 13 date-windowed KPIs for any window from prefix sums
+  - the KPIs that do not depend on the window (map, NTILE critical zones,
+    method x depth heatmap), run once and shared by every window
+  - the (region, class) averages behind conc_matrix, run once; each window
+    only picks its top-20 regions by sample count from the cube
+  - the region quantile sketches, read once and merged per window in memory
+
+Each window is rendered into its own directory under `save_dir`
+(e.g. reports/figures/2015/, reports/figures/2010s/). The window-independent
+figures are drawn once and copied into the other directories.
+"""
+import os
+import shutil
+
+from DB.queries import KPI_QUERIES, CONC_CLASS_BY_REGION_ALL, window_params
+from reports.cube import KpiCube
+
+# KPIs que no filtran por fecha: una consulta sirve para todas las ventanas
+WINDOW_FREE = ["species_micro_map", "critical_highhigh", "critical_lowhigh", "methods_by_depth"]
+
+
+def parse_windows(specs, first_year: int, last_year: int) -> list:
+    """
+    Ventanas [start, end) a partir de especificaciones:
+      "years"   -> una por año entre first_year y last_year
+      "decades" -> una por década
+      "all"     -> sin ventana
+      "YYYY-MM-DD:YYYY-MM-DD" -> ventana explícita (un extremo vacío = sin límite)
+    """
+    windows = []
+    for spec in specs:
+        if isinstance(spec, tuple):
+            windows.append(spec)
+        elif spec == "years":
+            windows += [(f"{y}-01-01", f"{y + 1}-01-01") for y in range(first_year, last_year + 1)]
+        elif spec == "decades":
+            windows += [(f"{d}-01-01", f"{d + 10}-01-01") for d in range(first_year // 10 * 10, last_year + 1, 10)]
+        elif spec == "all":
+            windows.append((None, None))
+        elif ":" in spec:
+            start, end = (part or None for part in spec.split(":", 1))
+            windows.append((start, end))
+        else:
+            raise ValueError(f"ventana inválida '{spec}': usa years, decades, all o START:END")
+    # Sin duplicados, conservando el orden
+    return list(dict.fromkeys(windows))
+
+
+def window_label(start=None, end=None) -> str:
+    """Nombre del directorio de una ventana: 2015, 2010s, all o <inicio>_<fin>."""
+    if start is None and end is None:
+        return "all"
+    if start and end and start[4:] == "-01-01" and end[4:] == "-01-01":
+        years = int(end[:4]) - int(start[:4])
+        if years == 1:
+            return start[:4]
+        if years == 10 and int(start[:4]) % 10 == 0:
+            return f"{start[:4]}s"
+    return f"{start or 'inicio'}_{end or 'fin'}"
+
+
+def _conc_matrix(cube: KpiCube, region_class, start=None, end=None, top: int = 20):
+    """CONC_CLASS_BY_REGION_TOP10 de la ventana: las `top` regiones con más muestras en ella."""
+    counts = cube.by("region_id", start, end)
+    counts = counts[counts["region"].notna()].sort_values("n_samples", ascending=False, kind="stable")
+    regions = set(counts["region"].head(top))
+    return region_class[region_class["region"].isin(regions)].reset_index(drop=True)
+
+
+def batch_kpis(engine, windows, warehouse=None, cube: KpiCube = None, max_workers=None, profiler=None,
+               raster=None) -> dict:
+    """
+    {etiqueta de ventana: {kpi: DataFrame}} para todas las ventanas, con las
+    mismas claves y columnas que generate_all_figures. `windows` es una lista
+    de (start, end). `warehouse` es el engine con los sketches (por defecto
+    `engine`). `raster` como en generate_all_figures.
+    """
+    from DB.sketches import sketch_rows, sketch_quantiles
+    from reports.visualizations import fetch_kpis, paired_observations
+
+    warehouse = warehouse if warehouse is not None else engine
+    if cube is None:
+        # Con todas las ventanas en límites de mes basta el cubo mensual (~30 veces más chico)
+        bounds = [b for w in windows for b in w if b is not None]
+        grain = "month" if all(str(b)[8:10] == "01" for b in bounds) else "day"
+        cube = KpiCube.from_engine(engine, grain=grain)
+
+    free = [name for name in WINDOW_FREE if raster is None or name != "species_micro_map"]
+    shared = fetch_kpis(
+        engine, window_params(),
+        {**{name: KPI_QUERIES[name] for name in free}, "conc_region_class": CONC_CLASS_BY_REGION_ALL},
+        max_workers=max_workers, profiler=profiler,
+    )
+    if raster is not None:
+        shared["species_micro_map"] = paired_observations(engine, raster, profiler)
+    region_class = shared.pop("conc_region_class")
+    rows = sketch_rows(warehouse, "region")
+
+    out = {}
+    for start, end in windows:
+        dfs = cube.kpis(start, end)
+        dfs["conc_matrix"] = _conc_matrix(cube, region_class, start, end)
+        dfs.update(shared)
+        dfs = {name: dfs[name] for name in KPI_QUERIES}
+        dfs["region_distribution"] = sketch_quantiles(warehouse, "region", start, end, rows=rows)
+        out[window_label(start, end)] = dfs
+    return out
+
+
+def generate_batch_figures(engine, windows, save_dir="reports/figures", backend="warehouse", analytics_path=None,
+                           max_workers=None, profiler=None, raster=None) -> dict:
+    """
+    Figuras de cada ventana en <save_dir>/<etiqueta>/. `windows` son
+    especificaciones de parse_windows (p.ej. ["years", "decades"]) o tuplas
+    (start, end). backend/analytics_path/raster como en generate_all_figures.
+    """
+    from reports.visualizations import FIGURES
+
+    warehouse = engine
+    store = None
+    if backend == "duckdb":
+        from DB.analytics import DuckDBStore, DEFAULT_PATH
+        engine = store = DuckDBStore(analytics_path or DEFAULT_PATH)
+    elif backend != "warehouse":
+        raise ValueError(f"backend desconocido: {backend}")
+
+    try:
+        # El rango de años sale del cubo: se construye antes de resolver las ventanas
+        specs = list(windows)
+        cube = None
+        if any(not isinstance(spec, tuple) and spec in ("years", "decades") for spec in specs):
+            cube = KpiCube.from_engine(engine, grain="month")
+            years = cube.dates // 10000
+            windows = parse_windows(specs, int(years.min()), int(years.max())) if len(years) else []
+        else:
+            windows = parse_windows(specs, 0, -1)
+        if cube is not None and any(b is not None and str(b)[8:10] != "01" for w in windows for b in w):
+            cube = None  # alguna ventana corta a mitad de mes: hace falta el cubo diario
+
+        results = batch_kpis(engine, windows, warehouse, cube, max_workers=max_workers, profiler=profiler,
+                             raster=raster)
+    finally:
+        # El DuckDBStore abierto aquí: no dejar el archivo analítico tomado
+        if store is not None:
+            store.close()
+    first_dir = None
+    for label, dfs in results.items():
+        out_dir = os.path.join(save_dir, label)
+        os.makedirs(out_dir, exist_ok=True)
+        for key, plot_fn, filename in FIGURES:
+            path = os.path.join(out_dir, filename)
+            if key in WINDOW_FREE and first_dir is not None:
+                # Igual en todas las ventanas: se copia la figura ya dibujada
+                if os.path.exists(os.path.join(first_dir, filename)):
+                    shutil.copyfile(os.path.join(first_dir, filename), path)
+                continue
+            plot_fn(dfs[key], path)
+        first_dir = first_dir or out_dir
+    print(f"{len(results)} ventanas exportadas a {save_dir}/ ({', '.join(results)})")
+    return results
@@ -0,0 +1,326 @@
+# reports/correlation.py
+"""
+Biodiversity vs. pollution: correlation and regression of species count
+against microplastics measurement, per region and per ocean.
+
+The paired observations are the microplastics samples with the species count
+of their location. They come from the species raster (ETL/raster.py,
+nearest grid cell) when one is given, or from PAIRED_OBSERVATIONS (exact
+coordinate match) otherwise. All groups are computed at once with
+np.bincount over group codes, so the cost is a few passes over the pairs
+whatever the number of regions:
+
+  - Pearson r, OLS fit species_count = intercept + slope * x and R²,
+    where x = log1p(measurement) by default (measurements are heavy-tailed)
+  - Spearman rho: Pearson on the average ranks within each group (one
+    lexsort)
+
+Confidence intervals come from a percentile bootstrap that resamples pairs
+within each group. Replicates are split into fixed chunks with their own
+seeds and run across a process pool, so the result does not depend on the
+number of workers.
+
+Results are cached on disk per load generation: a fingerprint of the facts
+(row counts and checksums in one statement) plus the raster file and the
+parameters. Any load, publish, rollback or reprocess that changes the facts
+starts a new cache entry.
+
+Run:
+    python -m reports.correlation --by region ocean --boot 1000 --workers 8
+
+benchmarks/bench_correlation.py times it at millions of pairs.
+"""
+import argparse
+import hashlib
+import json
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+DEFAULT_CACHE_DIR = "reports/analytics/correlation"
+
+# Agrupaciones disponibles (columna de los pares; "all" = un solo grupo global)
+GROUPINGS = ("region", "ocean", "all")
+
+# Réplicas por tarea del pool: fijo, para que el resultado no dependa de los workers
+CHUNK = 25
+
+# Mínimo de pares para informar una correlación
+MIN_PAIRS = 3
+
+# Huella de la generación cargada: conteos y sumas de control de hechos y dimensiones
+GENERATION_SQL = text("""
+SELECT
+  (SELECT COUNT(*) FROM fact_microplastics) AS n_micro,
+  (SELECT SUM(measurement) FROM fact_microplastics) AS sum_measurement,
+  (SELECT SUM(location_id) FROM fact_microplastics) AS sum_micro_location,
+  (SELECT SUM(COALESCE(region_id, 0) + COALESCE(ocean_id, 0)) FROM fact_microplastics) AS sum_groups,
+  (SELECT COUNT(*) FROM fact_species) AS n_species,
+  (SELECT SUM(species_count) FROM fact_species) AS sum_species,
+  (SELECT COUNT(*) FROM dim_location) AS n_location,
+  (SELECT COUNT(*) FROM dim_region) AS n_region,
+  (SELECT COUNT(*) FROM dim_ocean) AS n_ocean
+""")
+
+
+# ---------------------------
+# Estadísticos agrupados (vectorizados)
+# ---------------------------
+def group_stats(x: np.ndarray, y: np.ndarray, codes: np.ndarray, n_groups: int) -> dict:
+    """
+    n, Pearson r, pendiente, intercepto y R² de y ~ x en cada grupo, con
+    np.bincount (centrando por grupo para no perder precisión). NaN en los
+    grupos con menos de MIN_PAIRS pares o varianza nula.
+    """
+    n = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = np.bincount(codes, weights=x, minlength=n_groups) / n
+        my = np.bincount(codes, weights=y, minlength=n_groups) / n
+        dx, dy = x - mx[codes], y - my[codes]
+        sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+        syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+        sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+        r = sxy / np.sqrt(sxx * syy)
+        slope = sxy / sxx
+    small = n < MIN_PAIRS
+    r[small | ~np.isfinite(r)] = np.nan
+    slope[small | ~np.isfinite(slope)] = np.nan
+    return {"n": n.astype(np.int64), "pearson": r, "slope": slope, "intercept": my - slope * mx, "r2": r * r}
+
+
+def _sort_within(values: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Permutación que ordena por (grupo, valor): argsort de los valores y luego uno estable por grupo."""
+    # El primero no necesita ser estable: los empates se promedian después
+    order = np.argsort(values)
+    # Con códigos de 16 bits el argsort estable es un radix sort (lineal)
+    keys = codes.astype(np.int16) if codes.max(initial=0) < 2 ** 15 else codes
+    return order[np.argsort(keys[order], kind="stable")]
+
+
+def _tie_runs(values: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Corrida de empates (mismo grupo y valor) de cada posición de datos ya ordenados; numeradas en orden."""
+    new = np.ones(len(values), dtype=bool)
+    new[1:] = (codes[1:] != codes[:-1]) | (values[1:] != values[:-1])
+    return np.cumsum(new) - 1
+
+
+def _run_ranks(run: np.ndarray, before_group: np.ndarray, n_runs: int) -> np.ndarray:
+    """
+    Rango promedio dentro del grupo a partir de la corrida de empates de cada
+    fila: filas en corridas anteriores, menos las de grupos anteriores
+    (`before_group`), más el promedio de la corrida. Lineal: solo bincount.
+    """
+    count = np.bincount(run, minlength=n_runs)
+    before = np.cumsum(count) - count
+    return before[run] - before_group + (count[run] + 1) / 2
+
+
+def _group_start(codes: np.ndarray, n_groups: int) -> np.ndarray:
+    size = np.bincount(codes, minlength=n_groups)
+    return np.concatenate(([0], np.cumsum(size)[:-1]))
+
+
+def group_ranks(values: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Rango promedio (1..n, empates promediados) de cada valor dentro de su grupo."""
+    if not len(values):
+        return np.empty(0)
+    order = _sort_within(values, codes)
+    run = np.empty(len(order), dtype=np.int64)
+    run[order] = _tie_runs(values[order], codes[order])
+    n_groups = int(codes.max()) + 1
+    return _run_ranks(run, _group_start(codes, n_groups)[codes], int(run.max()) + 1)
+
+
+def _spearman(x, y, codes, n_groups) -> np.ndarray:
+    return group_stats(group_ranks(x, codes), group_ranks(y, codes), codes, n_groups)["pearson"]
+
+
+# ---------------------------
+# Bootstrap en un pool de procesos
+# ---------------------------
+_DATA = {}
+
+
+def _init_worker(data: dict):
+    # Cada worker recibe los pares una sola vez (no en cada tarea)
+    _DATA.update(data)
+
+
+def _bootstrap_chunk(seed, reps: int) -> np.ndarray:
+    """(reps, 3, grupos): pearson, spearman y pendiente de `reps` remuestreos por grupo."""
+    x, y, codes, n_groups = _DATA["x"], _DATA["y"], _DATA["codes"], _DATA["n_groups"]
+    run_x, run_y = _DATA["run_x"], _DATA["run_y"]
+    n_run_x, n_run_y = int(run_x.max()) + 1, int(run_y.max()) + 1
+    rng = np.random.default_rng(seed)
+    # Los pares vienen ordenados por (grupo, x): cada fila sortea una posición de su grupo
+    base = _group_start(codes, n_groups)[codes]
+    width = np.bincount(codes, minlength=n_groups)[codes]
+    out = np.empty((reps, 3, n_groups))
+    for b in range(reps):
+        idx = base + (rng.random(len(codes)) * width).astype(np.int64)
+        stats = group_stats(x[idx], y[idx], codes, n_groups)
+        out[b, 0], out[b, 2] = stats["pearson"], stats["slope"]
+        # Rangos del remuestreo sin reordenar: las corridas de empates ya están numeradas en orden
+        rx = _run_ranks(run_x[idx], base, n_run_x)
+        ry = _run_ranks(run_y[idx], base, n_run_y)
+        out[b, 1] = group_stats(rx, ry, codes, n_groups)["pearson"]
+    return out
+
+
+def bootstrap(x, y, codes, n_groups: int, n_boot: int = 1000, seed: int = 0, workers: int = None,
+              alpha: float = 0.05) -> dict:
+    """
+    Intervalos percentil (1 - alpha) de pearson, spearman y pendiente por
+    grupo. workers=1 corre en el proceso actual.
+    """
+    # Un solo ordenamiento para todas las réplicas
+    order = _sort_within(x, codes)
+    x, y, codes = x[order], y[order], codes[order]
+    order_y = _sort_within(y, codes)
+    run_y = np.empty(len(y), dtype=np.int64)
+    run_y[order_y] = _tie_runs(y[order_y], codes[order_y])
+    data = {"x": x, "y": y, "codes": codes, "n_groups": n_groups, "run_x": _tie_runs(x, codes), "run_y": run_y}
+
+    chunks = [min(CHUNK, n_boot - i) for i in range(0, n_boot, CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        _init_worker(data)
+        parts = [_bootstrap_chunk(s, reps) for s, reps in zip(seeds, chunks)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                                 initargs=(data,)) as pool:
+            parts = list(pool.map(_bootstrap_chunk, seeds, chunks))
+    reps = np.concatenate(parts)
+    with warnings.catch_warnings():
+        # Grupos con menos de MIN_PAIRS pares: todas las réplicas NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lo = np.nanpercentile(reps, 100 * alpha / 2, axis=0)
+        hi = np.nanpercentile(reps, 100 * (1 - alpha / 2), axis=0)
+    out = {}
+    for k, name in enumerate(("pearson", "spearman", "slope")):
+        out[f"{name}_lo"], out[f"{name}_hi"] = lo[k], hi[k]
+    return out
+
+
+# ---------------------------
+# Pares y tablas de resultados
+# ---------------------------
+def paired_samples(engine, raster=None) -> pd.DataFrame:
+    """region, ocean, measurement, species_count de las muestras con ambos valores."""
+    from DB.queries import PAIRED_OBSERVATIONS
+    from reports.visualizations import _run_df, paired_observations
+
+    df = paired_observations(engine, raster) if raster is not None else _run_df(engine, PAIRED_OBSERVATIONS)
+    df = df[["region", "ocean", "measurement", "species_count"]]
+    return df[df["measurement"].notna() & df["species_count"].notna()].reset_index(drop=True)
+
+
+def correlations(pairs: pd.DataFrame, by: str = "region", log_measurement: bool = True, n_boot: int = 0,
+                 seed: int = 0, workers: int = None, alpha: float = 0.05) -> pd.DataFrame:
+    """
+    Una fila por miembro de `by` (region, ocean o all): n, pearson, spearman,
+    slope, intercept, r2 y, con n_boot > 0, los intervalos *_lo/*_hi.
+    Ordenado por n descendente.
+    """
+    if by not in GROUPINGS:
+        raise ValueError(f"agrupación desconocida: {by} (usa una de {GROUPINGS})")
+    x = pairs["measurement"].to_numpy(dtype=np.float64)
+    y = pairs["species_count"].to_numpy(dtype=np.float64)
+    if log_measurement:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x = np.log1p(x)
+    ok = np.isfinite(x) & np.isfinite(y)
+    if by == "all":
+        codes, labels = np.zeros(int(ok.sum()), dtype=np.int64), pd.Index(["Global"])
+    else:
+        codes, labels = pd.factorize(pairs.loc[ok, by].fillna("Desconocido"), sort=True)
+    x, y, n_groups = x[ok], y[ok], len(labels)
+
+    stats = group_stats(x, y, codes, n_groups)
+    stats["spearman"] = _spearman(x, y, codes, n_groups)
+    if n_boot and len(x):
+        stats.update(bootstrap(x, y, codes, n_groups, n_boot, seed, workers, alpha))
+    df = pd.DataFrame({by if by != "all" else "scope": labels, **stats})
+    cols = [df.columns[0], "n", "pearson", "spearman", "slope", "intercept", "r2"]
+    cols += [c for c in df.columns if c.endswith(("_lo", "_hi"))]
+    return df[cols].sort_values("n", ascending=False, kind="stable").reset_index(drop=True)
+
+
+# ---------------------------
+# Caché por generación de carga
+# ---------------------------
+def load_generation(engine) -> str:
+    """Huella corta de los datos cargados (cambia con cada carga que modifica los hechos)."""
+    from reports.visualizations import _run_df
+
+    row = _run_df(engine, GENERATION_SQL).iloc[0]
+    # Sumas de punto flotante: se redondean para que el orden de la suma no cambie la huella
+    values = [None if pd.isna(v) else f"{float(v):.9g}" for v in row.tolist()]
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()[:16]
+
+
+def _raster_key(raster) -> dict:
+    return None if raster is None else {**raster.meta, "checksum": float(np.nansum(raster.grid))}
+
+
+def correlation_report(engine, by=("region", "ocean"), raster=None, n_boot: int = 1000, seed: int = 0,
+                       workers: int = None, alpha: float = 0.05, log_measurement: bool = True,
+                       cache_dir: str = DEFAULT_CACHE_DIR) -> dict:
+    """
+    {agrupación: DataFrame de `correlations`}, cacheado en `cache_dir` por
+    generación de carga, raster y parámetros. cache_dir=None no usa caché.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    path = None
+    if cache_dir:
+        key = json.dumps({"generation": load_generation(engine), "raster": _raster_key(raster), "by": by,
+                          "n_boot": n_boot, "seed": seed, "alpha": alpha, "log": log_measurement}, sort_keys=True)
+        path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:20] + ".pkl")
+        if os.path.exists(path):
+            return pd.read_pickle(path)
+
+    pairs = paired_samples(engine, raster)
+    result = {g: correlations(pairs, g, log_measurement, n_boot, seed, workers, alpha) for g in by}
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        pd.to_pickle(result, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Correlación riqueza de especies vs microplásticos por región/océano")
+    ap.add_argument("--by", nargs="+", choices=GROUPINGS, default=["region", "ocean"])
+    ap.add_argument("--boot", type=int, default=1000, help="réplicas bootstrap (0 = sin intervalos)")
+    ap.add_argument("--workers", type=int, default=None, help="procesos del bootstrap (por defecto, CPUs)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--raw-measurement", action="store_true", help="measurement sin log1p")
+    ap.add_argument("--species-raster", default="reports/analytics/species_richness.npy",
+                    help="raster de especies (ETL/raster.py); si no existe se usa el JOIN por coordenadas")
+    ap.add_argument("--out-dir", default="reports/figures", help="donde se escribe correlation_<by>.csv")
+    ap.add_argument("--no-cache", action="store_true")
+    args = ap.parse_args(argv)
+
+    from DB.engine import get_engine
+    raster = None
+    if os.path.exists(args.species_raster):
+        from ETL.raster import open_raster
+        raster = open_raster(args.species_raster)
+    result = correlation_report(get_engine(), args.by, raster, n_boot=args.boot, seed=args.seed,
+                                workers=args.workers, log_measurement=not args.raw_measurement,
+                                cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR)
+    os.makedirs(args.out_dir, exist_ok=True)
+    pd.set_option("display.width", 160)
+    for by, df in result.items():
+        print(f"\n{by}:")
+        print(df.to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+        df.to_csv(os.path.join(args.out_dir, f"correlation_{by}.csv"), index=False)
+
+
+if __name__ == "__main__":
+    main()
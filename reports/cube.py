@@ -0,0 +1,381 @@
+# reports/cube.py
+"""
+In-memory OLAP cube over fact_microplastics for instant date-window slicing.
+
+The cube is built once (one fact scan) as NumPy arrays indexed
+[date x cell], where a cell is one observed combination of
+region × ocean × method × marine setting × organization × depth band. Only
+combinations that occur are stored, so the array stays dense along the date
+axis but does not reserve space for the full cross product. For every cell it holds sum,
+sum of squares, count of measurements and count of rows. These are stored as
+cumulative sums along the date axis, so the totals for any window
+[start_date, end_date) are two row lookups and one subtraction.
+
+`KpiCube.kpis(start, end)` returns the date-windowed KPI frames with the same
+columns as the SQL in DB/queries.py, so the plot functions in
+reports/visualizations.py can draw them directly. `where={fk: ids}` restricts
+any query to the cells of the given dimension members (the dashboard
+filters), and `keys` builds a smaller cube over a subset of the dimensions.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# (columna FK en el hecho, tabla de dimensión, columna etiqueta)
+CUBE_DIMS = [
+    ("region_id", "dim_region", "region"),
+    ("ocean_id", "dim_ocean", "ocean"),
+    ("method_id", "dim_sampling_method", "sampling_method"),
+    ("marine_setting_id", "dim_marine_setting", "marine_setting"),
+    ("organization_id", "dim_organization", "organization"),
+    ("depth_band_id", "dim_depth_band", "depth_band"),
+]
+
+# KPI de kpis() -> columnas FK que necesita en el cubo (vacío = solo fechas)
+_KPI_DIMS = {
+    "region_avgs": ("region_id",),
+    "depth": ("depth_band_id",),
+    "critical_high": ("region_id", "ocean_id"),
+    "hotspots": ("region_id",),
+    "method": ("method_id",),
+    "year_trend": (),
+    "ocean_donut": ("ocean_id",),
+    "org_lollipop": ("organization_id",),
+    "samples_per_year": (),
+    "methods_by_year": ("method_id",),
+    "marine_setting": ("marine_setting_id",),
+    "monthly_trend": (),
+}
+
+# Medidas acumuladas por celda (en este orden): suma, suma de cuadrados,
+# #medidas no nulas (para AVG/STDDEV) y #filas (COUNT(*))
+def _fact_sql(keys):
+    return text("SELECT date_id, " + ", ".join(keys) + ", measurement FROM fact_microplastics")
+
+
+def _date_id(value):
+    if value is None:
+        return None
+    return int(str(value)[:10].replace("-", ""))
+
+
+def _read(engine, query):
+    # `engine` puede ser un engine SQLAlchemy o un DuckDBStore (DB/analytics.py)
+    if hasattr(engine, "run_df"):
+        return engine.run_df(query)
+    return pd.read_sql(query, engine)
+
+
+def _labels(dims) -> dict:
+    """{columna FK: Serie id -> etiqueta} a partir de tablas de dimensión."""
+    labels = {}
+    tables = dims.values() if isinstance(dims, dict) else dims
+    for df in tables:
+        for col, _, label in CUBE_DIMS:
+            if col in df.columns and label in df.columns:
+                labels[col] = df.set_index(col)[label]
+    return labels
+
+
+def _keys(keys=None) -> list:
+    """Columnas FK del cubo, en el orden de CUBE_DIMS."""
+    if keys is None:
+        return [col for col, _, _ in CUBE_DIMS]
+    unknown = set(keys) - {col for col, _, _ in CUBE_DIMS}
+    if unknown:
+        raise ValueError(f"dimensiones desconocidas para el cubo: {sorted(unknown)}")
+    return [col for col, _, _ in CUBE_DIMS if col in keys]
+
+
+class KpiCube:
+    def __init__(self, dates, cells, cum, undated, labels=None, keys=None):
+        # dates: date_id ordenados (n_dates); cells: ids de cada celda (n_cells x n_dims, -1 = NULL)
+        # cum: (n_dates + 1, 4, n_cells) acumulados; undated: (4, n_cells) filas sin fecha
+        # keys: columnas FK de las dimensiones de `cells` (por defecto todas las de CUBE_DIMS)
+        self.dates = dates
+        self.cells = cells
+        self.cum = cum
+        self.undated = undated
+        self.labels = labels or {}
+        self.keys = _keys(keys)
+        self._years = dates // 10000
+        self._months = (dates // 100) % 100
+        # Totales por fecha (todas las celdas) para las series temporales
+        self._per_date = np.diff(cum.sum(axis=2), axis=0)
+        # Agrupaciones de celdas por una o varias dimensiones (ver _group); las
+        # de una sola dimensión se preparan aquí
+        self._label = {col: label for col, _, label in CUBE_DIMS}
+        self._groups = {}
+        self._group_cum = {}
+        for col in self.keys:
+            self._group(col)
+
+    # ---------------------------
+    # Constructores
+    # ---------------------------
+    @classmethod
+    def from_frame(cls, fact: pd.DataFrame, dims=None, max_bytes: int = 1 << 30, keys=None, grain: str = "day"):
+        """
+        Construye el cubo desde un fact_microplastics en memoria (p.ej. la salida
+        de transform). `dims` son las tablas de dimensión (dict o lista) para
+        las etiquetas; `keys`, las columnas FK a incluir (menos dimensiones,
+        menos celdas). grain="month" acumula por mes (date_id YYYYMM01): ~30
+        veces menos filas, y las ventanas se resuelven a meses completos.
+        """
+        keys = _keys(keys)
+        date_id = pd.to_numeric(fact["date_id"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        if grain == "month":
+            date_id = date_id // 100 * 100 + 1
+        elif grain != "day":
+            raise ValueError(f"grain desconocido: {grain}")
+        measure = pd.to_numeric(fact["measurement"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        ids = np.column_stack([
+            pd.to_numeric(fact[col], errors="coerce").to_numpy(dtype="float64", na_value=-1)
+            for col in keys
+        ]).astype(np.int64)
+        ids[ids < 0] = -1
+
+        # Celda observada de cada fila: las FK se codifican en un solo entero
+        # (base mixta) para que np.unique ordene una columna y no filas
+        radix = ids.max(axis=0, initial=0) + 2
+        if np.prod(radix.astype(np.float64)) < 2 ** 62:
+            code = np.zeros(len(ids), dtype=np.int64)
+            for pos in range(ids.shape[1]):
+                code = code * radix[pos] + (ids[:, pos] + 1)
+            codes, cell_idx = np.unique(code, return_inverse=True)
+            cells = np.empty((len(codes), ids.shape[1]), dtype=np.int64)
+            for pos in reversed(range(ids.shape[1])):
+                codes, cells[:, pos] = np.divmod(codes, radix[pos])
+            cells -= 1
+        else:
+            cells, cell_idx = np.unique(ids, axis=0, return_inverse=True)
+        cell_idx = cell_idx.ravel()
+        n_cells = len(cells)
+
+        dated = ~np.isnan(date_id)
+        dates = np.unique(date_id[dated]).astype(np.int64)
+        n_dates = len(dates)
+        needed = (n_dates + 1) * 4 * n_cells * 8
+        if needed > max_bytes:
+            raise ValueError(
+                f"El cubo necesita {needed / 1e6:,.0f} MB ({n_dates} fechas x {n_cells} celdas); "
+                f"sube max_bytes o reduce las dimensiones."
+            )
+
+        has_m = ~np.isnan(measure)
+        m = np.where(has_m, measure, 0.0)
+        weights = (m, m * m, has_m.astype(np.float64), np.ones(len(m)))
+
+        flat = np.searchsorted(dates, date_id[dated].astype(np.int64)) * n_cells + cell_idx[dated]
+        cum = np.zeros((n_dates + 1, 4, n_cells))
+        for k, w in enumerate(weights):
+            cum[1:, k, :] = np.bincount(flat, weights=w[dated], minlength=n_dates * n_cells).reshape(n_dates, n_cells)
+        np.cumsum(cum, axis=0, out=cum)
+
+        undated = np.zeros((4, n_cells))
+        for k, w in enumerate(weights):
+            undated[k] = np.bincount(cell_idx[~dated], weights=w[~dated], minlength=n_cells)
+
+        return cls(dates, cells, cum, undated, _labels(dims) if dims is not None else None, keys)
+
+    @classmethod
+    def from_engine(cls, engine, keys=None, **kwargs):
+        """Una lectura de fact_microplastics más las dimensiones etiquetadas."""
+        keys = _keys(keys)
+        fact = _read(engine, _fact_sql(keys))
+        dims = [_read(engine, text(f"SELECT {col}, {label} FROM {table}"))
+                for col, table, label in CUBE_DIMS if col in keys]
+        return cls.from_frame(fact, dims, keys=keys, **kwargs)
+
+    # ---------------------------
+    # Consultas
+    # ---------------------------
+    def _group(self, dims):
+        """
+        Agrupación de las celdas por una o varias dimensiones (columnas FK):
+        (celda -> grupo, #grupos, frame con la etiqueta y el id de cada
+        dimensión por grupo).
+        """
+        dims = (dims,) if isinstance(dims, str) else tuple(dims)
+        if dims not in self._groups:
+            pos = [self.keys.index(col) for col in dims]
+            keys, inv = np.unique(self.cells[:, pos], axis=0, return_inverse=True)
+            frame = {}
+            for j, col in enumerate(dims):
+                ids = pd.Series(keys[:, j], dtype="Int64").mask(keys[:, j] < 0)
+                frame[self._label[col]] = (ids.map(self.labels[col]) if col in self.labels else ids).array
+                frame[col] = ids.array
+            self._groups[dims] = (inv.ravel(), len(keys), pd.DataFrame(frame))
+        return self._groups[dims]
+
+    def _cum_by(self, dims, mask=None) -> np.ndarray:
+        """Acumulados (n_dates + 1, 4, #grupos) por grupo de `dims`; sin filtro se calculan una vez."""
+        inv, n_groups, _ = self._group(dims)
+        key = (dims,) if isinstance(dims, str) else tuple(dims)
+        if mask is None and key in self._group_cum:
+            return self._group_cum[key]
+        onehot = np.zeros((len(inv), n_groups))
+        onehot[np.arange(len(inv)), inv] = 1.0 if mask is None else mask
+        cum = self.cum @ onehot
+        if mask is None:
+            self._group_cum[key] = cum
+        return cum
+
+    def members(self, dim: str) -> pd.DataFrame:
+        """Miembros de una dimensión presentes en el cubo: id y etiqueta."""
+        return self._group(dim)[2][[dim, self._label[dim]]]
+
+    def _bounds(self, start_date=None, end_date=None):
+        lo = 0 if start_date is None else int(np.searchsorted(self.dates, _date_id(start_date), side="left"))
+        hi = len(self.dates) if end_date is None else int(np.searchsorted(self.dates, _date_id(end_date), side="left"))
+        return lo, max(lo, hi)
+
+    def mask(self, where=None):
+        """
+        Celdas que cumplen `where` ({columna FK: ids}; lista vacía o None = sin
+        filtro en esa dimensión). None si no hay ningún filtro.
+        """
+        mask = None
+        for col, ids in (where or {}).items():
+            if ids is None or not len(ids):
+                continue
+            keep = np.isin(self.cells[:, self.keys.index(col)], np.asarray(ids, dtype=np.int64))
+            mask = keep if mask is None else mask & keep
+        return mask
+
+    def window(self, start_date=None, end_date=None, where=None) -> np.ndarray:
+        """
+        Totales (4, n_cells) de la ventana [start_date, end_date). Sin ventana se
+        incluyen también las filas sin fecha, como en las consultas SQL. Las
+        celdas fuera de `where` quedan en cero.
+        """
+        lo, hi = self._bounds(start_date, end_date)
+        totals = self.cum[hi] - self.cum[lo]
+        if start_date is None and end_date is None:
+            totals = totals + self.undated
+        mask = self.mask(where)
+        if mask is not None:
+            totals = totals * mask
+        return totals
+
+    @staticmethod
+    def _stats(totals: np.ndarray) -> dict:
+        s, sq, n, rows = totals
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = np.where(n > 0, s / n, np.nan)
+            var = np.where(n > 1, np.maximum(sq - s * s / np.where(n > 0, n, 1), 0) / (n - 1), np.nan)
+        return {
+            "avg_microplastics": avg,
+            "total_microplastics": np.where(n > 0, s, np.nan),
+            "sd_micro": np.sqrt(var),
+            "n_samples": rows.astype(np.int64),
+        }
+
+    def by(self, dim, start_date=None, end_date=None, where=None) -> pd.DataFrame:
+        """
+        KPIs de la ventana agrupados por una dimensión (columna FK, p.ej.
+        "region_id") o por varias (lista). Devuelve la etiqueta y el id de cada
+        dimensión, avg/total/sd y n_samples.
+        """
+        inv, n_keys, frame = self._group(dim)
+        totals = self.window(start_date, end_date, where)
+        grouped = np.stack([np.bincount(inv, weights=t, minlength=n_keys) for t in totals])
+        out = frame.assign(**self._stats(grouped))
+        return out[out["n_samples"] > 0].reset_index(drop=True)
+
+    def series(self, part: str = "year", start_date=None, end_date=None, where=None, by=None) -> pd.DataFrame:
+        """
+        KPIs por año o mes (part="year"|"month") dentro de la ventana (solo filas
+        con fecha). by=columna(s) FK desglosa además cada año/mes por esa dimensión.
+        """
+        lo, hi = self._bounds(start_date, end_date)
+        keys_all = self._years if part == "year" else self._months
+        keys, inv = np.unique(keys_all[lo:hi], return_inverse=True)
+        inv = inv.ravel()
+        mask = self.mask(where)
+        if by is None:
+            if mask is None:
+                per = self._per_date[lo:hi]
+            else:
+                # Totales por fecha solo de las celdas filtradas: producto con la máscara
+                per = np.diff(self.cum[lo:hi + 1] @ mask.astype(np.float64), axis=0)
+            grouped = np.stack([np.bincount(inv, weights=per[:, k], minlength=len(keys)) for k in range(4)])
+            out = pd.DataFrame(self._stats(grouped))
+            out.insert(0, part, keys)
+            return out
+
+        _, n_groups, frame = self._group(by)
+        per = np.diff(self._cum_by(by, mask)[lo:hi + 1], axis=0)
+        # Índice plano (año/mes, grupo) para un solo bincount por medida
+        flat = (inv[:, None] * n_groups + np.arange(n_groups)).ravel()
+        grouped = np.stack([
+            np.bincount(flat, weights=per[:, k, :].ravel(), minlength=len(keys) * n_groups) for k in range(4)
+        ])
+        out = frame.iloc[np.tile(np.arange(n_groups), len(keys))].reset_index(drop=True)
+        out.insert(0, part, np.repeat(keys, n_groups))
+        out = out.assign(**self._stats(grouped))
+        return out[out["n_samples"] > 0].reset_index(drop=True)
+
+    def kpis(self, start_date=None, end_date=None, where=None) -> dict:
+        """
+        Frames con las mismas columnas que las consultas SQL de los KPIs
+        agregables (claves de KPI_QUERIES). Con un cubo de menos dimensiones
+        (keys) solo se devuelven los KPIs que estas permiten.
+        """
+        def top(df, col, by, n=10, notnull=False):
+            if notnull:
+                df = df[df[col].notna()]
+            df = df.sort_values(by, ascending=False, kind="stable")
+            return (df.head(n) if n else df).reset_index(drop=True)
+
+        done = {}
+
+        def by(dims):
+            key = (dims,) if isinstance(dims, str) else tuple(dims)
+            if key not in done:
+                done[key] = self.by(list(key), start_date, end_date, where)
+            return done[key]
+
+        def series(part, dim=None):
+            key = (part, dim)
+            if key not in done:
+                done[key] = self.series(part, start_date, end_date, where, by=dim)
+            return done[key]
+
+        def depth():
+            df = by("depth_band_id")
+            df = df[df["depth_band"].notna() & (df["depth_band"] != "Unknown")]
+            return top(df, "depth_band", "avg_microplastics")[["depth_band", "avg_microplastics", "n_samples"]]
+
+        def methods_by_year():
+            df = series("year", "method_id").sort_values(["year", "n_samples"], ascending=[True, False], kind="stable")
+            return df[["year", "sampling_method", "n_samples"]].reset_index(drop=True)
+
+        out = {
+            "region_avgs": lambda: top(by("region_id"), "region", "avg_microplastics", notnull=True)[
+                ["region", "avg_microplastics", "n_samples"]],
+            "depth": depth,
+            "critical_high": lambda: top(by(["region_id", "ocean_id"]), "region", "total_microplastics",
+                                         n=None, notnull=True)[["region", "ocean", "total_microplastics", "n_samples"]]
+                .rename(columns={"total_microplastics": "sum_measurements"}),
+            "hotspots": lambda: top(by("region_id"), "region", "total_microplastics", notnull=True)[
+                ["region", "total_microplastics"]].rename(columns={"total_microplastics": "measurement"}),
+            "method": lambda: top(by("method_id"), "sampling_method", "avg_microplastics")[
+                ["sampling_method", "avg_microplastics", "sd_micro", "n_samples"]],
+            "year_trend": lambda: series("year")[["year", "avg_microplastics", "total_microplastics", "n_samples"]],
+            "ocean_donut": lambda: top(by("ocean_id"), "ocean", "total_microplastics", n=None)[
+                ["ocean", "total_microplastics", "avg_microplastics", "n_samples"]],
+            "org_lollipop": lambda: top(by("organization_id"), "organization", "n_samples", n=None)[
+                ["organization", "n_samples", "total_microplastics", "avg_microplastics"]],
+            "samples_per_year": lambda: series("year")[["year", "n_samples"]],
+            "methods_by_year": methods_by_year,
+            "marine_setting": lambda: top(by("marine_setting_id"), "marine_setting", "avg_microplastics",
+                                          notnull=True)[["marine_setting", "avg_microplastics",
+                                                         "total_microplastics", "n_samples"]],
+            "monthly_trend": lambda: series("month")[["month", "avg_microplastics", "n_samples"]],
+        }
+        return {name: make() for name, make in out.items() if set(_KPI_DIMS[name]) <= set(self.keys)}
+
+    @property
+    def nbytes(self) -> int:
+        return self.cum.nbytes + self.undated.nbytes + self.cells.nbytes
@@ -0,0 +1,198 @@
+# reports/dashboard.py
+"""
+Interactive Dash dashboard over the aggregable KPIs.
+
+The app never scans fact_microplastics while serving. At startup it builds a
+monthly KpiCube (reports/cube.py) over region × ocean × method from one read
+of the warehouse. A daily cube would hold ~30x more rows. Every callback
+answers from that cube: a date-window slice plus a cell mask for the
+region/ocean/method filters. The picked window is resolved to whole months.
+Results are memoised server-side with an LRU cache keyed by the normalised
+filter values, so a repeated selection costs one dictionary lookup. Figures
+are built as plain plotly dicts, because plotly.graph_objects validation
+alone would use most of the latency budget.
+
+Run:
+    python -m reports.dashboard --port 8050
+    python -m reports.dashboard --analytics-path reports/analytics/ods14.duckdb
+
+benchmarks/bench_dashboard.py load-tests the callback at 10M fact rows.
+"""
+import argparse
+from functools import lru_cache
+
+from reports.cube import KpiCube
+
+# Dimensiones del cubo del dashboard: (columna FK, id del filtro, título)
+FILTERS = [
+    ("region_id", "filter-region", "Región"),
+    ("ocean_id", "filter-ocean", "Océano"),
+    ("method_id", "filter-method", "Método de muestreo"),
+]
+DASHBOARD_KEYS = [col for col, _, _ in FILTERS]
+
+# Gráficos, en el orden de las salidas del callback
+GRAPHS = ["graph-region", "graph-method", "graph-ocean", "graph-year", "graph-month"]
+
+CACHE_SIZE = 512
+
+
+def build_cube(engine, **kwargs) -> KpiCube:
+    """Cubo mensual región × océano × método (una lectura del hecho y de sus dimensiones)."""
+    return KpiCube.from_engine(engine, keys=DASHBOARD_KEYS, grain="month", **kwargs)
+
+
+def _date_str(date_id) -> str:
+    d = int(date_id)
+    return f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}"
+
+
+def _bar(x, y, title, ytitle, horizontal=False):
+    trace = {"type": "bar", "x": y, "y": x, "orientation": "h"} if horizontal else {"type": "bar", "x": x, "y": y}
+    layout = {"title": {"text": title}, "margin": {"l": 160 if horizontal else 50, "r": 20, "t": 50, "b": 80}}
+    layout["xaxis" if horizontal else "yaxis"] = {"title": {"text": ytitle}}
+    if horizontal:
+        layout["yaxis"] = {"autorange": "reversed"}
+    return {"data": [trace], "layout": layout}
+
+
+def _labels(series) -> list:
+    return ["Desconocido" if v is None or v != v else str(v) for v in series.tolist()]
+
+
+def _floats(series) -> list:
+    # NaN no es JSON válido: None
+    return [None if v != v else v for v in series.astype(float).tolist()]
+
+
+def kpi_figures(cube: KpiCube, start_date=None, end_date=None, where=None) -> dict:
+    """
+    Figuras (dicts de plotly) y resumen de la selección: ventana
+    [start_date, end_date) y filtros `where` ({columna FK: ids}).
+    """
+    k = cube.kpis(start_date, end_date, where)
+    region, method, ocean = k["region_avgs"], k["method"], k["ocean_donut"]
+    years, months = k["year_trend"], k["monthly_trend"]
+
+    s, _, n, rows = cube.window(start_date, end_date, where).sum(axis=1)
+    summary = (f"{int(rows):,} muestras · promedio {s / n:,.3f}" if n else f"{int(rows):,} muestras · sin mediciones")
+
+    figures = {
+        "graph-region": _bar(_labels(region["region"]), _floats(region["avg_microplastics"]),
+                             "Top 10 regiones por promedio", "Promedio", horizontal=True),
+        "graph-method": _bar(_labels(method["sampling_method"]), _floats(method["avg_microplastics"]),
+                             "Promedio por método de muestreo", "Promedio"),
+        "graph-ocean": {
+            "data": [{"type": "pie", "hole": 0.5, "labels": _labels(ocean["ocean"]),
+                      "values": _floats(ocean["total_microplastics"])}],
+            "layout": {"title": {"text": "Total por océano"}, "margin": {"l": 20, "r": 20, "t": 50, "b": 20}},
+        },
+        "graph-year": {
+            "data": [
+                {"type": "scatter", "mode": "lines+markers", "name": "Promedio",
+                 "x": years["year"].tolist(), "y": _floats(years["avg_microplastics"])},
+                {"type": "bar", "name": "#muestras", "yaxis": "y2", "opacity": 0.3,
+                 "x": years["year"].tolist(), "y": years["n_samples"].tolist()},
+            ],
+            "layout": {"title": {"text": "Tendencia anual"}, "yaxis": {"title": {"text": "Promedio"}},
+                       "yaxis2": {"title": {"text": "#muestras"}, "overlaying": "y", "side": "right"},
+                       "legend": {"orientation": "h"}, "margin": {"l": 50, "r": 50, "t": 50, "b": 40}},
+        },
+        "graph-month": _bar(months["month"].tolist(), _floats(months["avg_microplastics"]),
+                            "Estacionalidad (promedio por mes)", "Promedio"),
+    }
+    return {"figures": figures, "summary": summary}
+
+
+def cached_figures(cube: KpiCube, cache_size: int = CACHE_SIZE):
+    """
+    kpi_figures memoizado (LRU). Los argumentos deben ser hashables: fechas ISO
+    y tuplas ordenadas de ids; ver `normalize`.
+    """
+    @lru_cache(maxsize=cache_size)
+    def figures(start_date, end_date, regions, oceans, methods):
+        where = dict(zip(DASHBOARD_KEYS, (regions, oceans, methods)))
+        return kpi_figures(cube, start_date, end_date, where)
+    return figures
+
+
+def normalize(start_date, end_date, *selections):
+    """
+    Clave canónica de una selección del dashboard. La ventana se lleva a meses
+    completos (el grano del cubo): desde el 1° del mes de inicio hasta el 1°
+    del mes siguiente al fin, que en el DatePickerRange es inclusivo.
+    """
+    start = f"{start_date[:7]}-01" if start_date else None
+    end = None
+    if end_date:
+        year, month = int(end_date[:4]), int(end_date[5:7])
+        end = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+    return (start, end, *(tuple(sorted(int(v) for v in sel)) if sel else () for sel in selections))
+
+
+def create_app(cube: KpiCube, cache_size: int = CACHE_SIZE):
+    """App Dash sobre `cube`; `app.figures` expone la caché (cache_info/cache_clear)."""
+    import dash_bootstrap_components as dbc
+    from dash import Dash, Input, Output, dcc, html
+
+    if not len(cube.dates):
+        raise ValueError("El cubo no tiene fechas: el warehouse no tiene muestras con fecha (¿corrió load?).")
+    figures = cached_figures(cube, cache_size)
+    first, last = _date_str(cube.dates[0]), _date_str(cube.dates[-1])
+
+    def dropdown(col, component_id, title):
+        members = cube.members(col).dropna()
+        options = [{"label": str(name), "value": int(i)} for i, name in zip(members[col], members.iloc[:, 1])]
+        return dbc.Col([html.Label(title), dcc.Dropdown(id=component_id, options=options, multi=True)], md=3)
+
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], title="ODS 14 · Microplásticos")
+    app.layout = dbc.Container([
+        html.H2("ODS 14 · Microplásticos marinos"),
+        dbc.Row([
+            dbc.Col([html.Label("Ventana"), dcc.DatePickerRange(
+                id="filter-window", min_date_allowed=first, max_date_allowed=last,
+                start_date=first, end_date=last, display_format="YYYY-MM-DD")], md=3),
+            *[dropdown(*f) for f in FILTERS],
+        ], className="my-3"),
+        html.Div(id="summary", className="lead mb-3"),
+        dbc.Row([dbc.Col(dcc.Graph(id="graph-region"), md=6), dbc.Col(dcc.Graph(id="graph-method"), md=6)]),
+        dbc.Row([dbc.Col(dcc.Graph(id="graph-ocean"), md=4), dbc.Col(dcc.Graph(id="graph-year"), md=8)]),
+        dbc.Row([dbc.Col(dcc.Graph(id="graph-month"), md=12)]),
+    ], fluid=True)
+
+    @app.callback(
+        [Output(g, "figure") for g in GRAPHS] + [Output("summary", "children")],
+        [Input("filter-window", "start_date"), Input("filter-window", "end_date")]
+        + [Input(component_id, "value") for _, component_id, _ in FILTERS],
+    )
+    def update(start_date, end_date, regions, oceans, methods):
+        result = figures(*normalize(start_date, end_date, regions, oceans, methods))
+        return [result["figures"][g] for g in GRAPHS] + [result["summary"]]
+
+    app.figures = figures
+    return app
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Dashboard interactivo de los KPIs (Dash)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8050)
+    ap.add_argument("--analytics-path", default=None,
+                    help="lee el hecho desde la copia DuckDB/Parquet en vez del warehouse")
+    ap.add_argument("--cache-size", type=int, default=CACHE_SIZE)
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.analytics_path:
+        from DB.analytics import DuckDBStore
+        source = DuckDBStore(args.analytics_path)
+    else:
+        from DB.engine import get_engine
+        source = get_engine()
+    cube = build_cube(source)
+    print(f"Cubo del dashboard: {len(cube.dates)} fechas x {len(cube.cells)} celdas, {cube.nbytes / 1e6:,.1f} MB")
+    create_app(cube, args.cache_size).run(host=args.host, port=args.port, debug=args.debug)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,13 @@
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import matplotlib.ticker as mticker
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from DB.queries import (
-    MICRO_BY_REGION_TOP10,
-    DEPTH_BINS_EFFECT_TOP10,
-    CRITICAL_ZONES_HIGH,
-    REGION_HOTSPOTS,
-    METHOD_EFFECTS_TOP10,
-    CONC_CLASS_BY_REGION_TOP10,
-    PAIRED_OBSERVATIONS,
-    YEAR_TREND,
-    OCEAN_RANKING_TOTAL,
-    ORGANIZATION_ACTIVITY,
-    CRITICAL_ZONES_HIGHHIGH,
-    CRITICAL_ZONES_LOWBIODIV_HIGHCONT,
-    SAMPLES_PER_YEAR,
-    METHODS_BY_YEAR_COUNTS,
-    METHODS_BY_WATERSAMPLEDEPTH,
-    MARINE_SETTING_RANKING,
-    MONTHLY_TREND
-)
+from DB.queries import KPI_QUERIES, SAMPLE_LOCATIONS, window_params
 
 sns.set(style="whitegrid")
 
@@ -38,6 +19,9 @@ def _ensure_dir(path: str):
         os.makedirs(path)
 
 def _run_df(engine, query, params=None):
+    # `engine` puede ser un engine SQLAlchemy o un DuckDBStore (DB/analytics.py)
+    if hasattr(engine, "run_df"):
+        return engine.run_df(query, params)
     return pd.read_sql(query, con=engine, params=params or {})
 
 def _save_table(df: pd.DataFrame, path: str):
@@ -216,9 +200,9 @@ def plot_depth_vs_method_heatmap(df, out_path, top_methods=8):
     if df.empty:
         return
 
-       # orden lógico fijo
-    order = ["0–5m","5–20m","20–50m","50–200m","200m+", "Unknown"]
+    # orden lógico de dim_depth_band (depth_band_id)
     df = df.copy()
+    order = df.sort_values("depth_band_id")["depth_band"].unique()
     df["depth_band"] = pd.Categorical(df["depth_band"], categories=order, ordered=True)
     df["sampling_method"] = df["sampling_method"].str.strip().str.lower()
 
@@ -229,7 +213,7 @@ def plot_depth_vs_method_heatmap(df, out_path, top_methods=8):
 
     # matriz numérica
     pivot = (d.pivot_table(index="depth_band", columns="sampling_method",
-                           values="n_samples", aggfunc="sum", fill_value=0)
+                           values="n_samples", aggfunc="sum", fill_value=0, observed=False)
                .sort_index())
 
 
@@ -332,7 +316,7 @@ def plot_species_micro_map(df: pd.DataFrame, out_path: str, top_n=200):
     import numpy as np
     import matplotlib.pyplot as plt
     import cartopy.crs as ccrs
-    import cartopy.feature as cfeature
+    from reports.basemap import draw_basemap
 
     df = df.dropna(subset=["latitude", "longitude"])
     if df.empty:
@@ -365,9 +349,8 @@ def plot_species_micro_map(df: pd.DataFrame, out_path: str, top_n=200):
     plt.figure(figsize=(16,8))
     ax = plt.axes(projection=ccrs.PlateCarree())
     ax.set_global()
-    ax.coastlines(linewidth=0.8)
-    ax.add_feature(cfeature.LAND, facecolor="#f0f0f0")
-    ax.add_feature(cfeature.OCEAN, facecolor="#a6cee3")
+    # Tierra/océano/costas ya proyectados desde la caché (reports/basemap.py)
+    draw_basemap(ax, dpi=140, width=16)
     gl = ax.gridlines(draw_labels=True, linewidth=0.5, color='gray', alpha=0.3, linestyle='--')
     gl.top_labels = False
     gl.right_labels = False
@@ -399,100 +382,158 @@ def plot_species_micro_map(df: pd.DataFrame, out_path: str, top_n=200):
     plt.tight_layout()
     plt.savefig(out_path, dpi=140)
     plt.show()
+    plt.close()
+# ---------------------------
+# Concurrent fetch
+# ---------------------------
+def _pool_capacity(engine):
+    """Conexiones que el pool del engine puede entregar a la vez (None si no aplica)."""
+    pool = getattr(engine, "pool", None)
+    if pool is None or not hasattr(pool, "size"):
+        return None
+    return pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+
+def fetch_kpis(engine, params=None, queries=None, max_workers=None, profiler=None):
+    """
+    Ejecuta las consultas KPI en paralelo (un hilo por consulta, acotado por el
+    pool de conexiones) y devuelve {nombre: DataFrame}. El tiempo total queda
+    cerca del de la consulta más lenta.
+    profiler: un DB.profiling.QueryProfiler que mide cada consulta y captura su plan.
+    """
+    if queries is None:
+        queries = KPI_QUERIES
+    if not queries:
+        # Todo cubierto por el cubo/raster (generate_all_figures pasa un dict vacío)
+        return {}
+    if profiler is not None:
+        run = lambda name, q: profiler.run(name, engine, q, params)
+    else:
+        run = lambda name, q: _run_df(engine, q, params)
+    if max_workers is None:
+        max_workers = _pool_capacity(engine) or os.cpu_count() or 4
+    max_workers = max(1, min(max_workers, len(queries)))
+
+    if max_workers == 1:
+        return {name: run(name, q) for name, q in queries.items()}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kpi") as pool:
+        futures = {name: pool.submit(run, name, q) for name, q in queries.items()}
+        # Conserva el orden de `queries`; .result() re-lanza el error de la consulta
+        return {name: fut.result() for name, fut in futures.items()}
+
+def paired_observations(engine, raster, profiler=None):
+    """
+    Datos de species_micro_map (mismas columnas que PAIRED_OBSERVATIONS) con
+    el raster de especies (ETL/raster.py): cada muestra toma la riqueza de la
+    celda más cercana y las celdas del raster aportan los puntos de especies.
+    """
+    if profiler is not None:
+        samples = profiler.run("species_micro_map", engine, SAMPLE_LOCATIONS)
+    else:
+        samples = _run_df(engine, SAMPLE_LOCATIONS)
+    samples["species_count"] = raster.lookup(samples["latitude"], samples["longitude"])
+    df = pd.concat([raster.cells(), samples], ignore_index=True)
+    return df[["region", "ocean", "location_id", "species_count", "measurement", "water_sample_depth",
+               "latitude", "longitude", "full_date"]]
+
+def plot_region_distribution(df, out_path, top=10):
+    """Boxplots (p05-p25-p50-p75-p95) por región a partir de los sketches de cuantiles."""
+    if df is None or df.empty:
+        return
+    df = df[df["region"].notna()].head(top)
+    stats = [
+        {"label": row["region"], "whislo": row["p05"], "q1": row["p25"], "med": row["p50"],
+         "q3": row["p75"], "whishi": row["p95"], "fliers": []}
+        for _, row in df.iterrows()
+    ]
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.bxp(stats, showfliers=False)
+    # symlog: admite ceros y deja lineal solo el tramo bajo el menor p25 positivo
+    positive = df.loc[df["p25"] > 0, "p25"]
+    ax.set_yscale("symlog", linthresh=float(positive.min()) if len(positive) else 1e-3)
+    ax.set_title("Distribución de microplásticos por región (p05–p95, Top regiones por #muestras)")
+    ax.set_ylabel("Measurement")
+    plt.xticks(rotation=45, ha="right")
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=140)
+    plt.close(fig)
+
 # ---------------------------
 # Generate All Figures
 # ---------------------------
-def generate_all_figures(engine, start_date=None, end_date=None, save_dir="reports/figures", also_show=False):
+# (clave en KPI_QUERIES, función de plot, archivo de salida)
+FIGURES = [
+    ("region_avgs", plot_region_avgs, "01_region_avgs.png"),
+    ("depth", plot_depth_bands, "02_depth_bands.png"),
+    ("critical_high", plot_critical_zones, "03_critical_zones_high.csv"),
+    ("hotspots", plot_region_hotspots, "04_region_hotspots.png"),
+    ("method", plot_method_mesh, "05_method_mesh.png"),
+    ("conc_matrix", plot_conc_matrix, "06_conc_matrix.png"),
+    ("species_micro_map", plot_species_micro_map, "07_species_micro_map.png"),
+    ("year_trend", plot_year_trend, "08_year_trend.png"),
+    ("ocean_donut", plot_ocean_donut, "09_ocean_donut.png"),
+    ("org_lollipop", plot_org_lollipop, "10_org_lollipop.png"),
+    ("critical_highhigh", plot_critical_highhigh, "11_critical_highhigh.png"),
+    ("critical_lowhigh", plot_critical_lowbiodiv_highcont, "12_critical_lowhigh.png"),
+    ("samples_per_year", plot_samples_per_year, "13_samples_per_year.png"),
+    ("methods_by_year", plot_methods_by_year_area, "14_methods_by_year_area.png"),
+    ("methods_by_depth", plot_depth_vs_method_heatmap, "15_methods_by_depth_heatmap.png"),
+    ("marine_setting", plot_marine_setting_ranking, "16_marine_setting_ranking.png"),
+    ("monthly_trend", plot_monthly_trend, "17_monthly_trend.png"),
+    ("region_distribution", plot_region_distribution, "18_region_distribution.png"),
+]
+
+def render_figures(dfs: dict, save_dir: str):
+    """Dibuja cada KPI ya consultado (siempre en el hilo principal: matplotlib no es thread-safe)."""
+    for key, plot_fn, filename in FIGURES:
+        plot_fn(dfs[key], os.path.join(save_dir, filename))
+
+def generate_all_figures(engine, start_date=None, end_date=None, save_dir="reports/figures", also_show=False,
+                         backend="warehouse", analytics_path=None, max_workers=None, cube=None,
+                         profiler=None, raster=None):
+    """
+    backend="warehouse" consulta el engine recibido; backend="duckdb" ejecuta los
+    mismos KPIs sobre la copia columnar creada con DB.analytics.export_star_schema.
+    max_workers=1 desactiva la consulta concurrente.
+    cube: un reports.cube.KpiCube ya construido; los KPIs agregables salen de él
+    y solo el resto se consulta (útil al regenerar muchas ventanas).
+    profiler: DB.profiling.QueryProfiler; quien lo crea llama a profiler.finish().
+    raster: un ETL.raster.SpeciesRaster; el mapa de especies se arma con él en
+    vez del JOIN por coordenadas de PAIRED_OBSERVATIONS.
+    """
     _ensure_dir(save_dir)
-    params = {"start_date": start_date, "end_date": end_date}
-
-    # 1) Region averages
-    df_region = _run_df(engine, MICRO_BY_REGION_TOP10, params)
-    plot_region_avgs(df_region, os.path.join(save_dir, "01_region_avgs.png"))
-
-    # 2) Depth bands
-    df_depth = _run_df(engine, DEPTH_BINS_EFFECT_TOP10, params)
-    plot_depth_bands(df_depth, os.path.join(save_dir, "02_depth_bands.png"))
-
-    # 3) Critical zones SUM
-    df_hc = _run_df(engine, CRITICAL_ZONES_HIGH, params)
-    plot_critical_zones(df_hc, os.path.join(save_dir, "03_critical_zones_high.csv"))
+    warehouse = engine
+    store = None
+    if backend == "duckdb":
+        from DB.analytics import DuckDBStore, DEFAULT_PATH
+        engine = store = DuckDBStore(analytics_path or DEFAULT_PATH)
+    elif backend != "warehouse":
+        raise ValueError(f"backend desconocido: {backend}")
+    params = window_params(start_date, end_date)
+
+    # 1) Fetch: todas las consultas a la vez (menos las que resuelve el cubo)
+    try:
+        dfs = cube.kpis(start_date, end_date) if cube is not None else {}
+        if raster is not None:
+            dfs["species_micro_map"] = paired_observations(engine, raster, profiler)
+        pending = {name: q for name, q in KPI_QUERIES.items() if name not in dfs}
+        dfs.update(fetch_kpis(engine, params, pending, max_workers=max_workers, profiler=profiler))
+    finally:
+        # El DuckDBStore abierto aquí: no dejar el archivo analítico tomado
+        if store is not None:
+            store.close()
+    dfs = {name: dfs[name] for name in KPI_QUERIES}
+    # Distribuciones desde los sketches guardados en el warehouse durante load
+    from DB.sketches import sketch_quantiles
+    dfs["region_distribution"] = sketch_quantiles(warehouse, "region", start_date, end_date)
+
+    # 2) Plot
+    render_figures(dfs, save_dir)
 
-    # 4) Region hotspots
-    df_hot = _run_df(engine, REGION_HOTSPOTS, params)
-    plot_region_hotspots(df_hot, os.path.join(save_dir, "04_region_hotspots.png"))
-
-    # 5) Method effects
-    df_method = _run_df(engine, METHOD_EFFECTS_TOP10, params)
-    plot_method_mesh(df_method, os.path.join(save_dir, "05_method_mesh.png"))
-
-    # 6) Concentration class by region
-    df_matrix = _run_df(engine, CONC_CLASS_BY_REGION_TOP10, params)
-    plot_conc_matrix(df_matrix, os.path.join(save_dir, "06_conc_matrix.png"))
-
-    # 7) Global map
-    df_map = _run_df(engine, PAIRED_OBSERVATIONS, params)
-    plot_species_micro_map(df_map, os.path.join(save_dir, "07_species_micro_map.png"))
-    
-    # 8) Trend by año
-    df_year = _run_df(engine, YEAR_TREND, params)
-    plot_year_trend(df_year, os.path.join(save_dir, "08_year_trend.png"))
-
-    # 9) Ranking by ocean (dona)
-    df_ocean = _run_df(engine, OCEAN_RANKING_TOTAL, params)
-    plot_ocean_donut(df_ocean, os.path.join(save_dir, "09_ocean_donut.png"))
-    
-    #10) Activy by organization (lollipop)
-    df_org = _run_df(engine, ORGANIZATION_ACTIVITY, params)
-    plot_org_lollipop(df_org, os.path.join(save_dir, "10_org_lollipop.png"))
-    
-    
-   # 11) Zonas críticas High-High
-    df_highhigh = _run_df(engine, CRITICAL_ZONES_HIGHHIGH, params)
-    plot_critical_highhigh(df_highhigh, os.path.join(save_dir, "11_critical_highhigh.png"))
-
-    # 12) Zonas críticas Low-High
-    df_lowhigh = _run_df(engine, CRITICAL_ZONES_LOWBIODIV_HIGHCONT, params)
-    plot_critical_lowbiodiv_highcont(df_lowhigh, os.path.join(save_dir, "12_critical_lowhigh.png"))
-    
-     # 13) Muestreos por año
-    df_year_samples = _run_df(engine, SAMPLES_PER_YEAR, params)
-    plot_samples_per_year(df_year_samples, os.path.join(save_dir, "13_samples_per_year.png"))
-
-    # 14) Métodos por año
-    df_methods_year = _run_df(engine, METHODS_BY_YEAR_COUNTS, params)
-    plot_methods_by_year_area(df_methods_year, os.path.join(save_dir, "14_methods_by_year_area.png"))
-    
-    #15 ) Métodos por banda de profundidad (heatmap)
-    df_methods_depth = _run_df(engine, METHODS_BY_WATERSAMPLEDEPTH, params) 
-    plot_depth_vs_method_heatmap(df_methods_depth, os.path.join(save_dir, "15_methods_by_depth_heatmap.png"))   
-
-    #16) Ranking por marine setting
-    df_marine_setting = _run_df(engine, MARINE_SETTING_RANKING, params)
-    plot_marine_setting_ranking(df_marine_setting, os.path.join(save_dir, "16_marine_setting_ranking.png"))
-    
-    # 17) Tendencia mensual (barras)
-    df_monthly = _run_df(engine, MONTHLY_TREND, params)
-    plot_monthly_trend(df_monthly, os.path.join(save_dir, "17_monthly_trend.png"))
-    
     if also_show:
         plt.show()
 
-    return {
-        "region_avgs": df_region,
-        "depth": df_depth,
-        "critical_high": df_hc,
-        "hotspots": df_hot,
-        "method": df_method,
-        "conc_matrix": df_matrix,
-        "species_micro_map": df_map,
-        "year_trend": df_year,
-        "ocean_donut": df_ocean,
-        "org_lollipop": df_org,
-        "critical_highhigh": df_highhigh,
-        "critical_lowhigh": df_lowhigh
-
-    }
+    return dfs
 
 if __name__ == "__main__":
     from DB.create_db import get_engine